@@ -0,0 +1,220 @@
+"""
+Асинхронний клієнт API адмін-панелі для Matrix бота
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from cache import TTLCache
+from metrics import ADMIN_API_LATENCY, ADMIN_API_RESPONSES, endpoint_label
+
+logger = logging.getLogger(__name__)
+
+# Таймаут за замовчуванням (секунди) для всіх endpoint'ів
+DEFAULT_TIMEOUT = float(os.getenv('ADMIN_API_TIMEOUT', '15'))
+
+# Довгі операції отримують власні таймаути (префікс endpoint'у -> секунди)
+ENDPOINT_TIMEOUTS = {
+    'update': 900,
+    'backups/create': 1800,
+    'backups/restore': 3600,
+    'logs': 60,
+    'service': 120,
+    'bridges/restart': 120,
+    'users/batch': 300,
+}
+
+# Максимальна кількість одночасних запитів до адмін-панелі
+MAX_CONCURRENCY = int(os.getenv('ADMIN_API_MAX_CONCURRENCY', '8'))
+
+
+def parse_ttls(value: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Розбір TTL з рядка виду 'status=5,health=5,users=30'"""
+    ttls = dict(defaults)
+    for item in value.split(','):
+        if '=' in item:
+            endpoint, ttl = item.split('=', 1)
+            ttls[endpoint.strip()] = float(ttl)
+    return ttls
+
+
+# TTL кешу (секунди) для endpoint'ів лише для читання; 0 вимикає кеш
+CACHE_TTLS = parse_ttls(os.getenv('ADMIN_API_CACHE_TTLS', ''), {
+    'status': 5,
+    'health': 5,
+    'bridges/status': 5,
+    'users': 30,
+})
+
+# Які записи кешу інвалідує змінюючий endpoint
+CACHE_INVALIDATES = {
+    'service': ['status', 'health', 'bridges/status'],
+    'bridges/restart': ['status', 'health', 'bridges/status'],
+    'update': ['status', 'health', 'bridges/status'],
+    'backups/restore': ['status', 'health', 'bridges/status', 'users'],
+    'users': ['users'],
+}
+
+
+class AdminApiError(Exception):
+    """Помилка потокового запиту до адмін-панелі"""
+
+
+def match_endpoint(endpoint: str, table: Dict[str, Any]) -> Optional[str]:
+    """Найдовший префікс з таблиці, що відповідає шляху endpoint'у"""
+    path = endpoint.split('?', 1)[0]
+    best = None
+    for prefix in table:
+        if path == prefix or path.startswith(prefix + '/'):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    return best
+
+
+class AdminApiClient:
+    """Пул keep-alive з'єднань до адмін-панелі з обмеженням паралельності"""
+
+    def __init__(self, base_url: str, max_concurrency: int = MAX_CONCURRENCY,
+                 default_timeout: float = DEFAULT_TIMEOUT,
+                 endpoint_timeouts: Optional[Dict[str, float]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.endpoint_timeouts = dict(ENDPOINT_TIMEOUTS if endpoint_timeouts is None else endpoint_timeouts)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.cache_ttls = dict(CACHE_TTLS)
+        self.cache = TTLCache()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Лінива ініціалізація сесії в межах поточного event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Content-Type': 'application/json'},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def timeout_for(self, endpoint: str) -> float:
+        """Таймаут для endpoint'у за найдовшим збігом префікса"""
+        best = match_endpoint(endpoint, self.endpoint_timeouts)
+        return self.endpoint_timeouts[best] if best else self.default_timeout
+
+    async def request(self, endpoint: str, method: str = 'GET', data: dict = None,
+                      use_cache: bool = True) -> dict:
+        """Виклик API адмін-панелі; повертає dict з ключами success/error"""
+        if method not in ('GET', 'POST', 'DELETE'):
+            return {'success': False, 'error': 'Непідтримуваний метод'}
+
+        if method == 'GET':
+            ttl = self.cache_ttls.get(endpoint.split('?', 1)[0], 0)
+            if use_cache and ttl > 0:
+                return await self.cache.get_or_fetch(
+                    endpoint, ttl,
+                    lambda: self._request(endpoint, method, data),
+                    cacheable=lambda response: bool(response.get('success')),
+                )
+            return await self._request(endpoint, method, data)
+
+        try:
+            return await self._request(endpoint, method, data)
+        finally:
+            # Інвалідуємо і при помилці: стан сервісу міг змінитися частково
+            affected = match_endpoint(endpoint, CACHE_INVALIDATES)
+            if affected:
+                self.cache.invalidate(CACHE_INVALIDATES[affected])
+
+    async def _request(self, endpoint: str, method: str, data: Optional[dict]) -> dict:
+        """HTTP запит до адмін-панелі без кешу"""
+        session = self._get_session()
+        url = f"{self.base_url}/api/{endpoint}"
+        timeout = aiohttp.ClientTimeout(total=self.timeout_for(endpoint))
+        label = endpoint_label(endpoint)
+        status = 'error'
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, url, json=data, timeout=timeout) as response:
+                        status = str(response.status)
+                        try:
+                            return await response.json(content_type=None)
+                        except ValueError:
+                            # Не-JSON відповідь (напр. 429 від ліміту запитів): статус і Retry-After -
+                            # щоб викликач міг повторити запит
+                            text = await response.text()
+                            retry_after = response.headers.get('Retry-After', '')
+                            return {'success': False, 'error': f"HTTP {response.status}: {text[:200]}",
+                                    'status': response.status,
+                                    'retry_after': float(retry_after) if retry_after.isdigit() else None}
+                finally:
+                    ADMIN_API_LATENCY.labels(label, method).observe(time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            return {'success': False, 'error': f"Таймаут запиту до {endpoint}"}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        finally:
+            ADMIN_API_RESPONSES.labels(label, method, status).inc()
+
+    async def stream_lines(self, endpoint: str, timeout: Optional[float] = None,
+                           max_line_length: int = 4096,
+                           read_timeout: Optional[float] = None,
+                           method: str = 'GET', data: Optional[dict] = None) -> AsyncIterator[str]:
+        """Потокове читання text/plain відповіді рядок за рядком (без буферизації всього тіла)"""
+        session = self._get_session()
+        url = f"{self.base_url}/api/{endpoint}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=self.default_timeout,
+                                               sock_read=read_timeout)
+        try:
+            async with session.request(method, url, json=data, timeout=client_timeout) as response:
+                ADMIN_API_RESPONSES.labels(endpoint_label(endpoint), method, str(response.status)).inc()
+                if response.status != 200:
+                    try:
+                        error = (await response.json(content_type=None)).get('error')
+                    except ValueError:
+                        error = None
+                    raise AdminApiError(error or f"HTTP {response.status}")
+
+                buffer = b''
+                skipping = False
+                async for chunk in response.content.iter_any():
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b'\n')
+                    for line in lines:
+                        if skipping:
+                            # Кінець уже обрізаного довгого рядка
+                            skipping = False
+                            continue
+                        yield line[:max_line_length].decode('utf-8', errors='replace').rstrip('\r')
+                    # Надто довгий рядок без переводу - обрізаємо, щоб не рости в пам'яті
+                    if len(buffer) > max_line_length:
+                        if not skipping:
+                            yield buffer[:max_line_length].decode('utf-8', errors='replace')
+                            skipping = True
+                        buffer = b''
+                if buffer and not skipping:
+                    yield buffer[:max_line_length].decode('utf-8', errors='replace').rstrip('\r')
+        finally:
+            if method != 'GET':
+                # Змінюючий потік (відновлення, оновлення) робить кешовані статуси застарілими
+                affected = match_endpoint(endpoint, CACHE_INVALIDATES)
+                if affected:
+                    self.cache.invalidate(CACHE_INVALIDATES[affected])
+
+    async def close(self):
+        """Закриття пулу з'єднань"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,165 @@
+"""
+Стан сповіщень про здоров'я сервісів: гістерезис, дедуплікація та дайджести
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from state_store import StateFile
+
+logger = logging.getLogger(__name__)
+
+# Скільки збоїв сервісу за вікно ALERT_FLAP_WINDOW піднімають тривогу одразу
+ALERT_FAILURE_THRESHOLD = int(os.getenv('ALERT_FAILURE_THRESHOLD', '3'))
+ALERT_FLAP_WINDOW = float(os.getenv('ALERT_FLAP_WINDOW', '300'))
+# Скільки секунд сервіс має бути нездоровим безперервно до тривоги
+ALERT_PENDING_SECONDS = float(os.getenv('ALERT_PENDING_SECONDS', '30'))
+# Скільки секунд сервіс має бути здоровим до повідомлення про відновлення
+ALERT_RESOLVE_SECONDS = float(os.getenv('ALERT_RESOLVE_SECONDS', '30'))
+# Вікно, за яке зміни збираються в одне повідомлення
+ALERT_BATCH_WINDOW = float(os.getenv('ALERT_BATCH_WINDOW', '10'))
+# Період перевірки таймерів
+ALERT_TICK_SECONDS = 5
+
+# Стани сервісу
+OK = 'ok'
+PENDING = 'pending'
+FIRING = 'firing'
+RESOLVING = 'resolving'
+
+
+def format_duration(seconds: float) -> str:
+    """Тривалість у вигляді '2 год 5 хв' / '40 с'"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, _ = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} год {minutes} хв" if hours else f"{minutes} хв"
+
+
+class AlertManager:
+    """
+    Скінченний автомат сповіщень для кожного сервісу:
+    ok -> pending -> firing -> resolving -> ok.
+
+    Тривога піднімається, якщо сервіс нездоровий довше ALERT_PENDING_SECONDS
+    або падав ALERT_FAILURE_THRESHOLD разів за ALERT_FLAP_WINDOW. Повторні
+    сповіщення для вже активної тривоги не надсилаються; відновлення
+    повідомляється один раз. Зміни за ALERT_BATCH_WINDOW об'єднуються.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], state_file: Optional[StateFile] = None):
+        self.send = send
+        self.state_file = state_file or StateFile('alerts.json')
+        state = self.state_file.load()
+        self.services: Dict[str, dict] = state.get('services', {})
+        # Недосланий дайджест переживає перезапуск, інакше тривога загубиться
+        self._digest: List[str] = state.get('digest', [])
+        self._digest_started: Optional[float] = time.time() if self._digest else None
+        self._dirty = False
+        self.sent_digests = 0
+        self.suppressed = 0
+
+    def firing(self) -> List[str]:
+        """Сервіси з активною тривогою"""
+        return sorted(name for name, s in self.services.items() if s['state'] in (FIRING, RESOLVING))
+
+    async def observe(self, name: str, healthy: bool, status: str):
+        """Нове спостереження стану сервісу"""
+        now = time.time()
+        service = self.services.setdefault(name, {
+            'state': OK, 'status': status, 'failures': [], 'since': now, 'down_since': None,
+        })
+        service['status'] = status
+        state = service['state']
+        self._dirty = True
+
+        if not healthy:
+            service['failures'] = [t for t in service['failures'] if now - t < ALERT_FLAP_WINDOW] + [now]
+            if state == OK:
+                self._transition(name, PENDING, now)
+                service['down_since'] = now
+            elif state == RESOLVING:
+                # Сервіс знову впав до підтвердження відновлення - тривога триває
+                self._transition(name, FIRING, now)
+            elif state == FIRING:
+                self.suppressed += 1
+        else:
+            if state == PENDING:
+                self._transition(name, OK, now)
+            elif state == FIRING:
+                self._transition(name, RESOLVING, now)
+
+        self._evaluate(name, now)
+        self._save()
+
+    async def run(self):
+        """Перевірка таймерів гістерезису та відправка дайджестів"""
+        while True:
+            await asyncio.sleep(ALERT_TICK_SECONDS)
+            try:
+                now = time.time()
+                for name in list(self.services):
+                    self._evaluate(name, now)
+                self._save()
+                if self._digest and now - self._digest_started >= ALERT_BATCH_WINDOW:
+                    await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Помилка обробки сповіщень: {e}")
+
+    async def flush(self):
+        """Надсилання накопиченого дайджесту одним повідомленням"""
+        if not self._digest:
+            return
+        lines, self._digest, self._digest_started = self._digest, [], None
+        self._dirty = True
+        title = "⚠️ **Healthcheck попередження:**" if any(l.startswith('🔴') for l in lines) else "✅ **Healthcheck:**"
+        await self.send(title + "\n" + "\n".join(lines))
+        self.sent_digests += 1
+
+    def _evaluate(self, name: str, now: float):
+        service = self.services[name]
+        state = service['state']
+        if state == PENDING:
+            flapping = len(service['failures']) >= ALERT_FAILURE_THRESHOLD
+            if flapping or now - service['since'] >= ALERT_PENDING_SECONDS:
+                self._transition(name, FIRING, now)
+                started = datetime.fromtimestamp(service['down_since'] or now).strftime('%H:%M:%S')
+                reason = f", {len(service['failures'])} збоїв за {format_duration(ALERT_FLAP_WINDOW)}" if flapping else ""
+                self._queue(f"🔴 **{name}**: {service['status']} (з {started}{reason})")
+        elif state == RESOLVING and now - service['since'] >= ALERT_RESOLVE_SECONDS:
+            # Простій - від першого збою до початку стабільної роботи
+            downtime = service['since'] - (service['down_since'] or service['since'])
+            self._transition(name, OK, now)
+            service['down_since'] = None
+            service['failures'] = []
+            self._queue(f"🟢 **{name}** відновлено: {service['status']} (простій {format_duration(downtime)})")
+
+    def _transition(self, name: str, state: str, now: float):
+        service = self.services[name]
+        logger.info(f"Сповіщення {name}: {service['state']} -> {state}")
+        service['state'] = state
+        service['since'] = now
+        self._dirty = True
+
+    def _queue(self, line: str):
+        if not self._digest:
+            self._digest_started = time.time()
+        self._digest.append(line)
+
+    def _save(self):
+        if not self._dirty:
+            return
+        try:
+            self.state_file.save({'services': self.services, 'digest': self._digest})
+            self._dirty = False
+        except OSError as e:
+            logger.error(f"Не вдалося зберегти стан сповіщень: {e}")
@@ -0,0 +1,200 @@
+"""
+Бекапи: розбір прогресу та підсумків скриптів backup.sh / restore.sh /
+media-backup.sh / postgres-backup.sh
+Автор: Matrix Setup Team
+"""
+
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from formatting import format_size
+
+# Скільки чекати на наступний рядок виводу бекапу (pg_dump великої бази мовчить довго)
+BACKUP_READ_TIMEOUT = float(os.getenv('MATRIX_BOT_BACKUP_READ_TIMEOUT', '1800'))
+
+# Як часто пересилати в кімнату рядки [PROGRESS] (pg_restore звітує про кожну таблицю)
+BACKUP_PROGRESS_INTERVAL = float(os.getenv('MATRIX_BOT_BACKUP_PROGRESS_INTERVAL', '15'))
+
+# Скільки знімків показувати на сторінці /backup list
+BACKUP_LIST_PAGE_SIZE = int(os.getenv('MATRIX_BOT_BACKUP_LIST_PAGE_SIZE', '10'))
+
+BACKUP_COMPONENTS = ('postgres', 'redis', 'config', 'media')
+BACKUP_SORTS = ('date', 'size', 'duration')
+
+BACKUP_LIST_USAGE = ("❌ Використання: `/backup list [сторінка] [--sort date|size|duration] [--asc] "
+                     "[--component postgres|redis|config|media] [--partial]`")
+
+# Етапи backup.sh, про які варто повідомити в кімнату
+STAGE_PREFIXES = ('[INFO]', '[WARN]', '[ERROR]')
+
+
+def parse_stats(line: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """'[STATS] media files=3 bytes=10' -> ('media', {'files': '3', 'bytes': '10'})"""
+    if not line.startswith('[STATS] '):
+        return None
+    kind, *pairs = line[len('[STATS] '):].split()
+    return kind, dict(pair.split('=', 1) for pair in pairs if '=' in pair)
+
+
+def parse_exit_code(line: str) -> int:
+    """'[EXIT] code=0' -> 0; без числового коду ('code=null' - скрипт вбито сигналом) -> -1"""
+    match = re.search(r'code=(-?\d+)', line)
+    return int(match.group(1)) if match else -1
+
+
+def throughput(size: int, seconds: int) -> str:
+    return f"{format_size(size / max(seconds, 1))}/с"
+
+
+class ProgressThrottle:
+    """Пропускає рядки [PROGRESS] не частіше ніж раз на `interval` с; етапи та помилки - завжди"""
+
+    def __init__(self, interval: float = BACKUP_PROGRESS_INTERVAL):
+        self.interval = interval
+        self.last = float('-inf')
+
+    def allow(self, line: str) -> bool:
+        if not line.startswith('[PROGRESS]'):
+            return True
+        now = time.monotonic()
+        if now - self.last < self.interval:
+            return False
+        self.last = now
+        return True
+
+
+def parse_list_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /backup list; ValueError з поясненням при помилці"""
+    options = {'page': 1, 'sort': 'date', 'order': 'desc', 'component': None, 'status': None}
+    rest = list(args)
+    while rest:
+        arg = rest.pop(0)
+        if arg in ('--sort', '--component'):
+            if not rest:
+                raise ValueError(BACKUP_LIST_USAGE)
+            options[arg[2:]] = rest.pop(0)
+        elif arg == '--asc':
+            options['order'] = 'asc'
+        elif arg == '--partial':
+            options['status'] = 'partial'
+        elif arg.isdigit() and int(arg) > 0:
+            options['page'] = int(arg)
+        else:
+            raise ValueError(BACKUP_LIST_USAGE)
+    if options['sort'] not in BACKUP_SORTS:
+        raise ValueError(f"❌ Сортування має бути одним з: {', '.join(BACKUP_SORTS)}")
+    if options['component'] and options['component'] not in BACKUP_COMPONENTS:
+        raise ValueError(f"❌ Компонент має бути одним з: {', '.join(BACKUP_COMPONENTS)}")
+    return options
+
+
+def backups_list_endpoint(options: Dict[str, Any]) -> str:
+    """Endpoint каталогу знімків з сортуванням, фільтрами та сторінкою"""
+    query = {
+        'sort': options['sort'],
+        'order': options['order'],
+        'limit': BACKUP_LIST_PAGE_SIZE,
+        'offset': (options['page'] - 1) * BACKUP_LIST_PAGE_SIZE,
+    }
+    for key in ('component', 'status'):
+        if options[key]:
+            query[key] = options[key]
+    return f"backups?{urlencode(query)}"
+
+
+def format_backup_list(response: Dict[str, Any], options: Dict[str, Any]) -> str:
+    """Сторінка каталогу: розмір, склад, тривалість і результат перевірки кожного знімка"""
+    backups = response.get('backups', [])
+    total = response.get('total', len(backups))
+    if not backups:
+        return "📦 Бекапів не знайдено" if not total else f"📦 Сторінка {options['page']} порожня (усього {total})"
+
+    pages = -(-total // BACKUP_LIST_PAGE_SIZE)
+    message = f"📦 **Бекапи** ({total}, стор. {options['page']}/{pages}):\n\n"
+    for backup in backups:
+        if not backup.get('cataloged'):
+            message += f"• **{backup['name']}** - без запису в каталозі\n"
+            continue
+        # ❌ - перевірка знайшла пошкодження, ⚠️ - частковий знімок, ✅ - перевірений
+        if backup.get('verified') is False:
+            emoji = '❌'
+        elif backup.get('status') != 'ok':
+            emoji = '⚠️'
+        else:
+            emoji = '✅' if backup.get('verified') else '📦'
+        components = backup.get('components', {})
+        parts = ', '.join(f"{name} {format_size(components[name])}"
+                          for name in BACKUP_COMPONENTS if components.get(name))
+        message += (f"{emoji} **{backup['name']}** - {format_size(backup.get('bytes') or 0)} на диску, "
+                     f"{backup.get('seconds', 0)} с ({parts or 'порожній'})")
+        if backup.get('failed'):
+            message += f", не вдалося: {', '.join(backup['failed'])}"
+        message += "\n"
+    if options['page'] < pages:
+        message += f"\nНаступна сторінка: `/backup list {options['page'] + 1}`"
+    return message
+
+
+def format_progress(line: str) -> Optional[str]:
+    """Рядок прогресу для кімнати або None, якщо рядок службовий"""
+    stats = parse_stats(line.replace('[PROGRESS]', '[STATS]', 1))
+    if stats and stats[0] == 'media':
+        values = stats[1]
+        return (f"⏳ Медіа: хешовано {values.get('hashed', '?')}, збережено {values.get('stored', '?')} "
+                f"нових об'єктів ({format_size(int(values.get('stored_bytes', 0)))})")
+    if stats and stats[0] == 'media_verify':
+        return f"⏳ Медіа: перевірено {stats[1].get('checked', '?')} об'єктів"
+    if stats and stats[0] == 'postgres':
+        values = stats[1]
+        stage = 'відновлення' if values.get('stage') == 'restore' else 'дамп'
+        message = f"⏳ Postgres ({stage}): таблиць {values.get('tables', '?')}"
+        if not values.get('indexes', '0/0').endswith('/0'):
+            message += f", індексів {values['indexes']}"
+        current = values.get('table') or values.get('index')
+        return message + (f" - {current}" if current else '')
+    if line.startswith(STAGE_PREFIXES):
+        return line.split(' ', 1)[1] if ' ' in line else line
+    return None
+
+
+def format_stats(kind: str, values: Dict[str, str]) -> Optional[str]:
+    """Підсумок етапу бекапу з обсягами та швидкістю"""
+    number = lambda key: int(values.get(key, 0))  # noqa: E731
+    if kind == 'media':
+        seconds = number('seconds')
+        return (f"🖼 Медіа: {number('files')} файлів ({format_size(number('bytes'))}), "
+                f"хешовано {number('hashed')} ({format_size(number('hashed_bytes'))}, "
+                f"{throughput(number('hashed_bytes'), seconds)}), "
+                f"нових об'єктів {number('new_objects')} ({format_size(number('new_bytes'))}), "
+                f"сховище {format_size(number('store_bytes'))}, {seconds} с")
+    if kind == 'media_gc' and number('removed'):
+        return f"🧹 Видалено об'єктів без посилань: {number('removed')} ({format_size(number('freed_bytes'))})"
+    if kind == 'postgres_dump':
+        seconds = number('seconds')
+        return (f"🐘 Postgres: {number('tables')} таблиць, база {format_size(number('db_bytes'))} -> "
+                f"дамп {format_size(number('bytes'))} за {seconds} с "
+                f"({throughput(number('db_bytes'), seconds)}, {number('jobs')} потоків)")
+    if kind == 'postgres_restore':
+        seconds = number('seconds')
+        return (f"🐘 Postgres відновлено: {number('tables')} таблиць, {number('indexes')} індексів і обмежень, "
+                f"дамп {format_size(number('bytes'))} -> база {format_size(number('db_bytes'))} за {seconds} с "
+                f"({throughput(number('db_bytes'), seconds)}, {number('jobs')} потоків)")
+    if kind == 'backup':
+        return f"📦 Знімок **{values.get('name')}**: {format_size(number('bytes'))} за {number('seconds')} с"
+    if kind == 'media_verify':
+        seconds = number('seconds')
+        return (f"🖼 Медіа: {number('objects')} об'єктів ({format_size(number('bytes'))}, "
+                f"{throughput(number('bytes'), seconds)}), відсутніх {number('missing')}, "
+                f"пошкоджених {number('corrupt')}")
+    if kind == 'verify':
+        emoji = '✅' if values.get('ok') == 'true' else '❌'
+        return (f"{emoji} Знімок **{values.get('name')}**: файлів {number('files')}, "
+                f"не збігається {number('bad_files')}, {number('seconds')} с")
+    if kind == 'restore':
+        seconds = number('seconds')
+        return (f"♻️ Знімок **{values.get('name')}** ({format_size(number('bytes'))}) відновлено за {seconds} с "
+                f"({throughput(number('bytes'), seconds)})")
+    return None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: N одночасних команд /status проти локальної заглушки адмін-панелі.
+З неблокуючим клієнтом загальний час має бути близьким до часу одного виклику,
+а з кешем відповідей N команд мають дати один виклик до заглушки.
+
+Запуск: python benchmarks/bench_admin_api.py [--commands 10] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import MatrixAdminBot  # noqa: E402
+from stub_admin_panel import start_stub  # noqa: E402
+
+
+async def run(commands: int, latency: float):
+    runner, base_url, app = await start_stub(latency=latency)
+    os.environ['ADMIN_PANEL_URL'] = base_url
+    bot = MatrixAdminBot()
+    room = SimpleNamespace(room_id='!bench:localhost')
+    cache_ttls = bot.admin_api.cache_ttls
+    try:
+        # Без кешу: вимірюємо саме паралельність клієнта
+        bot.admin_api.cache_ttls = {}
+
+        # Прогрів пулу з'єднань
+        await bot.cmd_status(room, [])
+
+        started = time.perf_counter()
+        await bot.cmd_status(room, [])
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bot.cmd_status(room, []) for _ in range(commands)))
+        concurrent = time.perf_counter() - started
+
+        # З кешем: одночасні запити об'єднуються в один виклик
+        bot.admin_api.cache_ttls = cache_ttls
+        calls_before = app['calls']
+        started = time.perf_counter()
+        await asyncio.gather(*(bot.cmd_status(room, []) for _ in range(commands)))
+        cached = time.perf_counter() - started
+        cached_calls = app['calls'] - calls_before
+    finally:
+        await bot.admin_api.close()
+        await runner.cleanup()
+
+    print(f"Затримка заглушки:       {latency:.3f} с")
+    print(f"Одна команда /status:    {single:.3f} с")
+    print(f"{commands} одночасних /status: {concurrent:.3f} с "
+          f"(послідовно було б ~{single * commands:.3f} с)")
+    print(f"{commands} /status з кешем:    {cached:.3f} с, викликів до заглушки: {cached_calls}")
+    print(f"Кеш: {bot.admin_api.cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(run(args.commands, args.latency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: відтворення навантаження на бота з суміші команд.
+Бот працює в цьому ж процесі проти заглушок homeserver'а та адмін-панелі
+(затримка та частка збоїв налаштовуються). Команди надходять через sync
+з заданою частотою (пуассонівський потік), паралельно - пачки сповіщень.
+Результат - JSON зі швидкістю, p50/p95/p99 затримки команд, затримкою
+event loop та пам'яттю, щоб порівнювати прогони між версіями.
+
+Затримка команди - від появи події в заглушці до завершення обробника
+(відповіді поставлено в чергу); затримка пачки сповіщень - до доставки
+останнього з них на homeserver.
+
+Запуск: python benchmarks/bench_load.py [--mix default] [--rate 5] [--duration 30] [--output /tmp/load-report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from stub_admin_panel import start_stub as start_admin_stub  # noqa: E402
+from stub_homeserver import start_stub  # noqa: E402
+
+ROOM_ID = '!bench:localhost'
+SENDER = '@admin:localhost'
+
+# Суміші команд: (команда, вага)
+MIXES = {
+    'default': [
+        ('/status', 50),
+        ('/logs dendrite 200', 25),
+        ('/restart signal-bridge', 15),
+        ('/backup create', 10),
+    ],
+    'read': [
+        ('/status', 60),
+        ('/logs dendrite 200', 30),
+        ('/logs postgres --level error', 10),
+    ],
+    'write': [
+        ('/restart signal-bridge', 40),
+        ('/restart *-bridge', 20),
+        ('/backup create', 40),
+    ],
+}
+
+LOOP_LAG_INTERVAL = 0.05
+SYNC_READY_TIMEOUT = 30
+
+
+def percentiles(values) -> dict:
+    """Зведення вибірки: кількість, середнє, p50/p95/p99 (найближчий ранг), максимум"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 6),
+        'p50': round(rank(50), 6),
+        'p95': round(rank(95), 6),
+        'p99': round(rank(99), 6),
+        'max': round(ordered[-1], 6),
+    }
+
+
+def rss_mb() -> float:
+    """Поточний RSS процесу (МБ); без /proc - пікове значення з getrusage"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoadRecorder:
+    """Зіставлення введених команд із задачами планувальника та збір вимірювань"""
+
+    def __init__(self):
+        self.injected = defaultdict(deque)
+        self.latencies = defaultdict(list)
+        self.injected_total = 0
+        self.pending = set()
+        self.loop_lag = []
+        self.rss = []
+
+    def inject(self, app, body: str):
+        self.injected[body].append(time.perf_counter())
+        self.injected_total += 1
+        app['inject'](body)
+
+    def trace(self, scheduler):
+        """Обгортка submit: бот обробляє події по порядку, тож зіставлення FIFO за текстом команди"""
+        submit = scheduler.submit
+
+        def traced(command, args, *rest, **kwargs):
+            job = submit(command, args, *rest, **kwargs)
+            title = ' '.join([command] + list(args))
+            queue = self.injected.get(title)
+            if queue:
+                injected_at = queue.popleft()
+                self.pending.add(job.task)
+                job.task.add_done_callback(lambda task: self.done(task, command, injected_at))
+            return job
+
+        scheduler.submit = traced
+
+    def done(self, task, command: str, injected_at: float):
+        self.pending.discard(task)
+        self.latencies[command].append(time.perf_counter() - injected_at)
+
+    async def sample(self):
+        """Затримка event loop (запізнення sleep) та RSS протягом прогону"""
+        loop = asyncio.get_running_loop()
+        ticks = 0
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.append(max(0.0, loop.time() - expected))
+            ticks += 1
+            if ticks % 10 == 0:
+                self.rss.append(rss_mb())
+
+
+async def notification_burst(bot, size: int, number: int) -> float:
+    """Пачка сповіщень, як при масовій зміні стану контейнерів; повертає час до доставки"""
+    started = time.perf_counter()
+    for i in range(size):
+        await bot.service_notification(f"bench-{number}-{i}", 'restart', 'success' if i % 5 else 'failed')
+    # Черга кімнати доставляє по порядку: маркер після пачки приходить останнім
+    await bot.outbox.enqueue(ROOM_ID, {'msgtype': 'm.notice', 'body': f"bench burst {number}"})
+    return time.perf_counter() - started
+
+
+async def replay(bot, app, recorder: LoadRecorder, args) -> dict:
+    """Потік команд із заданою частотою та пачки сповіщень; повертає час відтворення"""
+    rng = random.Random(args.seed)
+    commands, weights = zip(*MIXES[args.mix])
+    loop = asyncio.get_running_loop()
+    bursts = []
+    burst_tasks = []
+    started = loop.time()
+    deadline = started + args.duration
+    next_command = started
+    next_burst = started + args.burst_interval if args.burst_size else float('inf')
+    while True:
+        now = loop.time()
+        if now >= deadline:
+            break
+        if now >= next_burst:
+            number = len(burst_tasks) + 1
+            task = asyncio.create_task(notification_burst(bot, args.burst_size, number))
+            task.add_done_callback(lambda t: bursts.append(t.result()) if not t.cancelled() else None)
+            burst_tasks.append(task)
+            next_burst += args.burst_interval
+        if now >= next_command:
+            recorder.inject(app, rng.choices(commands, weights)[0])
+            next_command += rng.expovariate(args.rate)
+        await asyncio.sleep(max(0.0, min(next_command, next_burst, deadline) - loop.time()))
+    replay_time = loop.time() - started
+
+    # Дочікуємося команд і сповіщень, що ще в роботі
+    waiting = list(recorder.pending) + [t for t in burst_tasks if not t.done()]
+    if waiting:
+        _, unfinished = await asyncio.wait(waiting, timeout=args.drain)
+        for task in unfinished:
+            task.cancel()
+    return {'replay_time': replay_time, 'total_time': loop.time() - started, 'bursts': bursts}
+
+
+async def run(args) -> dict:
+    hs_runner, hs_url, hs_app = await start_stub(
+        ROOM_ID, SENDER, command=None, login_latency=0,
+        latency=args.hs_latency, failure_rate=args.hs_failures, seed=args.seed,
+    )
+    admin_runner, admin_url, admin_app = await start_admin_stub(
+        latency=args.api_latency, jitter=args.api_jitter, failure_rate=args.api_failures,
+        seed=args.seed, line_interval=args.line_interval,
+    )
+    state_dir = tempfile.mkdtemp(prefix='bench-load-')
+    os.environ.update(
+        MATRIX_HOMESERVER_URL=hs_url,
+        MATRIX_BOT_USERNAME='system-bot',
+        MATRIX_BOT_PASSWORD='bench',
+        MATRIX_BOT_ROOM_ID=ROOM_ID,
+        MATRIX_BOT_ADMINS=SENDER,
+        MATRIX_BOT_STATE_DIR=state_dir,
+        ADMIN_PANEL_URL=admin_url,
+    )
+    # Налаштування бота читаються при імпорті, тому імпорт - після середовища
+    from bot import MatrixAdminBot
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    recorder = LoadRecorder()
+    sampler = asyncio.create_task(recorder.sample())
+    rss_start = rss_mb()
+    bot = MatrixAdminBot()
+    recorder.trace(bot.scheduler)
+    bot_task = asyncio.create_task(bot.start())
+    try:
+        await asyncio.wait_for(bot.synced.wait(), SYNC_READY_TIMEOUT)
+        timing = await replay(bot, hs_app, recorder, args)
+    finally:
+        sampler.cancel()
+        await bot.scheduler.shutdown()
+        await bot.outbox.close()
+        bot_task.cancel()
+        await asyncio.gather(bot_task, sampler, return_exceptions=True)
+        if bot.client is not None:
+            await bot.client.close()
+        await bot.admin_api.close()
+        await bot.db.close()
+        await hs_runner.cleanup()
+        await admin_runner.cleanup()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    completed = len(all_latencies)
+    rss_samples = recorder.rss or [rss_start]
+    return {
+        'config': {
+            'mix': dict(MIXES[args.mix]),
+            'rate': args.rate,
+            'duration': args.duration,
+            'burst_size': args.burst_size,
+            'burst_interval': args.burst_interval,
+            'homeserver': {'latency': args.hs_latency, 'failure_rate': args.hs_failures},
+            'admin_panel': {'latency': args.api_latency, 'jitter': args.api_jitter,
+                            'failure_rate': args.api_failures, 'line_interval': args.line_interval},
+            'seed': args.seed,
+        },
+        'commands': {
+            'injected': recorder.injected_total,
+            'completed': completed,
+            'unfinished': recorder.injected_total - completed,
+            'throughput_per_s': round(completed / timing['total_time'], 3) if timing['total_time'] else 0,
+        },
+        'latency_s': {
+            'all': percentiles(all_latencies),
+            **{command: percentiles(values) for command, values in sorted(recorder.latencies.items())},
+        },
+        'notifications': {
+            'bursts': len(timing['bursts']),
+            'messages': len(timing['bursts']) * args.burst_size,
+            'burst_delivery_s': percentiles(timing['bursts']),
+        },
+        'event_loop_lag_s': percentiles(recorder.loop_lag),
+        'memory_mb': {
+            'rss_start': round(rss_start, 1),
+            'rss_end': round(rss_samples[-1], 1),
+            'rss_peak': round(max(rss_samples), 1),
+            'max_rss': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        'homeserver': {'events_sent': hs_app['sent'], 'injected_failures': hs_app['failures']},
+        'admin_panel': {'calls': admin_app['calls'], 'injected_failures': admin_app['failures'],
+                        'routes': admin_app['routes']},
+        'outbox': bot.outbox.stats(),
+        'cache': bot.admin_api.cache.stats(),
+    }
+
+
+def print_summary(report: dict):
+    commands = report['commands']
+    print(f"Команд: введено {commands['injected']}, виконано {commands['completed']}, "
+          f"{commands['throughput_per_s']:.2f}/с")
+    for name, stats in report['latency_s'].items():
+        if stats['count']:
+            print(f"  {name:<10} n={stats['count']:<5} p50 {stats['p50'] * 1000:8.1f} мс  "
+                  f"p95 {stats['p95'] * 1000:8.1f} мс  p99 {stats['p99'] * 1000:8.1f} мс")
+    bursts = report['notifications']['burst_delivery_s']
+    if bursts['count']:
+        print(f"Пачки сповіщень: {bursts['count']}, доставка p50 {bursts['p50']:.3f} с, макс {bursts['max']:.3f} с")
+    lag = report['event_loop_lag_s']
+    if lag['count']:
+        print(f"Затримка event loop: p50 {lag['p50'] * 1000:.1f} мс, p99 {lag['p99'] * 1000:.1f} мс, "
+              f"макс {lag['max'] * 1000:.1f} мс")
+    memory = report['memory_mb']
+    print(f"RSS: {memory['rss_start']} -> {memory['rss_end']} МБ (пік {memory['rss_peak']} МБ)")
+    print(f"Homeserver: подій {report['homeserver']['events_sent']}, "
+          f"збоїв {report['homeserver']['injected_failures']}; "
+          f"адмін-панель: викликів {report['admin_panel']['calls']}, "
+          f"збоїв {report['admin_panel']['injected_failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default', help='суміш команд')
+    parser.add_argument('--rate', type=float, default=5, help='середня кількість команд за секунду')
+    parser.add_argument('--duration', type=float, default=30, help='тривалість відтворення (с)')
+    parser.add_argument('--burst-size', type=int, default=50, help='сповіщень у пачці (0 - без пачок)')
+    parser.add_argument('--burst-interval', type=float, default=10, help='інтервал між пачками (с)')
+    parser.add_argument('--hs-latency', type=float, default=0.01, help='затримка sync/send homeserver\'а (с)')
+    parser.add_argument('--hs-failures', type=float, default=0.0, help='частка збоїв sync/send (0..1)')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='затримка адмін-панелі (с)')
+    parser.add_argument('--api-jitter', type=float, default=0.05, help='випадкова добавка до затримки адмін-панелі (с)')
+    parser.add_argument('--api-failures', type=float, default=0.0, help='частка збоїв адмін-панелі (0..1)')
+    parser.add_argument('--line-interval', type=float, default=0.0, help='пауза між рядками потокових відповідей (с)')
+    parser.add_argument('--drain', type=float, default=60, help='скільки чекати незавершені команди після відтворення (с)')
+    parser.add_argument('--seed', type=int, default=1, help='зерно генератора (відтворюваність)')
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'load-report.json'),
+                        help='файл JSON-звіту (за замовчуванням - у тимчасовому каталозі, не в робочому дереві)')
+    parser.add_argument('--verbose', action='store_true', help='журнал бота рівня INFO')
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error('--rate має бути додатним')
+
+    report = asyncio.run(run(args))
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_summary(report)
+    print(f"Звіт: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
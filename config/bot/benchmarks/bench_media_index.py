@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: інкрементальний індекс медіа (/media stats) проти повного обходу.
+Генерується синтетичне сховище у розкладці Dendrite (<a>/<b>/<хеш>/file та
+мініатюри), після чого вимірюються: перший обхід (порожній індекс), повторний
+обхід після додавання частки нових медіа, `du -sb` та наївний os.walk зі stat
+кожного файлу. Файли розріджені (truncate), тож вимірюються саме метадані.
+З --cold перед кожним виміром скидається page cache (потрібен root), як буває
+на великому сховищі, що не вміщується в пам'ять.
+
+Запуск: python benchmarks/bench_media_index.py [--media 20000] [--new 0.01] [--workers 8] [--cold]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media import MediaIndex  # noqa: E402
+
+
+def add_media(base: str, number: int):
+    digest = base64.urlsafe_b64encode(hashlib.sha256(str(number).encode()).digest()).decode().rstrip('=')
+    directory = os.path.join(base, digest[0], digest[1], digest[2:])
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'file'), 'wb') as f:
+        f.truncate(int(random.lognormvariate(11, 1.5)) % (10 * 1024 ** 2))
+    if number % 3 == 0:
+        for thumbnail in ('thumbnail-96x96-crop', 'thumbnail-320x240-scale'):
+            with open(os.path.join(directory, thumbnail), 'wb') as f:
+                f.truncate(8192)
+
+
+def drop_caches():
+    os.sync()
+    with open('/proc/sys/vm/drop_caches', 'w') as f:
+        f.write('3\n')
+
+
+def timed(function, cold: bool = False):
+    if cold:
+        drop_caches()
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def walk_all(base: str) -> int:
+    total = 0
+    for root, _, files in os.walk(base):
+        for name in files:
+            total += os.stat(os.path.join(root, name)).st_size
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--media', type=int, default=20000)
+    parser.add_argument('--new', type=float, default=0.01, help='частка нових медіа перед повторним обходом')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cold', action='store_true', help='скидати page cache перед кожним виміром')
+    args = parser.parse_args()
+
+    random.seed(1)
+    workdir = tempfile.mkdtemp(prefix='bench-media-')
+    base = os.path.join(workdir, 'media')
+    try:
+        for number in range(args.media):
+            add_media(base, number)
+        index = MediaIndex(base, path=os.path.join(workdir, 'index.sqlite'), workers=args.workers)
+
+        full, scan = timed(index.scan, args.cold)
+        unchanged, _ = timed(index.scan, args.cold)
+        for number in range(args.media, args.media + int(args.media * args.new)):
+            add_media(base, number)
+        incremental, rescan = timed(index.scan, args.cold)
+        du, _ = timed(lambda: subprocess.run(['du', '-sb', base], capture_output=True, check=True), args.cold)
+        walk, _ = timed(lambda: walk_all(base), args.cold)
+        report, _ = timed(index.stats, args.cold)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Медіа: {args.media}, файлів {scan['files']}, каталогів {scan['dirs']}, потоків {args.workers}"
+          f"{', холодний кеш' if args.cold else ''}")
+    print(f"Перший обхід (порожній індекс):  {full:.3f} с")
+    print(f"Повторний обхід без змін:        {unchanged:.3f} с")
+    print(f"Після +{args.new * 100:.0f}% медіа:                {incremental:.3f} с "
+          f"(перечитано каталогів: {rescan['rescanned']})")
+    print(f"du -sb:                          {du:.3f} с")
+    print(f"os.walk + stat кожного файлу:    {walk:.3f} с")
+    print(f"Звіт /media stats з індексу:     {report:.3f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: послідовний SQL-дамп (pg_dump > postgres.sql, psql < postgres.sql)
+проти паралельного дампу в каталожному форматі (scripts/postgres-backup.sh).
+У локальному Postgres створюється база з синтетичними таблицями за схемою
+найбільших таблиць Dendrite (події та їхній JSON, стан кімнат, потоки
+синхронізації, медіа) з індексами; кожен варіант відновлюється в чисту базу.
+
+Потрібні pg_dump, pg_restore, psql і користувач з правом CREATE DATABASE.
+Підключення - як у скриптів: POSTGRES_HOST, POSTGRES_PORT, POSTGRES_USER, POSTGRES_PASSWORD.
+
+Запуск: python benchmarks/bench_postgres_backup.py [--events 500000] [--jobs 4] [--compress 6]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+POSTGRES_BACKUP = os.path.join(REPO_DIR, 'scripts', 'postgres-backup.sh')
+
+SOURCE_DB = 'bench_backup_source'
+RESTORE_DB = 'bench_backup_restore'
+
+# Схема й пропорції близькі до робочої бази Dendrite: на подію припадає рядок
+# у roomserver_events, її JSON (~1.5 КБ) і запис у потоці синхронізації
+SCHEMA = """
+CREATE TABLE roomserver_rooms (
+    room_nid BIGSERIAL PRIMARY KEY,
+    room_id TEXT NOT NULL UNIQUE,
+    latest_event_nids BIGINT[] NOT NULL DEFAULT '{}',
+    room_version TEXT NOT NULL
+);
+CREATE TABLE roomserver_events (
+    event_nid BIGSERIAL PRIMARY KEY,
+    room_nid BIGINT NOT NULL,
+    event_type_nid BIGINT NOT NULL,
+    event_state_key_nid BIGINT NOT NULL,
+    sent_to_output BOOLEAN NOT NULL DEFAULT FALSE,
+    state_snapshot_nid BIGINT NOT NULL DEFAULT 0,
+    depth BIGINT NOT NULL,
+    event_id TEXT NOT NULL UNIQUE,
+    auth_event_nids BIGINT[] NOT NULL,
+    is_rejected BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE INDEX roomserver_events_room_nid_idx ON roomserver_events (room_nid, depth);
+CREATE TABLE roomserver_event_json (
+    event_nid BIGINT NOT NULL PRIMARY KEY,
+    event_json TEXT NOT NULL
+);
+CREATE TABLE roomserver_state_snapshots (
+    state_snapshot_nid BIGSERIAL PRIMARY KEY,
+    state_snapshot_hash BYTEA UNIQUE,
+    room_nid BIGINT NOT NULL,
+    state_block_nids BIGINT[] NOT NULL
+);
+CREATE TABLE syncapi_output_room_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    room_id TEXT NOT NULL,
+    headered_event_json TEXT NOT NULL,
+    type TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    contains_url BOOL NOT NULL,
+    add_state_ids TEXT[],
+    remove_state_ids TEXT[],
+    session_id BIGINT,
+    transaction_id TEXT,
+    exclude_from_sync BOOL DEFAULT FALSE
+);
+CREATE INDEX syncapi_output_room_events_room_id_idx ON syncapi_output_room_events (room_id);
+CREATE INDEX syncapi_output_room_events_type_idx ON syncapi_output_room_events (type);
+CREATE TABLE syncapi_current_room_state (
+    room_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    state_key TEXT NOT NULL,
+    headered_event_json TEXT NOT NULL,
+    membership TEXT,
+    added_at BIGINT,
+    CONSTRAINT syncapi_room_state_unique UNIQUE (room_id, type, state_key)
+);
+CREATE TABLE mediaapi_media_repository (
+    media_id TEXT NOT NULL,
+    media_origin TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    file_size_bytes BIGINT NOT NULL,
+    creation_ts BIGINT NOT NULL,
+    upload_name TEXT NOT NULL,
+    base64hash TEXT NOT NULL,
+    user_id TEXT NOT NULL
+);
+CREATE UNIQUE INDEX mediaapi_media_repository_index ON mediaapi_media_repository (media_id, media_origin);
+"""
+
+# {events} - кількість подій; решта таблиць масштабується від неї
+DATA = """
+INSERT INTO roomserver_rooms (room_id, room_version)
+    SELECT '!room' || n || ':bench.local', '10' FROM generate_series(1, greatest({events} / 500, 1)) n;
+INSERT INTO roomserver_events (room_nid, event_type_nid, event_state_key_nid, state_snapshot_nid,
+                               depth, event_id, auth_event_nids)
+    SELECT n % greatest({events} / 500, 1) + 1, n % 12 + 1, n % 7, n / 10, n,
+           '$' || md5(n::text) || ':bench.local', ARRAY[n - 1, n - 2, n - 3]
+    FROM generate_series(1, {events}) n;
+INSERT INTO roomserver_event_json (event_nid, event_json)
+    SELECT n, '{{"type":"m.room.message","content":{{"body":"' || repeat(md5(n::text), 40) || '"}}}}'
+    FROM generate_series(1, {events}) n;
+INSERT INTO roomserver_state_snapshots (state_snapshot_hash, room_nid, state_block_nids)
+    SELECT decode(md5(n::text), 'hex'), n % 100 + 1, ARRAY[n, n + 1, n + 2, n + 3]
+    FROM generate_series(1, {events} / 10) n;
+INSERT INTO syncapi_output_room_events (event_id, room_id, headered_event_json, type, sender, contains_url)
+    SELECT '$' || md5(n::text) || ':bench.local', '!room' || (n % 500) || ':bench.local',
+           '{{"event":{{"body":"' || repeat(md5(n::text), 30) || '"}}}}', 'm.room.message',
+           '@user' || (n % 1000) || ':bench.local', n % 20 = 0
+    FROM generate_series(1, {events}) n;
+INSERT INTO syncapi_current_room_state (room_id, event_id, type, sender, state_key, headered_event_json, membership)
+    SELECT '!room' || (n % 500) || ':bench.local', '$s' || md5(n::text), 'm.room.member',
+           '@user' || n || ':bench.local', '@user' || n || ':bench.local', repeat(md5(n::text), 10), 'join'
+    FROM generate_series(1, {events} / 5) n;
+INSERT INTO mediaapi_media_repository (media_id, media_origin, content_type, file_size_bytes,
+                                       creation_ts, upload_name, base64hash, user_id)
+    SELECT md5(n::text), 'bench.local', 'image/jpeg', n * 37 % 5000000, n, 'photo' || n || '.jpg',
+           md5(n::text), '@user' || (n % 1000) || ':bench.local'
+    FROM generate_series(1, {events} / 20) n;
+ANALYZE;
+"""
+
+
+def psql(database: str, sql: str, capture: bool = False) -> str:
+    result = subprocess.run(['psql', '-v', 'ON_ERROR_STOP=1', '-q', '-At', '-d', database, '-c', sql],
+                            check=True, capture_output=capture, text=True)
+    return result.stdout.strip() if capture else ''
+
+
+def recreate_database(name: str):
+    psql('postgres', f'DROP DATABASE IF EXISTS {name}')
+    psql('postgres', f'CREATE DATABASE {name}')
+
+
+def database_size(name: str) -> int:
+    return int(psql(name, 'SELECT pg_database_size(current_database())', capture=True))
+
+
+def directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def timed(command, **kwargs) -> float:
+    started = time.perf_counter()
+    subprocess.run(command, check=True, **kwargs)
+    return time.perf_counter() - started
+
+
+def table_row(name: str, dump: float, restore: float, size: int) -> str:
+    return f"{name:<28} {dump:>8.1f} с {restore:>9.1f} с {size / 1024 ** 2:>9.0f} МБ"
+
+
+def run(events: int, jobs: int, compress: str):
+    env = dict(os.environ)
+    env.setdefault('PGHOST', env.get('POSTGRES_HOST', 'localhost'))
+    env.setdefault('PGPORT', env.get('POSTGRES_PORT', '5432'))
+    env.setdefault('PGUSER', env.get('POSTGRES_USER', 'postgres'))
+    if env.get('POSTGRES_PASSWORD'):
+        env.setdefault('PGPASSWORD', env['POSTGRES_PASSWORD'])
+    os.environ.update(env)
+
+    work = tempfile.mkdtemp(prefix='bench-pg-backup-')
+    try:
+        print(f"Генерація синтетичної бази Dendrite ({events} подій)...")
+        started = time.perf_counter()
+        recreate_database(SOURCE_DB)
+        psql(SOURCE_DB, SCHEMA)
+        psql(SOURCE_DB, DATA.format(events=events))
+        source_size = database_size(SOURCE_DB)
+        print(f"База {source_size / 1024 ** 2:.0f} МБ, згенеровано за {time.perf_counter() - started:.1f} с\n")
+
+        # Послідовний SQL-дамп, як у старому backup.sh/restore.sh
+        plain = os.path.join(work, 'postgres.sql')
+        with open(plain, 'w') as output:
+            plain_dump = timed(['pg_dump', '-d', SOURCE_DB], stdout=output)
+        recreate_database(RESTORE_DB)
+        with open(plain) as source:
+            plain_restore = timed(['psql', '-q', '-v', 'ON_ERROR_STOP=1', '-d', RESTORE_DB],
+                                  stdin=source, stdout=subprocess.DEVNULL)
+        plain_size = directory_size(plain)
+
+        # Каталожний формат через postgres-backup.sh: з одним і з $jobs з'єднаннями
+        results = []
+        for job_count in sorted({1, jobs}):
+            directory = os.path.join(work, f'postgres-{job_count}.dir')
+            script_env = dict(env, BACKUP_PG_JOBS=str(job_count), BACKUP_PG_COMPRESS=compress)
+            dump = timed(['sh', POSTGRES_BACKUP, 'dump', directory],
+                         env=dict(script_env, POSTGRES_DB=SOURCE_DB), stdout=subprocess.DEVNULL)
+            recreate_database(RESTORE_DB)
+            restore = timed(['sh', POSTGRES_BACKUP, 'restore', directory],
+                            env=dict(script_env, POSTGRES_DB=RESTORE_DB), stdout=subprocess.DEVNULL)
+            results.append((job_count, dump, restore, directory_size(directory)))
+
+        restored_rows = psql(RESTORE_DB, 'SELECT count(*) FROM roomserver_events', capture=True)
+        print(f"{'Варіант':<28} {'дамп':>10} {'відновлення':>11} {'розмір':>12}")
+        print(table_row('SQL, послідовно', plain_dump, plain_restore, plain_size))
+        for job_count, dump, restore, size in results:
+            print(table_row(f"каталог, -j {job_count}, -Z {compress}", dump, restore, size))
+        _, dump, restore, _ = results[-1]
+        print(f"\nПрискорення -j {jobs} проти SQL: дамп x{plain_dump / dump:.1f}, "
+              f"відновлення x{plain_restore / restore:.1f} "
+              f"({source_size / 1024 ** 2 / restore:.0f} МБ/с бази)")
+        print(f"Перевірка: у відновленій базі {restored_rows} з {events} подій")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        for name in (SOURCE_DB, RESTORE_DB):
+            psql('postgres', f'DROP DATABASE IF EXISTS {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=500000, help='кількість синтетичних подій')
+    parser.add_argument('--jobs', type=int, default=4, help="паралельні з'єднання pg_dump/pg_restore")
+    parser.add_argument('--compress', default='6', help='стиснення pg_dump (-Z)')
+    args = parser.parse_args()
+    for tool in ('pg_dump', 'pg_restore', 'psql'):
+        if shutil.which(tool) is None:
+            parser.error(f"{tool} не знайдено в PATH")
+    run(args.events, args.jobs, args.compress)
+
+
+if __name__ == '__main__':
+    main()
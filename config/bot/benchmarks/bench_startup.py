@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: час від запуску процесу бота до відповіді на першу команду.
+Бот запускається окремим процесом (з імпортами) проти локальної заглушки
+homeserver'а. Холодний старт - вхід за паролем, теплий - збережена сесія
+з перевіркою whoami, як після перезапуску контейнера під час /update.
+
+Запуск: python benchmarks/bench_startup.py [--runs 5] [--login-latency 0.25]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from stub_admin_panel import start_stub as start_admin_stub  # noqa: E402
+from stub_homeserver import start_stub  # noqa: E402
+
+ROOM_ID = '!bench:localhost'
+SENDER = '@admin:localhost'
+FIRST_COMMAND_TIMEOUT = 30
+
+
+async def first_command_time(app, env: dict) -> float:
+    """Запуск бота та очікування його першої відповіді в кімнату"""
+    app['reset']()
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'bot.py', cwd=BOT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        replied = await asyncio.wait_for(app['replied'], FIRST_COMMAND_TIMEOUT)
+        return replied - started
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def run(runs: int, login_latency: float):
+    runner, base_url, app = await start_stub(ROOM_ID, SENDER, login_latency=login_latency)
+    admin_runner, admin_url, _ = await start_admin_stub(latency=0.01)
+    state_dir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(
+        os.environ,
+        MATRIX_HOMESERVER_URL=base_url,
+        MATRIX_BOT_USERNAME='system-bot',
+        MATRIX_BOT_PASSWORD='bench',
+        MATRIX_BOT_ROOM_ID=ROOM_ID,
+        MATRIX_BOT_ADMINS=SENDER,
+        MATRIX_BOT_STATE_DIR=state_dir,
+        MATRIX_BOT_METRICS_PORT='0',
+        ADMIN_PANEL_URL=admin_url,
+    )
+    session_file = os.path.join(state_dir, 'session.json')
+    try:
+        cold, warm = [], []
+        for _ in range(runs):
+            # Холодний старт: немає збереженої сесії
+            if os.path.exists(session_file):
+                os.unlink(session_file)
+            cold.append(await first_command_time(app, env))
+        logins_cold = app['logins']
+        for _ in range(runs):
+            warm.append(await first_command_time(app, env))
+        logins_warm = app['logins'] - logins_cold
+
+        print(f"Затримка входу за паролем: {login_latency:.3f} с, запусків: {runs}")
+        print(f"Холодний старт (пароль): медіана {statistics.median(cold):.3f} с, "
+              f"мін {min(cold):.3f} с, входів за паролем: {logins_cold}")
+        print(f"Теплий старт (сесія):    медіана {statistics.median(warm):.3f} с, "
+              f"мін {min(warm):.3f} с, входів за паролем: {logins_warm}")
+        print(f"Створено пристроїв: {len(app['devices'])}, перевірок whoami: {app['whoami']}")
+    finally:
+        await runner.cleanup()
+        await admin_runner.cleanup()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='кількість запусків кожного сценарію')
+    parser.add_argument('--login-latency', type=float, default=0.25, help='час перевірки пароля на сервері (с)')
+    args = parser.parse_args()
+    asyncio.run(run(args.runs, args.login_latency))
+
+
+if __name__ == '__main__':
+    main()
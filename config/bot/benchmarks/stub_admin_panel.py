@@ -0,0 +1,178 @@
+"""
+Заглушка API адмін-панелі для бенчмарків Matrix бота
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+SERVICES = [
+    {'name': 'dendrite', 'status': 'running'},
+    {'name': 'postgres', 'status': 'running'},
+    {'name': 'redis', 'status': 'running'},
+    {'name': 'signal-bridge', 'status': 'running'},
+    {'name': 'whatsapp-bridge', 'status': 'running'},
+    {'name': 'discord-bridge', 'status': 'running'},
+]
+
+LOG_LEVELS = ('info', 'info', 'info', 'warn', 'error')
+
+# Етапи потокового бекапу: рядки, які видає скрипт backup.sh
+BACKUP_LINES = (
+    '[PROGRESS] postgres tables=12/48',
+    '[PROGRESS] postgres tables=36/48',
+    '[STATS] postgres_dump tables=48 db_bytes=734003200 bytes=104857600 seconds=42 jobs=4',
+    '[PROGRESS] media hashed=1200 stored=35 stored_bytes=73400320',
+    '[STATS] media files=5200 bytes=2147483648 hashed=1200 hashed_bytes=268435456 '
+    'new_objects=35 new_bytes=73400320 store_bytes=1932735283 seconds=18',
+    '[STATS] backup name=bench bytes=178257920 seconds=61',
+)
+
+
+def create_app(latency: float = 0.2, failure_rate: float = 0.0, jitter: float = 0.0,
+               seed: int = None, line_interval: float = 0.0, rate_limit: int = 0,
+               rate_window: float = 900) -> web.Application:
+    """
+    Створення aiohttp застосунку з затримкою відповіді `latency` секунд
+    (плюс випадкові до `jitter`). Частка `failure_rate` запитів отримує
+    HTTP 500; потокові відповіді (логи, бекап) віддають рядки з паузою
+    `line_interval` між ними. `rate_limit` > 0 моделює express-rate-limit
+    адмін-панелі: понад `rate_limit` запитів за `rate_window` с - текстова
+    відповідь 429 з Retry-After. Лічильники викликів - app['calls'],
+    app['failures'] та app['rate_limited'], за маршрутом - app['routes'];
+    створені користувачі - app['users'].
+    """
+    rng = random.Random(seed)
+    state = {s['name']: dict(s) for s in SERVICES}
+    window = {'started': time.monotonic(), 'count': 0}
+
+    def services():
+        return list(state.values())
+
+    async def delay():
+        await asyncio.sleep(latency + (rng.uniform(0, jitter) if jitter else 0))
+
+    async def status(request):
+        return web.json_response({'success': True, 'services': services()})
+
+    async def health(request):
+        health = [{'name': s['name'], 'status': s['status'], 'healthy': s['status'] == 'running'}
+                  for s in services()]
+        healthy = sum(1 for item in health if item['healthy'])
+        return web.json_response({
+            'success': True,
+            'health': health,
+            'summary': {'total': len(health), 'healthy': healthy, 'unhealthy': len(health) - healthy}
+        })
+
+    async def service_action(request):
+        action, name = request.match_info['action'], request.match_info['name']
+        if name not in state:
+            return web.json_response({'success': False, 'error': f"Сервіс {name} не знайдено"}, status=404)
+        state[name]['status'] = 'exited' if action == 'stop' else 'running'
+        return web.json_response({'success': True, 'message': f"{name}: {action}"})
+
+    async def stream(request, lines) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/plain; charset=utf-8'})
+        await response.prepare(request)
+        for line in lines:
+            await response.write(line.encode() + b'\n')
+            if line_interval:
+                await asyncio.sleep(line_interval)
+        await response.write_eof()
+        return response
+
+    async def logs_stream(request):
+        service = request.match_info['service']
+        count = min(int(request.query.get('lines') or 100), int(request.query.get('limit') or 100000))
+        level = request.query.get('level')
+        started = time.time() - count
+
+        def lines():
+            for i in range(count):
+                line_level = LOG_LEVELS[i % len(LOG_LEVELS)]
+                if level and line_level != level:
+                    continue
+                stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(started + i))
+                yield (f'{stamp}Z level={line_level} msg="{service}: processed request" '
+                       f'request_id={rng.getrandbits(48):012x} duration_ms={rng.randint(1, 900)}')
+
+        return await stream(request, lines())
+
+    async def backup_create(request):
+        return await stream(request, BACKUP_LINES + ('[EXIT] code=0',))
+
+    async def backups(request):
+        return web.json_response({'success': True, 'backups': [], 'total': 0})
+
+    def register(user) -> dict:
+        # Як registerMatrixUser у server.js: помилка з errcode та статусом Dendrite
+        username = user.get('username')
+        if username in app['users']:
+            return {'success': False, 'status': 400, 'errcode': 'M_USER_IN_USE', 'error': 'Desired user ID is already taken.'}
+        app['users'].add(username)
+        return {'success': True}
+
+    async def users_create(request):
+        result = register(await request.json())
+        return web.json_response(result, status=result.get('status', 200))
+
+    async def users_batch(request):
+        users = (await request.json()).get('users')
+        if not isinstance(users, list) or not 0 < len(users) <= 500:
+            return web.json_response({'success': False, 'error': 'Потрібен масив users (1-500 записів)'}, status=400)
+        return web.json_response({'success': True, 'results': [
+            {'username': user.get('username'), **register(user)} for user in users]})
+
+    app = web.Application()
+    app['calls'] = 0
+    app['failures'] = 0
+    app['rate_limited'] = 0
+    app['routes'] = {}
+    app['users'] = set()
+
+    @web.middleware
+    async def inject(request, handler):
+        app['calls'] += 1
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        app['routes'][route] = app['routes'].get(route, 0) + 1
+        if rate_limit:
+            now = time.monotonic()
+            if now - window['started'] >= rate_window:
+                window['started'], window['count'] = now, 0
+            window['count'] += 1
+            if window['count'] > rate_limit:
+                app['rate_limited'] += 1
+                retry_after = max(1, int(window['started'] + rate_window - now + 0.999))
+                return web.Response(status=429, text='Too many requests, please try again later.',
+                                    headers={'Retry-After': str(retry_after)})
+        await delay()
+        if failure_rate and rng.random() < failure_rate:
+            app['failures'] += 1
+            return web.json_response({'success': False, 'error': 'Штучний збій заглушки'}, status=500)
+        return await handler(request)
+
+    app.middlewares.append(inject)
+    app.router.add_get('/api/status', status)
+    app.router.add_get('/api/health', health)
+    app.router.add_post('/api/service/{action}/{name}', service_action)
+    app.router.add_get('/api/logs/{service}/stream', logs_stream)
+    app.router.add_get('/api/backups', backups)
+    app.router.add_post('/api/backups/create', backup_create)
+    app.router.add_post('/api/users/create', users_create)
+    app.router.add_post('/api/users/batch', users_batch)
+    return app
+
+
+async def start_stub(host: str = '127.0.0.1', port: int = 0, latency: float = 0.2, **kwargs):
+    """Запуск заглушки; повертає (runner, base_url, app)"""
+    app = create_app(latency, **kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}", app
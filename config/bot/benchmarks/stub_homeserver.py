@@ -0,0 +1,177 @@
+"""
+Заглушка Matrix homeserver для бенчмарків Matrix бота
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import itertools
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+API = '/_matrix/client/r0'
+
+
+def create_app(room_id: str, sender: str, command: str = '/jobs', login_latency: float = 0.25,
+               latency: float = 0.0, failure_rate: float = 0.0, seed: int = None) -> web.Application:
+    """
+    Застосунок, що видає одну команду `command` у кімнаті `room_id` першою
+    синхронізацією після reset(). `login_latency` імітує перевірку пароля
+    (bcrypt) на сервері. Час першої відповіді бота потрапляє в app['replied'].
+
+    Для навантажувальних бенчмарків `command=None`, а команди додаються
+    через app['inject'](body) і будять long-poll sync одразу. `latency` -
+    затримка sync та send, частка `failure_rate` цих запитів отримує HTTP 500.
+    Надіслані ботом події рахуються в app['sent'].
+    """
+    app = web.Application()
+    app['tokens'] = {}
+    app['devices'] = set()
+    app['logins'] = 0
+    app['whoami'] = 0
+    app['sent'] = 0
+    app['failures'] = 0
+    app['pending'] = []
+    batches = itertools.count(1)
+    rng = random.Random(seed)
+    wakeup = asyncio.Event()
+
+    def inject(body: str, room: str = room_id) -> str:
+        """Команда з'явиться в наступній синхронізації; повертає event_id"""
+        event = {
+            'type': 'm.room.message',
+            'event_id': f"${uuid.uuid4().hex}",
+            'sender': sender,
+            'content': {'msgtype': 'm.text', 'body': body},
+        }
+        app['pending'].append((room, event))
+        wakeup.set()
+        return event['event_id']
+
+    def reset():
+        app['pending'].clear()
+        app['replied'] = asyncio.get_running_loop().create_future()
+        if command:
+            inject(command)
+
+    app['inject'] = inject
+    app['reset'] = reset
+    app['replied'] = None
+
+    async def injected_failure() -> bool:
+        if latency:
+            await asyncio.sleep(latency)
+        if failure_rate and rng.random() < failure_rate:
+            app['failures'] += 1
+            return True
+        return False
+
+    def error(status: int, errcode: str, message: str):
+        return web.json_response({'errcode': errcode, 'error': message}, status=status)
+
+    def access_token(request) -> str:
+        # matrix-nio передає токен параметром запиту, інші клієнти - заголовком
+        return request.query.get('access_token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+
+    def authorized(request) -> bool:
+        return access_token(request) in app['tokens']
+
+    async def versions(request):
+        return web.json_response({'versions': ['r0.6.1', 'v1.1']})
+
+    async def login(request):
+        body = await request.json()
+        await asyncio.sleep(login_latency)
+        if not body.get('password'):
+            return error(403, 'M_FORBIDDEN', 'Invalid password')
+        app['logins'] += 1
+        user = body.get('identifier', {}).get('user', 'bot')
+        user_id = user if user.startswith('@') else f"@{user}:localhost"
+        device_id = body.get('device_id') or uuid.uuid4().hex[:10].upper()
+        app['devices'].add(device_id)
+        access_token = uuid.uuid4().hex
+        app['tokens'][access_token] = user_id
+        return web.json_response({'user_id': user_id, 'device_id': device_id, 'access_token': access_token})
+
+    async def whoami(request):
+        app['whoami'] += 1
+        if not authorized(request):
+            return error(401, 'M_UNKNOWN_TOKEN', 'Unknown token')
+        return web.json_response({'user_id': app['tokens'][access_token(request)]})
+
+    async def upload_filter(request):
+        if not authorized(request):
+            return error(401, 'M_UNKNOWN_TOKEN', 'Unknown token')
+        return web.json_response({'filter_id': '1'})
+
+    async def sync(request):
+        if not authorized(request):
+            return error(401, 'M_UNKNOWN_TOKEN', 'Unknown token')
+        if not app['pending']:
+            timeout_ms = int(request.query.get('timeout', '0'))
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), min(timeout_ms, 30000) / 1000)
+            except asyncio.TimeoutError:
+                pass
+        if request.transport is None or request.transport.is_closing():
+            # Клієнт (зупинений процес бота) вже відключився - події лишаються наступному
+            return web.Response(status=499)
+        if await injected_failure():
+            return error(500, 'M_UNKNOWN', 'Injected failure')
+        rooms = {}
+        events, app['pending'] = app['pending'], []
+        for room, event in events:
+            # Час сервера - момент видачі: бот ігнорує події, старші за свій запуск
+            event['origin_server_ts'] = int(time.time() * 1000)
+            rooms.setdefault(room, {
+                'timeline': {'events': [], 'limited': False, 'prev_batch': 'p0'},
+                'state': {'events': []},
+                'ephemeral': {'events': []},
+                'account_data': {'events': []},
+            })['timeline']['events'].append(event)
+        return web.json_response({
+            'next_batch': f"s{next(batches)}",
+            'rooms': {'join': rooms, 'invite': {}, 'leave': {}},
+            'to_device': {'events': []},
+            'presence': {'events': []},
+            'account_data': {'events': []},
+        })
+
+    async def send(request):
+        if not authorized(request):
+            return error(401, 'M_UNKNOWN_TOKEN', 'Unknown token')
+        if await injected_failure():
+            return error(500, 'M_UNKNOWN', 'Injected failure')
+        app['sent'] += 1
+        if app['replied'] is not None and not app['replied'].done():
+            app['replied'].set_result(time.perf_counter())
+        return web.json_response({'event_id': f"${uuid.uuid4().hex}"})
+
+    async def upload(request):
+        if not authorized(request):
+            return error(401, 'M_UNKNOWN_TOKEN', 'Unknown token')
+        await request.read()
+        return web.json_response({'content_uri': f"mxc://localhost/{uuid.uuid4().hex}"})
+
+    app.router.add_get('/_matrix/client/versions', versions)
+    app.router.add_post(f'{API}/login', login)
+    app.router.add_get(f'{API}/account/whoami', whoami)
+    app.router.add_post(API + '/user/{user_id}/filter', upload_filter)
+    app.router.add_get(f'{API}/sync', sync)
+    app.router.add_put(API + '/rooms/{room_id}/send/{event_type}/{txn_id}', send)
+    app.router.add_post('/_matrix/media/r0/upload', upload)
+    return app
+
+
+async def start_stub(room_id: str, sender: str, host: str = '127.0.0.1', port: int = 0, **kwargs):
+    """Запуск заглушки; повертає (runner, base_url, app)"""
+    app = create_app(room_id, sender, **kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}", app
@@ -5,15 +5,82 @@ Matrix Bot для керування Matrix Dendrite сервером
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import os
-import requests
+import shutil
+import tempfile
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 import nio
 
+from admin_api import AdminApiClient, AdminApiError
+from backups import (
+    BACKUP_READ_TIMEOUT,
+    ProgressThrottle,
+    backups_list_endpoint,
+    format_backup_list,
+    format_progress,
+    format_stats,
+    parse_exit_code,
+    parse_list_args,
+    parse_stats,
+)
+from alerts import AlertManager
+from db import DatabaseDiagnostics, DatabaseError, format_db_report, parse_db_args
+from errors import ErrorScanner, format_errors, parse_errors_args
+from fanout import ServiceFanout, expand_targets, format_fanout_results, order_tiers
+from health_monitor import HealthMonitor
+from logs import (
+    LOGS_FOLLOW_DURATION,
+    LOGS_FOLLOW_INTERVAL,
+    LOGS_PAGE_CHARS,
+    LogPager,
+    logs_stream_endpoint,
+    parse_logs_args,
+)
+from media import MediaIndex, format_media_retention, format_media_stats, parse_media_args
+from metrics import (
+    STATS,
+    SYNC_ERRORS,
+    SYNC_LATENCY,
+    monitor_event_loop,
+    start_metrics_server,
+)
+from outbox import Outbox
+from probe import PROBE_ROOM_ID, LatencyProbe, format_latency
+from rollout import RollingUpdate, format_update_results
+from scheduler import CommandScheduler
+from state_store import StateFile
+from users import (
+    USERS_IMPORT_FILE_TTL,
+    USERS_IMPORT_PROGRESS_INTERVAL,
+    USERS_IMPORT_USAGE,
+    ImportResults,
+    UserImport,
+    UserIndex,
+    download_media,
+    format_import_progress,
+    format_user_list,
+    normalize_localpart,
+    parse_user_list_args,
+    read_import_rows,
+)
+from top import (
+    TOP_SAMPLE_INTERVAL,
+    TOP_WATCH_DURATION,
+    TOP_WATCH_INTERVAL,
+    TOP_WATCH_MAX_FAILURES,
+    TopSampleError,
+    TopSampler,
+    compute_rates,
+    format_top,
+    parse_top_args,
+)
+
 # Налаштування логування
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,23 +90,188 @@ logger = logging.getLogger(__name__)
 ALLOWED_ROOMS = os.getenv('MATRIX_BOT_ROOM_ID', '').split(',')  # Можна перелік через кому
 ALLOWED_USERS = os.getenv('MATRIX_BOT_ADMINS', '').split(',')   # user_id через кому
 
+# --- СИНХРОНІЗАЦІЯ ---
+# Таймаут long-poll sync на стороні сервера (мс)
+SYNC_TIMEOUT_MS = int(os.getenv('MATRIX_SYNC_TIMEOUT_MS', '30000'))
+# Максимальна пауза між повторними спробами sync після помилок (с)
+SYNC_MAX_BACKOFF = 60
+# Скільки останніх подій timeline на кімнату повертати в одній відповіді sync
+SYNC_TIMELINE_LIMIT = int(os.getenv('MATRIX_SYNC_TIMELINE_LIMIT', '10'))
+# Команди, надіслані, поки бот не працював, виконуються після старту, якщо вони не старші
+# за це вікно (с); 0 - лише команди після запуску
+SYNC_BACKLOG_MAX_AGE = int(os.getenv('MATRIX_BOT_BACKLOG_MAX_AGE', '600'))
+
+# --- СЕСІЯ ---
+# Назва пристрою бота в списку пристроїв облікового запису
+BOT_DEVICE_NAME = 'matrix-admin-bot'
+# Коди помилок, з якими сервер відхиляє збережений токен
+TOKEN_REJECTED_ERRORS = {'M_UNKNOWN_TOKEN', 'M_MISSING_TOKEN'}
+
+
+# --- КОМАНДИ ---
+# Службові команди виконуються одразу, поза пулами: /cancel має працювати, навіть коли пули зайняті
+CONTROL_COMMANDS = {'/help', '/jobs', '/cancel'}
+# Підкоманди, що лише читають дані: окремий пул читання, без блокувань сервісів
+READ_ONLY_COMMANDS = {
+    '/help': None,
+    '/status': None,
+    '/logs': None,
+    '/errors': None,
+    '/health': None,
+    '/jobs': None,
+    '/cancel': None,
+    '/top': None,
+    '/latency': None,
+    '/db': None,
+    '/media': None,
+    '/backup': {'list'},
+    '/user': {'list'},
+    '/bridges': {'status'},
+}
+
+
+def command_lock_keys(command: str, args: List[str], room_id: str,
+                      known: Optional[List[str]] = None) -> Optional[List[str]]:
+    """
+    Ключі блокувань для команди; None - команда лише для читання.
+    Шаблони сервісів розгортаються за `known` (назви з /api/status), тож `/restart dend*`
+    і `/restart dendrite` блокують той самий ключ 'service:dendrite'.
+    """
+    if command in READ_ONLY_COMMANDS:
+        subcommands = READ_ONLY_COMMANDS[command]
+        if subcommands is None or (args and args[0] in subcommands):
+            return None
+    
+    known = known or []
+    if command in ('/start', '/stop', '/restart') and args:
+        targets, _ = expand_targets(args, known)
+        return [f"service:{name}" for name in targets] or [f"room:{room_id}"]
+    if command == '/bridges' and len(args) > 1:
+        targets, _ = expand_targets(args[1:], [name for name in known if name.endswith('-bridge')])
+        return [f"service:{name}" for name in targets] or [f"room:{room_id}"]
+    if command == '/update':
+        # Оновлення перестворює контейнери - блокує всі свої сервіси (без аргументів - усі)
+        patterns = [] if args and args[0].lower() == 'all' else args
+        targets = expand_targets(patterns, known)[0] if patterns else known
+        return ['update'] + [f"service:{name}" for name in targets]
+    if command == '/backup':
+        return ['backup']
+    if command == '/user' and args and args[0] == 'import':
+        return ['user-import']
+    # Решта змінюючих команд виконується по черзі в межах кімнати
+    return [f"room:{room_id}"]
+
+
+def needs_service_names(command: str, args: List[str]) -> bool:
+    """Чи потрібен перелік сервісів для ключів блокувань (glob-шаблони або /update)"""
+    if command == '/update':
+        return True
+    if command in ('/start', '/stop', '/restart') or (command == '/bridges' and args[:1] == ['restart']):
+        return any(ch in arg for arg in args for ch in '*?[')
+    return False
+
+
+def build_sync_filter(rooms: List[str]) -> Dict[str, Any]:
+    """Фільтр sync: лише дозволені кімнати та m.room.message, без presence/ephemeral"""
+    room_filter = {
+        'timeline': {'types': ['m.room.message'], 'limit': SYNC_TIMELINE_LIMIT},
+        'state': {'types': ['m.room.member'], 'lazy_load_members': True},
+        'ephemeral': {'not_types': ['*']},
+        'account_data': {'not_types': ['*']},
+    }
+    rooms = [r for r in rooms if r]
+    if rooms:
+        room_filter['rooms'] = rooms
+    return {
+        'presence': {'not_types': ['*']},
+        'account_data': {'not_types': ['*']},
+        'room': room_filter,
+    }
+
 class MatrixAdminBot:
     def __init__(self):
         # Змінні середовища
         self.homeserver_url = os.getenv('MATRIX_HOMESERVER_URL', 'http://dendrite:8008')
         self.bot_username = os.getenv('MATRIX_BOT_USERNAME', 'system-bot')
         self.bot_password = os.getenv('MATRIX_BOT_PASSWORD', '')
-        self.admin_room_id = os.getenv('MATRIX_BOT_ROOM_ID', '')
+        self.admin_room_id = os.getenv('MATRIX_BOT_ROOM_ID', '').split(',')[0]
         self.admin_panel_url = os.getenv('ADMIN_PANEL_URL', 'http://admin-panel:3000')
         
         # Matrix клієнт
         self.client = None
         
+        # Черга вихідних повідомлень (rate limit, повтори, об'єднання)
+        self.outbox = Outbox(self.room_send)
+        
+        # Клієнт API адмін-панелі (пул з'єднань)
+        self.admin_api = AdminApiClient(self.admin_panel_url)
+        
+        # Планувальник команд (пул задач, блокування сервісів)
+        self.scheduler = CommandScheduler()
+        
+        # Паралельні дії над кількома сервісами
+        self.fanout = ServiceFanout(self.admin_api)
+        
+        # Моніторинг стану контейнерів за подіями Docker
+        self.health_monitor = HealthMonitor(self.admin_api, self.healthcheck_notification)
+        
+        # Сповіщення з гістерезисом та дайджестами (стан зберігається на диску)
+        self.alerts = AlertManager(self.send_notification)
+        
+        # Синтетична проба затримок homeserver (тривоги - через той самий AlertManager)
+        self.probe = LatencyProbe(lambda: self.client, self.alerts)
+        
+        # Діагностика Postgres Dendrite (/db): власний невеликий пул, звіти кешуються
+        self.db = DatabaseDiagnostics()
+        
+        # Зведення помилок з логів усіх сервісів (/errors)
+        self.error_scanner = ErrorScanner(self.admin_api)
+        
+        # Інкрементальний індекс медіа-сховища для /media
+        self.media = MediaIndex()
+        
+        # Локальний індекс користувачів для /user list та перевірки дублікатів при імпорті
+        self.users = UserIndex(self.db, self.admin_api)
+        # Останній файл, завантажений у кімнату (для /user import): room_id -> (час, mxc, ім'я)
+        self.uploads: Dict[str, Tuple[float, str, str]] = {}
+        
+        # Внутрішні лічильники для /metrics
+        STATS.register('cache', self.admin_api.cache.stats, counters=('hits', 'misses', 'coalesced'))
+        STATS.register('db_cache', self.db.cache.stats, counters=('hits', 'misses', 'coalesced'))
+        STATS.register('scheduler', self.scheduler.stats)
+        STATS.register('outbox', self.outbox.stats, counters=('sent', 'merged', 'dropped', 'retries', 'rate_limited'))
+        STATS.register('health_monitor', lambda: {
+            'events': self.health_monitor.events_received,
+            'reconciles': self.health_monitor.reconciles,
+            'connected': int(self.health_monitor.connected),
+        }, counters=('events', 'reconciles'))
+        STATS.register('alerts', lambda: {
+            'digests': self.alerts.sent_digests,
+            'suppressed': self.alerts.suppressed,
+            'firing': len(self.alerts.firing()),
+        }, counters=('digests', 'suppressed'))
+        
+        # Стан синхронізації (next_batch) між перезапусками
+        self.sync_state = StateFile('sync.json')
+        
+        # Сесія Matrix (токен доступу та пристрій) між перезапусками
+        self.session_state = StateFile('session.json')
+        
+        # Перша успішна синхронізація - фонові задачі стартують після неї
+        self.synced = asyncio.Event()
+        
+        # Час запуску бота (мс) та межа, старші за яку події ігноруються. Без збереженого
+        # next_batch перша синхронізація віддає історію кімнати, тож межа - сам запуск;
+        # зі збереженим токеном сервер віддає лише пропущене, і воно виконується (див. sync_loop)
+        self.started_at_ms = int(time.time() * 1000)
+        self.events_after_ms = self.started_at_ms
+        
         # Команди бота
         self.commands = {
             '/help': self.cmd_help,
             '/status': self.cmd_status,
             '/logs': self.cmd_logs,
+            '/errors': self.cmd_errors,
             '/start': self.cmd_start,
             '/stop': self.cmd_stop,
             '/restart': self.cmd_restart,
@@ -47,7 +279,13 @@ class MatrixAdminBot:
             '/user': self.cmd_user,
             '/bridges': self.cmd_bridges,
             '/health': self.cmd_health,
+            '/top': self.cmd_top,
+            '/latency': self.cmd_latency,
+            '/db': self.cmd_db,
+            '/media': self.cmd_media,
             '/update': self.cmd_update,
+            '/jobs': self.cmd_jobs,
+            '/cancel': self.cmd_cancel,
         }
 
     async def start(self):
@@ -56,35 +294,148 @@ class MatrixAdminBot:
             # Створення Matrix клієнта
             self.client = nio.AsyncClient(self.homeserver_url, self.bot_username)
             
-            # Авторизація
-            response = await self.client.login(self.bot_password)
-            if response.status_code != 200:
-                logger.error(f"Помилка авторизації: {response.status_code}")
+            # Авторизація: збережена сесія або пароль
+            if not await self.login():
                 return
             
-            logger.info(f"Бот {self.bot_username} успішно авторизований")
-            
             # Реєстрація callback для обробки повідомлень
             self.client.add_event_callback(self.on_message, nio.RoomMessageText)
+            self.client.add_event_callback(self.on_file, nio.RoomMessageFile)
+            if self.probe.enabled:
+                self.client.add_event_callback(self.probe.on_event, nio.RoomMessageNotice)
             
-            # Синхронізація
-            await self.client.sync()
-            
-            # Основний цикл
-            while True:
-                try:
-                    await self.client.sync()
-                    await asyncio.sleep(1)
-                except Exception as e:
-                    logger.error(f"Помилка синхронізації: {e}")
-                    await asyncio.sleep(5)
+            # Основний цикл синхронізації
+            await self.sync_loop()
                     
         except Exception as e:
             logger.error(f"Помилка запуску бота: {e}")
 
+    async def login(self) -> bool:
+        """Відновлення збереженої сесії; вхід за паролем - лише якщо сервер відхилив токен"""
+        session = self.session_state.load()
+        if (session.get('access_token') and session.get('homeserver') == self.homeserver_url
+                and session.get('username') == self.bot_username):
+            self.client.restore_login(session['user_id'], session['device_id'], session['access_token'])
+            response = await self.client.whoami()
+            if isinstance(response, nio.responses.WhoamiResponse):
+                logger.info(f"Бот {response.user_id} використовує збережену сесію (пристрій {session['device_id']})")
+                return True
+            if response.status_code not in TOKEN_REJECTED_ERRORS:
+                # Тимчасова помилка сервера - токен лишається, sync повторюватиме запити
+                logger.warning(f"Не вдалося перевірити сесію ({response.message}), продовжуємо зі збереженим токеном")
+                return True
+            logger.warning(f"Збережений токен відхилено ({response.status_code}), вхід за паролем")
+        return await self.password_login(session.get('device_id'))
+
+    async def password_login(self, device_id: Optional[str] = None) -> bool:
+        """Вхід за паролем із повторним використанням пристрою та збереженням сесії"""
+        # З device_id Dendrite видає новий токен тому самому пристрою замість створення нового
+        self.client.device_id = device_id or ''
+        response = await self.client.login(self.bot_password, device_name=BOT_DEVICE_NAME)
+        if not isinstance(response, nio.LoginResponse):
+            logger.error(f"Помилка авторизації: {response.message}")
+            return False
+        
+        previous = self.session_state.load()
+        if previous.get('user_id') not in (None, response.user_id):
+            # Інший обліковий запис - токен sync та фільтр попереднього недійсні
+            self.sync_state.save({})
+        self.session_state.save({
+            'homeserver': self.homeserver_url,
+            'username': self.bot_username,
+            'user_id': response.user_id,
+            'device_id': response.device_id,
+            'access_token': response.access_token,
+        })
+        logger.info(f"Бот {response.user_id} успішно авторизований (пристрій {response.device_id})")
+        return True
+
+    async def get_sync_filter_id(self) -> Optional[str]:
+        """ID фільтра sync: завантажується на сервер один раз і кешується на диску"""
+        rooms = [room for room in ALLOWED_ROOMS if room]
+        # Кімната проби додається лише до явного переліку (без переліку - і так усі кімнати)
+        sync_filter = build_sync_filter(rooms + [PROBE_ROOM_ID] if rooms else rooms)
+        # Фільтри прив'язані до користувача, тому він входить у ключ кешу
+        filter_key = json.dumps([self.bot_username, sync_filter], sort_keys=True)
+        filter_hash = hashlib.sha256(filter_key.encode()).hexdigest()
+        
+        state = self.sync_state.load()
+        if state.get('filter_hash') == filter_hash and state.get('filter_id'):
+            return state['filter_id']
+        
+        response = await self.client.upload_filter(
+            presence=sync_filter['presence'],
+            account_data=sync_filter['account_data'],
+            room=sync_filter['room'],
+        )
+        if isinstance(response, nio.UploadFilterError):
+            logger.error(f"Помилка завантаження фільтра sync: {response.message}")
+            return None
+        
+        self.sync_state.update(filter_id=response.filter_id, filter_hash=filter_hash)
+        logger.info(f"Фільтр sync завантажено: {response.filter_id}")
+        return response.filter_id
+
+    async def sync_loop(self):
+        """Long-poll синхронізація з збереженням next_batch"""
+        since = self.sync_state.load().get('next_batch')
+        sync_filter = await self.get_sync_filter_id()
+        if since:
+            logger.info("Відновлення синхронізації із збереженого токена")
+            # Пропущені під час простою команди, але не давніші за SYNC_BACKLOG_MAX_AGE
+            self.events_after_ms = self.started_at_ms - SYNC_BACKLOG_MAX_AGE * 1000
+        
+        backoff = 1
+        while True:
+            try:
+                # Перший запит без long-poll: накопичені команди обробляються одразу після старту
+                timeout = SYNC_TIMEOUT_MS if self.synced.is_set() else 0
+                with SYNC_LATENCY.time():
+                    response = await self.client.sync(timeout=timeout, sync_filter=sync_filter, since=since)
+                if isinstance(response, nio.SyncError):
+                    SYNC_ERRORS.inc()
+                    logger.error(f"Помилка синхронізації: {response.message}")
+                    if response.status_code in TOKEN_REJECTED_ERRORS:
+                        # Токен відкликано під час роботи - новий вхід тим самим пристроєм
+                        await self.password_login(self.client.device_id)
+                    elif sync_filter and 'filter' in (response.message or '').lower():
+                        # Сервер не знає кешований фільтр - завантажуємо заново
+                        self.sync_state.update(filter_id=None, filter_hash=None)
+                        sync_filter = await self.get_sync_filter_id()
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, SYNC_MAX_BACKOFF)
+                    continue
+                
+                backoff = 1
+                self.synced.set()
+                if response.next_batch != since:
+                    since = response.next_batch
+                    self.sync_state.update(next_batch=since)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                SYNC_ERRORS.inc()
+                logger.error(f"Помилка синхронізації: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, SYNC_MAX_BACKOFF)
+
+    async def on_file(self, room, event):
+        """Файли від адміністраторів запам'ятовуються для /user import"""
+        if getattr(event, 'server_timestamp', 0) < self.events_after_ms:
+            return
+        if room.room_id not in ALLOWED_ROOMS or (ALLOWED_USERS and event.sender not in ALLOWED_USERS):
+            return
+        if event.sender == self.client.user_id:
+            return
+        self.uploads[room.room_id] = (time.time(), event.url, event.body)
+
     async def on_message(self, room, event):
         """Обробка повідомлень"""
         try:
+            # Пропускаємо історію до запуску та застарілі команди з часу простою
+            if getattr(event, 'server_timestamp', 0) < self.events_after_ms:
+                return
+            
             # Перевірка чи це текстове повідомлення
             if hasattr(event, 'body'):
                 body = event.body.strip()
@@ -109,9 +460,17 @@ class MatrixAdminBot:
             command = parts[0].lower()
             args = parts[1:] if len(parts) > 1 else []
             
-            # Виконання команди
+            # Виконання команди як окремої задачі (не блокує sync)
             if command in self.commands:
-                await self.commands[command](room, args)
+                handler = self.commands[command]
+                known = await self.known_services() if needs_service_names(command, args) else None
+                self.scheduler.submit(
+                    command, args, room.room_id, sender,
+                    handler=lambda: handler(room, args),
+                    on_error=self.on_job_error,
+                    lock_keys=command_lock_keys(command, args, room.room_id, known),
+                    pooled=command not in CONTROL_COMMANDS,
+                )
             else:
                 await self.send_message(room.room_id, f"Невідома команда: {command}. Використайте /help для списку команд.")
                 
@@ -119,39 +478,70 @@ class MatrixAdminBot:
             logger.error(f"Помилка обробки повідомлення: {e}")
             await self.send_message(room.room_id, f"Помилка обробки команди: {e}")
 
-    async def send_message(self, room_id: str, message: str):
-        """Надсилання повідомлення"""
+    async def known_services(self) -> List[str]:
+        """Назви сервісів з /api/status (кеш); порожній перелік, якщо адмін-панель недоступна"""
+        response = await self.call_admin_api('status')
+        if not response.get('success'):
+            return []
+        return [s['name'] for s in response.get('services', [])]
+
+    async def on_job_error(self, job, error: BaseException):
+        """Повідомлення про скасування або збій задачі"""
+        if isinstance(error, asyncio.CancelledError):
+            await self.send_message(job.room_id, f"⏹ Задачу #{job.id} (`{job.title}`) скасовано")
+        else:
+            await self.send_message(job.room_id, f"Помилка обробки команди: {error}")
+
+    async def send_message(self, room_id: str, message: str, mergeable: bool = True) -> Optional[asyncio.Future]:
+        """
+        Надсилання повідомлення через чергу кімнати; future отримає event_id.
+        Повідомлення, які потім редагуються (edit_message), надсилаються з mergeable=False.
+        """
+        if self.client is None:
+            return None
+        return self.outbox.enqueue(room_id, {
+            'msgtype': 'm.text',
+            'body': message
+        }, mergeable=mergeable)
+
+    def edit_message(self, room_id: str, event_id: str, message: str) -> Optional[asyncio.Future]:
+        """Заміна тексту вже надісланого повідомлення (m.replace); future отримає event_id правки"""
+        if self.client is None:
+            return None
+        return self.outbox.enqueue(room_id, {
+            'msgtype': 'm.text',
+            'body': f"* {message}",
+            'm.new_content': {'msgtype': 'm.text', 'body': message},
+            'm.relates_to': {'rel_type': 'm.replace', 'event_id': event_id},
+        })
+
+    async def room_send(self, room_id: str, content: dict):
+        """Безпосереднє надсилання події m.room.message (використовується чергою)"""
+        return await self.client.room_send(room_id, 'm.room.message', content)
+
+    async def send_file(self, room_id: str, path: str, filename: str, content_type: str = 'text/plain'):
+        """Завантаження файлу на сервер та надсилання його як m.file"""
         try:
-            if self.client is not None:
-                await self.client.room_send(
-                    room_id,
-                    'm.room.message',
-                    {
-                        'msgtype': 'm.text',
-                        'body': message
-                    }
-                )
+            if self.client is None:
+                return
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                response, _ = await self.client.upload(f, content_type=content_type, filename=filename, filesize=size)
+            if isinstance(response, nio.UploadError):
+                logger.error(f"Помилка завантаження файлу: {response.message}")
+                return
+            self.outbox.enqueue(room_id, {
+                'msgtype': 'm.file',
+                'body': filename,
+                'url': response.content_uri,
+                'info': {'size': size, 'mimetype': content_type}
+            })
         except Exception as e:
-            logger.error(f"Помилка надсилання повідомлення: {e}")
+            logger.error(f"Помилка надсилання файлу: {e}")
 
-    def call_admin_api(self, endpoint: str, method: str = 'GET', data: dict = None) -> dict:
+    async def call_admin_api(self, endpoint: str, method: str = 'GET', data: dict = None) -> dict:
         """Виклик API адмін-панелі"""
-        try:
-            url = f"{self.admin_panel_url}/api/{endpoint}"
-            headers = {'Content-Type': 'application/json'}
-            
-            if method == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, json=data)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers)
-            else:
-                return {'success': False, 'error': 'Непідтримуваний метод'}
-            
-            return response.json()
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        return await self.admin_api.request(endpoint, method, data)
 
     # Команди бота
     async def cmd_help(self, room, args):
@@ -161,28 +551,43 @@ class MatrixAdminBot:
 
 **Сервіси:**
 • `/status` - статус всіх сервісів
-• `/start <service>` - запустити сервіс
-• `/stop <service>` - зупинити сервіс
-• `/restart <service>` - перезапустити сервіс
+• `/start <service> [...]` - запустити сервіси
+• `/stop <service> [...]` - зупинити сервіси
+• `/restart <service> [...]` - перезапустити сервіси (glob: `/restart dendrite *-bridge`)
 • `/logs <service> [lines]` - логи сервісу (за замовчуванням 100 рядків)
+• `/logs <service> --since 1h --level error --grep <regex>` - фільтровані логи
+• `/logs <service> follow` - живе стеження за логами
+• `/logs <service> --since 1d --file` - логи файлом
+• `/errors [service|glob ...] [--since 15m] [--warn]` - згруповані помилки з логів усіх сервісів
 
 **Бекапи:**
 • `/backup create` - створити бекап
-• `/backup list` - список бекапів
+• `/backup list [сторінка] [--sort size|duration] [--component media]` - каталог бекапів
+• `/backup verify <name>` - перевірити цілісність бекапу
 • `/backup restore <name>` - відновити бекап
 
 **Користувачі:**
 • `/user create <username> <password>` - створити користувача
-• `/user list` - список користувачів
+• `/user list [префікс] [сторінка] [--all]` - список користувачів (--all - з деактивованими)
+• `/user import` - створити користувачів з останнього завантаженого CSV/JSON
 • `/user delete <username>` - видалити користувача
 
 **Мости:**
 • `/bridges status` - статус мостів
-• `/bridges restart <name>` - перезапустити міст
+• `/bridges restart <name|glob> [...]` - перезапустити мости
 
 **Система:**
 • `/health` - перевірка здоров'я системи
-• `/update` - оновлення контейнерів
+• `/top [n] [--sort cpu|mem|net|io]` - найзавантаженіші контейнери
+• `/top [n] --watch` - те саме, оновлюється в одному повідомленні
+• `/latency [now]` - затримки homeserver (p50/p95/p99), `now` - виконати пробу зараз
+• `/db [status|conns|queries|tables|tx|cache]` - діагностика Postgres Dendrite
+• `/media stats [n] [--rescan]` - обсяг, приріст і склад медіа-сховища
+• `/media retention <вік> [--min-size 1M] [--thumbnails]` - що звільнила б політика зберігання (без видалення)
+• `/update [service|glob ...]` - поетапне оновлення з перевіркою здоров'я та відкатом
+• `/update all` - оновити всі контейнери одночасно
+• `/jobs` - активні задачі
+• `/cancel <id>` - скасувати задачу
 • `/help` - ця довідка
 
 **Приклади:**
@@ -198,7 +603,7 @@ class MatrixAdminBot:
     async def cmd_status(self, room, args):
         """Статус сервісів"""
         try:
-            response = self.call_admin_api('status')
+            response = await self.call_admin_api('status')
             if response.get('success'):
                 services = response.get('services', [])
                 
@@ -214,111 +619,205 @@ class MatrixAdminBot:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
 
     async def cmd_logs(self, room, args):
-        """Логи сервісу"""
-        if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/logs <service> [lines]`")
+        """Логи сервісу (потоково, з фільтрацією на стороні адмін-панелі)"""
+        try:
+            options = parse_logs_args(args)
+        except ValueError as e:
+            await self.send_message(room.room_id, str(e))
             return
         
-        service = args[0]
-        lines = args[1] if len(args) > 1 else '100'
+        if options['follow']:
+            await self.follow_logs(room, options)
+            return
         
+        service = options['service']
+        pager = LogPager(to_file=options['file'])
         try:
-            response = self.call_admin_api(f'logs/{service}?lines={lines}')
-            if response.get('success'):
-                logs = response.get('logs', '')
-                # Обмежуємо довжину логів
-                if len(logs) > 2000:
-                    logs = logs[:2000] + "\n... (обрізано)"
-                
-                await self.send_message(room.room_id, f"📋 **Логи {service}:**\n```\n{logs}\n```")
-            else:
-                await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+            async for line in self.admin_api.stream_lines(logs_stream_endpoint(options), timeout=self.admin_api.timeout_for('logs')):
+                page = pager.add(line)
+                if page is not None:
+                    await self.send_message(room.room_id, f"📋 **Логи {service}** (стор. {pager.pages_sent}):\n```\n{page}\n```")
+            
+            page = pager.finish()
+            if page is not None:
+                title = f"📋 **Логи {service}**" + (f" (стор. {pager.pages_sent})" if pager.pages_sent > 1 else "")
+                await self.send_message(room.room_id, f"{title}:\n```\n{page}\n```")
+            
+            if pager.spilled:
+                await self.send_file(room.room_id, pager.file_path(), f"{service}-logs.txt")
+                await self.send_message(room.room_id, f"📎 Ще {pager.file_lines} рядків логів {service} надіслано файлом")
+            elif pager.total_lines == 0:
+                await self.send_message(room.room_id, f"📋 Логи {service}: нічого не знайдено")
+        except AdminApiError as e:
+            await self.send_message(room.room_id, f"❌ Помилка: {e}")
+        except asyncio.TimeoutError:
+            await self.send_message(room.room_id, f"❌ Помилка: таймаут читання логів {service}")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
+        finally:
+            pager.cleanup()
 
-    async def cmd_start(self, room, args):
-        """Запуск сервісу"""
-        if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/start <service>`")
-            return
+    async def follow_logs(self, room, options):
+        """Живе стеження за логами: не частіше одного повідомлення за інтервал"""
+        service = options['service']
+        pending: List[str] = []
+        pending_chars = 0
+        dropped = 0
+        
+        async def flush():
+            nonlocal pending, pending_chars, dropped
+            if not pending and not dropped:
+                return
+            text = '\n'.join(pending)
+            if dropped:
+                text += f"\n... пропущено {dropped} рядків"
+            pending, pending_chars, dropped = [], 0, 0
+            await self.send_message(room.room_id, f"📡 **{service}:**\n```\n{text}\n```")
         
-        service = args[0]
+        async def flush_periodically():
+            while True:
+                await asyncio.sleep(LOGS_FOLLOW_INTERVAL)
+                await flush()
+        
+        await self.send_message(room.room_id, f"📡 Стеження за логами {service} ({LOGS_FOLLOW_DURATION:.0f} с, `/cancel` для зупинки)")
+        flusher = asyncio.create_task(flush_periodically())
         try:
-            response = self.call_admin_api(f'service/start/{service}', 'POST')
-            if response.get('success'):
-                await self.send_message(room.room_id, f"✅ {response.get('message', f'Сервіс {service} запущено')}")
-            else:
-                await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
-        except Exception as e:
+            async with asyncio.timeout(LOGS_FOLLOW_DURATION):
+                async for line in self.admin_api.stream_lines(logs_stream_endpoint(options)):
+                    if pending_chars + len(line) + 1 > LOGS_PAGE_CHARS:
+                        dropped += 1
+                        continue
+                    pending.append(line)
+                    pending_chars += len(line) + 1
+        except TimeoutError:
+            pass
+        except AdminApiError as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
+        finally:
+            flusher.cancel()
+        
+        await flush()
+        await self.send_message(room.room_id, f"⏹ Стеження за логами {service} завершено")
 
-    async def cmd_stop(self, room, args):
-        """Зупинка сервісу"""
-        if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/stop <service>`")
+    async def cmd_errors(self, room, args):
+        """Помилки з логів усіх (або вибраних) сервісів, згруповані за відбитком повідомлення"""
+        try:
+            options = parse_errors_args(args)
+        except ValueError as e:
+            await self.send_message(room.room_id, str(e))
             return
         
-        service = args[0]
         try:
-            response = self.call_admin_api(f'service/stop/{service}', 'POST')
-            if response.get('success'):
-                await self.send_message(room.room_id, f"✅ {response.get('message', f'Сервіс {service} зупинено')}")
-            else:
+            response = await self.call_admin_api('status')
+            if not response.get('success'):
                 await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                return
+            known = [s['name'] for s in response.get('services', [])]
+            services, unmatched = expand_targets(options['services'], known) if options['services'] else (known, [])
+            if not services:
+                await self.send_message(room.room_id, f"❌ Жоден сервіс не відповідає: {' '.join(options['services'])}")
+                return
+            
+            await self.send_message(room.room_id, f"⏳ Аналіз логів {len(services)} сервісів за {options['since']}...")
+            started = time.perf_counter()
+            results = await self.error_scanner.scan(services, options)
+            message = format_errors(results, options, time.perf_counter() - started)
+            if unmatched:
+                message += f"\n❓ Не знайдено: {', '.join(unmatched)}"
+            await self.send_message(room.room_id, message)
         except Exception as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
 
+    async def cmd_start(self, room, args):
+        """Запуск сервісів"""
+        if len(args) < 1:
+            await self.send_message(room.room_id, "❌ Використання: `/start <service> [service|glob ...]`")
+            return
+        await self.run_service_action(room, 'start', args)
+
+    async def cmd_stop(self, room, args):
+        """Зупинка сервісів"""
+        if len(args) < 1:
+            await self.send_message(room.room_id, "❌ Використання: `/stop <service> [service|glob ...]`")
+            return
+        await self.run_service_action(room, 'stop', args)
+
     async def cmd_restart(self, room, args):
-        """Перезапуск сервісу"""
+        """Перезапуск сервісів"""
         if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/restart <service>`")
+            await self.send_message(room.room_id, "❌ Використання: `/restart <service> [service|glob ...]`")
             return
-        
-        service = args[0]
+        await self.run_service_action(room, 'restart', args)
+
+    async def run_service_action(self, room, action: str, patterns: List[str],
+                                 endpoint_for=None, name_filter=None):
+        """Дія над кількома сервісами (glob, паралельно, у порядку залежностей) зі зведеним звітом"""
         try:
-            response = self.call_admin_api(f'service/restart/{service}', 'POST')
-            if response.get('success'):
-                await self.send_message(room.room_id, f"✅ {response.get('message', f'Сервіс {service} перезапущено')}")
-            else:
-                await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+            known = []
+            if any(ch in p for p in patterns for ch in '*?['):
+                response = await self.call_admin_api('status')
+                if not response.get('success'):
+                    await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                    return
+                known = [s['name'] for s in response.get('services', [])]
+                if name_filter:
+                    known = [name for name in known if name_filter(name)]
+            
+            targets, unmatched = expand_targets(patterns, known)
+            if not targets:
+                await self.send_message(room.room_id, f"❌ Жоден сервіс не відповідає: {' '.join(patterns)}")
+                return
+            
+            if len(targets) > 1:
+                tiers = ' → '.join(', '.join(tier) for tier in order_tiers(targets, reverse=(action == 'stop')))
+                await self.send_message(room.room_id, f"🔄 {action}: {tiers}")
+            
+            started = time.perf_counter()
+            results = await self.fanout.run(action, targets, endpoint_for or (lambda name: f'service/{action}/{name}'))
+            await self.send_message(room.room_id, format_fanout_results(action, results, time.perf_counter() - started, unmatched))
         except Exception as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
 
     async def cmd_backup(self, room, args):
         """Керування бекапами"""
         if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/backup <create|list|restore> [name]`")
+            await self.send_message(room.room_id, "❌ Використання: `/backup <create|list|verify|restore> [name]`")
             return
         
         action = args[0]
         
         if action == 'create':
             try:
-                response = self.call_admin_api('backups/create', 'POST')
-                if response.get('success'):
-                    await self.send_message(room.room_id, f"✅ {response.get('message', 'Бекап створено')}")
-                else:
-                    await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                await self.create_backup(room)
             except Exception as e:
                 await self.send_message(room.room_id, f"❌ Помилка: {e}")
         
         elif action == 'list':
             try:
-                response = self.call_admin_api('backups')
+                options = parse_list_args(args[1:])
+            except ValueError as e:
+                await self.send_message(room.room_id, str(e))
+                return
+            try:
+                response = await self.call_admin_api(backups_list_endpoint(options))
                 if response.get('success'):
-                    backups = response.get('backups', [])
-                    if backups:
-                        backup_text = "📦 **Список бекапів:**\n\n"
-                        for backup in backups[:10]:  # Показуємо тільки 10 останніх
-                            backup_text += f"• **{backup['name']}** ({backup['size']} байт)\n"
-                        await self.send_message(room.room_id, backup_text)
-                    else:
-                        await self.send_message(room.room_id, "📦 Бекапів не знайдено")
+                    await self.send_message(room.room_id, format_backup_list(response, options))
                 else:
                     await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
             except Exception as e:
                 await self.send_message(room.room_id, f"❌ Помилка: {e}")
         
+        elif action == 'verify':
+            if len(args) < 2:
+                await self.send_message(room.room_id, "❌ Використання: `/backup verify <name>`")
+                return
+            try:
+                await self.verify_backup(room, args[1])
+            except Exception as e:
+                await self.send_message(room.room_id, f"❌ Помилка: {e}")
+        
         elif action == 'restore':
             if len(args) < 2:
                 await self.send_message(room.room_id, "❌ Використання: `/backup restore <name>`")
@@ -326,21 +825,81 @@ class MatrixAdminBot:
             
             backup_name = args[1]
             try:
-                response = self.call_admin_api(f'backups/restore/{backup_name}', 'POST')
-                if response.get('success'):
-                    await self.send_message(room.room_id, f"✅ {response.get('message', 'Бекап відновлено')}")
-                else:
-                    await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                await self.restore_backup(room, backup_name)
             except Exception as e:
                 await self.send_message(room.room_id, f"❌ Помилка: {e}")
         
         else:
-            await self.send_message(room.room_id, "❌ Невідома дія. Використання: `/backup <create|list|restore> [name]`")
+            await self.send_message(room.room_id, "❌ Невідома дія. Використання: `/backup <create|list|verify|restore> [name]`")
+
+    async def create_backup(self, room):
+        """Створення бекапу: прогрес і підсумок (обсяги, швидкість) через backup_notification"""
+        await self.run_backup_job(room, 'backups/create?stream=1', ('в процесі', 'створено', 'не вдався'),
+                                  "✅ Бекап створено успішно", "❌ Помилка бекапу")
+
+    async def restore_backup(self, room, backup_name: str):
+        """Відновлення бекапу: прогрес по таблицях і підсумок (тривалість, швидкість)"""
+        await self.run_backup_job(room, f'backups/restore/{backup_name}?stream=1',
+                                  ('відновлюється', 'відновлено', 'не відновлено'),
+                                  "✅ Бекап відновлено", "❌ Помилка відновлення")
+
+    async def verify_backup(self, room, backup_name: str):
+        """Перевірка цілісності знімка: контрольні суми файлів і об'єкти медіа"""
+        await self.run_backup_job(room, f'backups/verify/{backup_name}?stream=1',
+                                  ('перевіряється', 'цілий', 'пошкоджено'),
+                                  "✅ Бекап цілий", "❌ Перевірка не пройдена")
+
+    async def run_backup_job(self, room, endpoint: str, actions, done_text: str, failed_text: str):
+        """Потоковий запуск скрипта бекапу/відновлення з рядками [PROGRESS]/[STATS]/[EXIT]"""
+        progress_action, done_action, failed_action = actions
+        throttle = ProgressThrottle()
+        summary = []
+        last_line = ''
+        exit_code = None
+        partial = None
+        async for line in self.admin_api.stream_lines(endpoint, method='POST', read_timeout=BACKUP_READ_TIMEOUT):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('[EXIT]'):
+                # Скрипт, вбитий сигналом, завершується з "code=null" - це теж помилка
+                exit_code = parse_exit_code(line)
+                continue
+            last_line = line
+            stats = parse_stats(line)
+            if stats:
+                # Частковий бекап (якийсь етап не вдався) - помилка навіть за нульового коду
+                if stats[0] == 'backup' and stats[1].get('status', 'ok') != 'ok':
+                    partial = stats[1].get('status')
+                text = format_stats(*stats)
+                if text:
+                    summary.append(text)
+                continue
+            progress = format_progress(line)
+            if progress and throttle.allow(line):
+                await self.backup_notification(progress_action, progress)
+        
+        if exit_code == 0 and not partial:
+            await self.backup_notification(done_action, '\n'.join(summary))
+            if room.room_id != self.admin_room_id:
+                await self.send_message(room.room_id, done_text + "\n" + '\n'.join(summary))
+        else:
+            if exit_code is None:
+                error = "з'єднання з адмін-панеллю обірвано"
+            elif exit_code < 0:
+                error = f"скрипт перервано ({last_line})" if last_line else "скрипт перервано"
+            else:
+                error = last_line
+            if summary:
+                error = error + "\n" + '\n'.join(summary)
+            await self.backup_notification(failed_action, error)
+            if room.room_id != self.admin_room_id:
+                await self.send_message(room.room_id, f"{failed_text}: {error}")
 
     async def cmd_user(self, room, args):
         """Керування користувачами"""
         if len(args) < 1:
-            await self.send_message(room.room_id, "❌ Використання: `/user <create|list|delete> [username] [password]`")
+            await self.send_message(room.room_id, "❌ Використання: `/user <create|list|import|delete> [username] [password]`")
             return
         
         action = args[0]
@@ -354,11 +913,12 @@ class MatrixAdminBot:
             password = args[2]
             
             try:
-                response = self.call_admin_api('users/create', 'POST', {
+                response = await self.call_admin_api('users/create', 'POST', {
                     'username': username,
                     'password': password
                 })
                 if response.get('success'):
+                    self.users.add(normalize_localpart(username))
                     await self.send_message(room.room_id, f"✅ Користувача {username} створено")
                 else:
                     await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
@@ -367,21 +927,22 @@ class MatrixAdminBot:
         
         elif action == 'list':
             try:
-                response = self.call_admin_api('users')
-                if response.get('success'):
-                    users = response.get('users', [])
-                    if users:
-                        user_text = "👥 **Список користувачів:**\n\n"
-                        for user in users:
-                            user_text += f"• **{user['username']}**\n"
-                        await self.send_message(room.room_id, user_text)
-                    else:
-                        await self.send_message(room.room_id, "👥 Користувачів не знайдено")
-                else:
-                    await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                options = parse_user_list_args(args[1:])
+            except ValueError as e:
+                await self.send_message(room.room_id, str(e))
+                return
+            try:
+                await self.users.refresh()
+                await self.send_message(room.room_id, format_user_list(self.users, options))
             except Exception as e:
                 await self.send_message(room.room_id, f"❌ Помилка: {e}")
         
+        elif action == 'import':
+            try:
+                await self.import_users(room, args[1:])
+            except Exception as e:
+                await self.send_message(room.room_id, f"❌ Помилка імпорту: {e}")
+        
         elif action == 'delete':
             if len(args) < 2:
                 await self.send_message(room.room_id, "❌ Використання: `/user delete <username>`")
@@ -389,7 +950,7 @@ class MatrixAdminBot:
             
             username = args[1]
             try:
-                response = self.call_admin_api(f'users/{username}', 'DELETE')
+                response = await self.call_admin_api(f'users/{username}', 'DELETE')
                 if response.get('success'):
                     await self.send_message(room.room_id, f"✅ Користувача {username} видалено")
                 else:
@@ -398,7 +959,54 @@ class MatrixAdminBot:
                 await self.send_message(room.room_id, f"❌ Помилка: {e}")
         
         else:
-            await self.send_message(room.room_id, "❌ Невідома дія. Використання: `/user <create|list|delete> [username] [password]`")
+            await self.send_message(room.room_id, "❌ Невідома дія. Використання: `/user <create|list|import|delete> [username] [password]`")
+
+    async def import_users(self, room, args):
+        """Масове створення користувачів з CSV/JSON файлу кімнати з прогресом і звітом по рядках"""
+        if args:
+            url, filename = args[0], args[0]
+        else:
+            upload = self.uploads.get(room.room_id)
+            if not upload or time.time() - upload[0] > USERS_IMPORT_FILE_TTL:
+                await self.send_message(room.room_id, USERS_IMPORT_USAGE)
+                return
+            _, url, filename = upload
+        
+        workdir = tempfile.mkdtemp(prefix='user-import-')
+        try:
+            source = os.path.join(workdir, 'source')
+            size = await download_media(self.client, url, source)
+            # Свіжий індекс - щоб наявні акаунти не створювались повторно
+            await self.users.refresh(force=True)
+            
+            job = UserImport(self.users, lambda batch: self.call_admin_api('users/batch', 'POST', {'users': batch}))
+            results = ImportResults(os.path.join(workdir, 'results.csv'))
+            sent = await self.send_message(room.room_id, f"⏳ Імпорт користувачів з {filename} ({size // 1024} КБ)...",
+                                           mergeable=False)
+            event_id = await sent if sent else None
+            
+            async def report_progress():
+                while True:
+                    await asyncio.sleep(USERS_IMPORT_PROGRESS_INTERVAL)
+                    if event_id:
+                        await self.edit_message(room.room_id, event_id, format_import_progress(job))
+            
+            progress = asyncio.create_task(report_progress())
+            try:
+                await job.run(read_import_rows(source, filename.lower()), results.add)
+            finally:
+                progress.cancel()
+                results.close()
+            
+            summary = format_import_progress(job, done=True) + results.format_examples()
+            if event_id:
+                await self.edit_message(room.room_id, event_id, summary)
+            else:
+                await self.send_message(room.room_id, summary)
+            await self.send_file(room.room_id, results.path, 'user-import-results.csv', 'text/csv')
+            self.uploads.pop(room.room_id, None)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
 
     async def cmd_bridges(self, room, args):
         """Керування мостами"""
@@ -410,7 +1018,7 @@ class MatrixAdminBot:
         
         if action == 'status':
             try:
-                response = self.call_admin_api('bridges/status')
+                response = await self.call_admin_api('bridges/status')
                 if response.get('success'):
                     bridges = response.get('bridges', [])
                     if bridges:
@@ -428,18 +1036,14 @@ class MatrixAdminBot:
         
         elif action == 'restart':
             if len(args) < 2:
-                await self.send_message(room.room_id, "❌ Використання: `/bridges restart <name>`")
+                await self.send_message(room.room_id, "❌ Використання: `/bridges restart <name|glob> [...]`")
                 return
             
-            bridge_name = args[1]
-            try:
-                response = self.call_admin_api(f'bridges/restart/{bridge_name}', 'POST')
-                if response.get('success'):
-                    await self.send_message(room.room_id, f"✅ {response.get('message', f'Міст {bridge_name} перезапущено')}")
-                else:
-                    await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
-            except Exception as e:
-                await self.send_message(room.room_id, f"❌ Помилка: {e}")
+            await self.run_service_action(
+                room, 'restart', args[1:],
+                endpoint_for=lambda name: f'bridges/restart/{name}',
+                name_filter=lambda name: name.endswith('-bridge'),
+            )
         
         else:
             await self.send_message(room.room_id, "❌ Невідома дія. Використання: `/bridges <status|restart> [name]`")
@@ -447,7 +1051,7 @@ class MatrixAdminBot:
     async def cmd_health(self, room, args):
         """Перевірка здоров'я системи"""
         try:
-            response = self.call_admin_api('health')
+            response = await self.call_admin_api('health')
             if response.get('success'):
                 health = response.get('health', [])
                 summary = response.get('summary', {})
@@ -469,23 +1073,155 @@ class MatrixAdminBot:
                 else:
                     message += "🎉 Всі сервіси працюють нормально!"
                 
+                firing = self.alerts.firing()
+                if firing:
+                    message += f"\n\n🚨 **Активні тривоги:** {', '.join(firing)}"
+                
                 await self.send_message(room.room_id, message)
             else:
                 await self.send_message(room.room_id, f"❌ Помилка healthcheck: {response.get('error', 'Невідома помилка')}")
         except Exception as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
 
+    async def cmd_top(self, room, args):
+        """Найзавантаженіші контейнери за різницею двох знімків лічильників Docker"""
+        try:
+            options = parse_top_args(args)
+        except ValueError as e:
+            await self.send_message(room.room_id, str(e))
+            return
+        
+        sampler = TopSampler(self.admin_api)
+        try:
+            previous = await sampler.sample()
+            await asyncio.sleep(TOP_SAMPLE_INTERVAL)
+            current = await sampler.sample()
+        except Exception as e:
+            await self.send_message(room.room_id, f"❌ Помилка: {e}")
+            return
+        
+        if not options['watch']:
+            await self.send_message(room.room_id, format_top(compute_rates(previous, current), options, TOP_SAMPLE_INTERVAL))
+            return
+        
+        # --watch: одне повідомлення, що редагується; базою кожного виміру є попередній знімок
+        footer = f"🔄 Оновлюється кожні {TOP_WATCH_INTERVAL:.0f} с протягом {TOP_WATCH_DURATION:.0f} с, `/cancel` для зупинки"
+        sent = await self.send_message(room.room_id, format_top(compute_rates(previous, current), options, TOP_SAMPLE_INTERVAL, footer),
+                                       mergeable=False)
+        event_id = await sent if sent else None
+        if not event_id:
+            return
+        
+        # Невдалий вимір (збій чи ліміт запитів адмін-панелі) не зупиняє спостереження: таблиця
+        # лишається останньою вдалою, наступна спроба - з паузою (Retry-After або подвоєння)
+        deadline = time.monotonic() + TOP_WATCH_DURATION
+        rates, interval = compute_rates(previous, current), TOP_SAMPLE_INTERVAL
+        delay, failures, finished = TOP_WATCH_INTERVAL, 0, "⏹ Спостереження завершено"
+        while time.monotonic() + delay < deadline:
+            await asyncio.sleep(delay)
+            try:
+                sample = await sampler.sample()
+            except TopSampleError as e:
+                failures += 1
+                if failures >= TOP_WATCH_MAX_FAILURES:
+                    finished = f"⚠️ Спостереження зупинено: {failures} невдалих вимірів поспіль ({e})"
+                    break
+                delay = e.retry_after or TOP_WATCH_INTERVAL * 2 ** failures
+                note = f"⚠️ Вимір не вдався ({e}), наступна спроба через {delay:.0f} с\n{footer}"
+                await self.edit_message(room.room_id, event_id, format_top(rates, options, interval, note))
+                continue
+            failures, delay = 0, TOP_WATCH_INTERVAL
+            previous, current = current, sample
+            rates, interval = compute_rates(previous, current), current[0] - previous[0]
+            # Чекаємо доставки правки: при rate limit правки не накопичуються в черзі
+            await self.edit_message(room.room_id, event_id, format_top(rates, options, interval, footer))
+        
+        await self.edit_message(room.room_id, event_id, format_top(rates, options, interval, finished))
+
+    async def cmd_latency(self, room, args):
+        """Перцентилі затримок синтетичної проби; `now` - позачергова проба"""
+        results = None
+        if args and args[0] == 'now':
+            if not self.probe.enabled:
+                await self.send_message(room.room_id, format_latency(self.probe))
+                return
+            results = await self.probe.probe_once()
+        await self.send_message(room.room_id, format_latency(self.probe, results))
+
+    async def cmd_db(self, room, args):
+        """Діагностика Postgres Dendrite: пул, запити, таблиці, транзакції, кеш"""
+        try:
+            options = parse_db_args(args)
+        except ValueError as e:
+            await self.send_message(room.room_id, str(e))
+            return
+        try:
+            data = await self.db.report(options)
+        except DatabaseError as e:
+            await self.send_message(room.room_id, f"❌ БД: {e}")
+            return
+        await self.send_message(room.room_id, format_db_report(data, options))
+
+    async def cmd_media(self, room, args):
+        """Статистика медіа-сховища та пробний прогін політик зберігання з індексу"""
+        try:
+            options = parse_media_args(args)
+        except ValueError as e:
+            await self.send_message(room.room_id, str(e))
+            return
+        try:
+            last = await asyncio.to_thread(self.media.last_scan)
+            if options['rescan'] or not self.media.is_fresh(last):
+                status = "⏳ Оновлення індексу медіа..." if last else "⏳ Перший обхід медіа-сховища, це може зайняти кілька хвилин..."
+                await self.send_message(room.room_id, status)
+            scan = await self.media.refresh(force=options['rescan'])
+            if options['action'] == 'stats':
+                stats = await asyncio.to_thread(self.media.stats, options['count'])
+                await self.send_message(room.room_id, format_media_stats(stats, scan))
+            else:
+                result = await asyncio.to_thread(self.media.retention, options['age'], options['min_size'], options['thumbnails'])
+                await self.send_message(room.room_id, format_media_retention(result, options, scan))
+        except Exception as e:
+            await self.send_message(room.room_id, f"❌ Помилка: {e}")
+
     async def cmd_update(self, room, args):
-        """Оновлення контейнерів"""
+        """Оновлення контейнерів: поетапне за рівнями залежностей або всіх одразу (`all`)"""
+        if args and args[0].lower() == 'all':
+            await self.update_all(room)
+            return
+        try:
+            response = await self.call_admin_api('status')
+            if not response.get('success'):
+                await self.send_message(room.room_id, f"❌ Помилка: {response.get('error', 'Невідома помилка')}")
+                return
+            known = [s['name'] for s in response.get('services', [])]
+            targets, unmatched = expand_targets(args, known) if args else (known, [])
+            if not targets:
+                await self.send_message(room.room_id, f"❌ Жоден сервіс не відповідає: {' '.join(args)}")
+                return
+            for pattern in unmatched:
+                await self.send_message(room.room_id, f"⚪ `{pattern}` - немає збігів")
+            
+            await self.send_message(room.room_id, f"🔄 Поетапне оновлення: завантаження образів для {len(targets)} сервісів...")
+            started = time.perf_counter()
+            rollout = RollingUpdate(self.admin_api, self.fanout, lambda message: self.send_message(room.room_id, message))
+            updates = await rollout.run(targets)
+            await self.send_message(room.room_id, format_update_results(updates, rollout.rolled_back,
+                                                                       time.perf_counter() - started))
+        except Exception as e:
+            await self.send_message(room.room_id, f"❌ Помилка: {e}")
+
+    async def update_all(self, room):
+        """Оновлення всіх контейнерів одночасно (docker-compose pull && up -d)"""
         try:
             await self.send_message(room.room_id, "🔄 Початок оновлення контейнерів...")
             
-            response = self.call_admin_api('update', method='POST')
+            response = await self.call_admin_api('update', method='POST')
             if response.get('success'):
                 await self.send_message(room.room_id, "✅ Контейнери оновлено успішно!")
                 
                 # Отримуємо оновлений healthcheck
-                health_response = self.call_admin_api('health')
+                health_response = await self.call_admin_api('health')
                 if health_response.get('success'):
                     summary = health_response.get('summary', {})
                     healthy = summary.get('healthy', 0)
@@ -496,45 +1232,54 @@ class MatrixAdminBot:
         except Exception as e:
             await self.send_message(room.room_id, f"❌ Помилка: {e}")
 
+    async def cmd_jobs(self, room, args):
+        """Список активних задач"""
+        jobs = self.scheduler.active()
+        if not jobs:
+            await self.send_message(room.room_id, "🗂 Активних задач немає")
+            return
+        
+        jobs_text = "🗂 **Активні задачі:**\n\n"
+        for job in jobs:
+            status_emoji = "▶️" if job.status == 'running' else "⏳"
+            jobs_text += f"{status_emoji} **#{job.id}** `{job.title}` - {job.status}, {job.elapsed():.0f} с ({job.sender})\n"
+        await self.send_message(room.room_id, jobs_text)
+
+    async def cmd_cancel(self, room, args):
+        """Скасування задачі"""
+        if len(args) < 1 or not args[0].lstrip('#').isdigit():
+            await self.send_message(room.room_id, "❌ Використання: `/cancel <id>`")
+            return
+        
+        job_id = int(args[0].lstrip('#'))
+        if not self.scheduler.cancel(job_id):
+            await self.send_message(room.room_id, f"❌ Задачу #{job_id} не знайдено")
+
     async def send_notification(self, message: str, room_id: str = None):
-        """Надсилання сповіщення через адмін-панель"""
+        """Надсилання сповіщення в кімнату адміністраторів через чергу повідомлень"""
         try:
             target_room = room_id or self.admin_room_id
             if not target_room:
                 logger.warning("Не вказано room_id для сповіщення")
                 return
+            if self.client is None:
+                logger.warning(f"Matrix клієнт не готовий, сповіщення пропущено: {message}")
+                return
             
-            response = self.call_admin_api('notifications/send', method='POST', data={
-                'message': message,
-                'roomId': target_room
+            self.outbox.enqueue(target_room, {
+                'msgtype': 'm.text',
+                'body': message
             })
-            
-            if response and response.get('success'):
-                logger.info(f"Сповіщення надіслано: {message}")
-            else:
-                logger.error(f"Помилка надсилання сповіщення: {response.get('error') if response else 'Невідома помилка'}")
+            logger.info(f"Сповіщення поставлено в чергу: {message}")
         except Exception as e:
             logger.error(f"Помилка надсилання сповіщення: {e}")
 
-    async def healthcheck_notification(self):
-        """Автоматична перевірка здоров'я з сповіщенням"""
+    async def healthcheck_notification(self, name: str, previous: Optional[dict], current: dict):
+        """Зміна стану сервісу від монітора здоров'я -> автомат сповіщень"""
         try:
-            response = self.call_admin_api('health')
-            if response.get('success'):
-                summary = response.get('summary', {})
-                unhealthy = summary.get('unhealthy', 0)
-                
-                if unhealthy > 0:
-                    health = response.get('health', [])
-                    unhealthy_services = [h['name'] for h in health if not h.get('healthy')]
-                    
-                    message = f"⚠️ **Healthcheck попередження:**\n"
-                    message += f"Знайдено {unhealthy} нездорових сервісів:\n"
-                    for service in unhealthy_services:
-                        message += f"• {service}\n"
-                    
-                    await self.send_notification(message)
-                    logger.warning(f"Healthcheck: знайдено {unhealthy} нездорових сервісів")
+            # Стан змінився - кешовані статуси вже застаріли
+            self.admin_api.cache.invalidate(['status', 'health', 'bridges/status'])
+            await self.alerts.observe(name, current['healthy'], current['status'])
         except Exception as e:
             logger.error(f"Помилка healthcheck notification: {e}")
 
@@ -555,26 +1300,49 @@ class MatrixAdminBot:
         except Exception as e:
             logger.error(f"Помилка service notification: {e}")
 
-    async def background_tasks(self):
-        """Фонові завдання"""
+    async def supervise(self, name: str, factory):
+        """Перезапуск одного фонового завдання після збою; інші при цьому працюють далі"""
         while True:
             try:
-                # Healthcheck кожні 5 хвилин
-                await self.healthcheck_notification()
-                await asyncio.sleep(300)  # 5 хвилин
+                await factory()
+                logger.warning(f"Фонове завдання {name} завершилось, перезапуск через 60 с")
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Помилка фонового завдання: {e}")
-                await asyncio.sleep(60)
+                logger.error(f"Помилка фонового завдання {name}: {e}")
+            await asyncio.sleep(60)
+
+    async def background_tasks(self):
+        """Фонові завдання"""
+        # Не конкуруємо з входом та першою синхронізацією - бот раніше готовий до команд
+        await self.synced.wait()
+        # Моніторинг здоров'я: події Docker + резервне опитування. Кожне завдання під
+        # власним наглядом: збій одного не перезапускає (і не дублює) решту
+        tasks = {
+            'health_monitor': self.health_monitor.run,
+            'alerts': self.alerts.run,
+            'event_loop': monitor_event_loop,
+        }
+        if self.probe.enabled:
+            tasks['probe'] = self.probe.run
+        await asyncio.gather(*(self.supervise(name, factory) for name, factory in tasks.items()))
 
 # Головна функція
 async def main():
+    start_metrics_server()
     bot = MatrixAdminBot()
     
     # Запуск бота та фонових задач
-    await asyncio.gather(
-        bot.start(),
-        bot.background_tasks()
-    )
+    try:
+        await asyncio.gather(
+            bot.start(),
+            bot.background_tasks()
+        )
+    finally:
+        await bot.scheduler.shutdown()
+        await bot.outbox.close()
+        await bot.admin_api.close()
+        await bot.db.close()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
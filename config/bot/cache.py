@@ -0,0 +1,90 @@
+"""
+TTL кеш з об'єднанням одночасних запитів (single-flight)
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+
+class TTLCache:
+    """
+    Кеш відповідей за ключем з TTL.
+
+    Одночасні запити за одним ключем чекають на одне звернення до джерела.
+    Інвалідація під час запиту не дає зберегти застарілий результат.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]],
+                           cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Значення з кешу або з `fetch()`; результат зберігається, якщо `cacheable`"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            await asyncio.wait([inflight])
+            if inflight.cancelled():
+                # Запит-лідер скасовано - робимо власний
+                return await self.get_or_fetch(key, ttl, fetch, cacheable)
+            return inflight.result()
+
+        self.misses += 1
+        generation = self._generations.get(key, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Позначаємо виняток як отриманий, якщо ніхто не чекав
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if cacheable(value) and self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic() + ttl, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, prefixes: Iterable[str]):
+        """Видалення записів, ключі яких починаються з будь-якого з префіксів"""
+        prefixes = tuple(prefixes)
+        if not prefixes:
+            return
+        keys = set(self._entries) | set(self._inflight)
+        for key in keys:
+            if key.startswith(prefixes):
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        """Повне очищення кешу"""
+        self.invalidate([''])
+
+    def stats(self) -> Dict[str, Any]:
+        """Лічильники звернень до кешу"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries),
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
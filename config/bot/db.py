@@ -0,0 +1,520 @@
+"""
+/db: діагностика Postgres Dendrite - пул з'єднань, важкі запити, розміри та роздуття
+таблиць, довгі транзакції і влучання в кеш
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import math
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import asyncpg
+
+from cache import TTLCache
+from formatting import format_size
+
+
+def _default_dsn() -> str:
+    """DSN з тих самих змінних, якими налаштовано контейнер postgres і Dendrite"""
+    password = os.getenv('POSTGRES_PASSWORD', '')
+    if not password:
+        return ''
+    user = os.getenv('POSTGRES_USER', 'dendrite')
+    host = os.getenv('POSTGRES_HOST', 'postgres')
+    port = os.getenv('POSTGRES_PORT', '5432')
+    database = os.getenv('POSTGRES_DB', 'dendrite')
+    return f"postgresql://{quote(user, safe='')}:{quote(password, safe='')}@{host}:{port}/{database}"
+
+
+# Підключення до БД Dendrite (порожньо - /db вимкнено)
+DB_DSN = os.getenv('MATRIX_BOT_DB_DSN', '') or _default_dsn()
+# Власний пул бота: діагностиці вистачає кількох з'єднань
+DB_POOL_SIZE = int(os.getenv('MATRIX_BOT_DB_POOL_SIZE', '2'))
+# Ліміт пулу Dendrite (database.max_open_conns у dendrite.yaml), від якого рахується насичення
+DB_MAX_OPEN_CONNS = int(os.getenv('MATRIX_BOT_DB_MAX_OPEN_CONNS', '90'))
+# Скільки секунд повторні /db беруть результат з кешу, а не з БД
+DB_CACHE_TTL = float(os.getenv('MATRIX_BOT_DB_CACHE_TTL', '15'))
+# Ліміт часу одного діагностичного запиту (с)
+DB_QUERY_TIMEOUT = float(os.getenv('MATRIX_BOT_DB_QUERY_TIMEOUT', '10'))
+# Транзакція, відкрита довше (с), вважається довгою
+DB_LONG_TX_SECONDS = float(os.getenv('MATRIX_BOT_DB_LONG_TX_SECONDS', '60'))
+# Таблиці, які показуються за замовчуванням (--all - усі)
+DB_TABLE_PREFIXES = [p.strip() for p in os.getenv('MATRIX_BOT_DB_TABLE_PREFIXES', 'roomserver_,syncapi_').split(',') if p.strip()]
+DB_DEFAULT_COUNT = 10
+# Частка max_open_conns, з якої пул Dendrite позначається як близький до насичення
+DB_SATURATION_WARN = 0.8
+
+DB_APPLICATION_NAME = 'matrix-admin-bot'
+
+DB_REPORTS = ('status', 'conns', 'queries', 'tables', 'tx', 'cache')
+
+DB_QUERY_SORTS = {
+    'total': 'total_ms',
+    'mean': 'mean_ms',
+    'calls': 'calls',
+    'io': 'blks_read',
+}
+
+DB_USAGE = ("❌ Використання: `/db [status]`, `/db conns`, `/db queries [n] [--sort total|mean|calls|io]`, "
+            "`/db tables [n] [--all]`, `/db tx [секунд]`, `/db cache [n] [--all]`")
+
+
+class DatabaseError(Exception):
+    """Діагностика недоступна або запит до БД не вдався"""
+
+
+def parse_db_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /db; ValueError з поясненням при помилці"""
+    rest = list(args)
+    report = rest.pop(0) if rest and not rest[0].startswith('-') and not rest[0].isdigit() else 'status'
+    if report not in DB_REPORTS:
+        raise ValueError(DB_USAGE)
+    options = {'report': report, 'count': DB_DEFAULT_COUNT, 'sort': 'total', 'all': False,
+               'seconds': DB_LONG_TX_SECONDS}
+    while rest:
+        arg = rest.pop(0)
+        if arg == '--sort' and report == 'queries':
+            if not rest or rest[0] not in DB_QUERY_SORTS:
+                raise ValueError(DB_USAGE)
+            options['sort'] = rest.pop(0)
+        elif arg == '--all' and report in ('tables', 'cache'):
+            options['all'] = True
+        elif arg.isdigit() and int(arg) > 0 and report in ('queries', 'tables', 'cache', 'tx'):
+            if report == 'tx':
+                options['seconds'] = float(arg)
+            else:
+                options['count'] = int(arg)
+        else:
+            raise ValueError(DB_USAGE)
+    return options
+
+
+def table_patterns(show_all: bool) -> List[str]:
+    """Шаблони LIKE для фільтра таблиць за префіксами"""
+    if show_all or not DB_TABLE_PREFIXES:
+        return ['%']
+    return [prefix.replace('_', r'\_') + '%' for prefix in DB_TABLE_PREFIXES]
+
+
+CONNECTIONS_QUERY = """
+SELECT coalesce(nullif(application_name, ''), usename::text, '?') AS application,
+       coalesce(state, 'unknown') AS state,
+       count(*) AS connections,
+       count(*) FILTER (WHERE wait_event_type = 'Lock') AS waiting,
+       max(extract(epoch FROM now() - state_change))::float8 AS longest_seconds
+FROM pg_stat_activity
+WHERE datname = current_database() AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+GROUP BY 1, 2
+ORDER BY 3 DESC
+"""
+
+SERVER_QUERY = """
+SELECT current_setting('max_connections')::int AS max_connections,
+       current_setting('server_version') AS version,
+       pg_database_size(current_database()) AS database_bytes,
+       (SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend') AS server_connections,
+       EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements') AS statements
+"""
+
+DATABASE_STATS_QUERY = """
+SELECT blks_hit, blks_read, xact_commit, xact_rollback, deadlocks, temp_bytes, stats_reset
+FROM pg_stat_database
+WHERE datname = current_database()
+"""
+
+# pg_stat_statements до PG 13 мав колонки total_time/mean_time
+STATEMENTS_QUERY = """
+SELECT calls, {total} AS total_ms, {mean} AS mean_ms, rows,
+       shared_blks_hit AS blks_hit, shared_blks_read AS blks_read,
+       sum({total}) OVER () AS all_ms,
+       left(regexp_replace(query, '\\s+', ' ', 'g'), 300) AS query
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+ORDER BY {order} DESC
+LIMIT $1
+"""
+
+# Роздуття - оцінка за статистикою планувальника: очікувані сторінки для reltuples рядків
+# середньої ширини (заголовок 24 байти + вказівник 4 байти) проти фактичних relpages
+TABLES_QUERY = """
+SELECT c.relname AS name,
+       pg_total_relation_size(c.oid) AS total_bytes,
+       pg_relation_size(c.oid) AS table_bytes,
+       pg_indexes_size(c.oid) AS index_bytes,
+       s.n_live_tup AS live, s.n_dead_tup AS dead,
+       greatest(s.last_autovacuum, s.last_vacuum) AS vacuumed,
+       c.relpages::bigint AS pages, c.reltuples::float8 AS tuples,
+       (SELECT sum(st.avg_width) FROM pg_stats st
+        WHERE st.schemaname = n.nspname AND st.tablename = c.relname)::float8 AS row_width
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.relkind = 'r' AND c.relname LIKE ANY ($1::text[])
+ORDER BY total_bytes DESC
+LIMIT $2
+"""
+
+# Для btree: кортеж індексу - 8 байт заголовка + 4 байти вказівника + ключ; fillfactor 90
+INDEXES_QUERY = """
+SELECT i.relname AS name, c.relname AS table_name,
+       pg_relation_size(i.oid) AS bytes, s.idx_scan AS scans,
+       i.relpages::bigint AS pages, i.reltuples::float8 AS tuples,
+       (SELECT sum(st.avg_width) FROM pg_attribute a
+        JOIN pg_stats st ON st.schemaname = n.nspname AND st.tablename = c.relname AND st.attname = a.attname
+        WHERE a.attrelid = c.oid AND a.attnum = ANY (x.indkey::int2[]))::float8 AS key_width
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_class c ON c.oid = x.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_am am ON am.oid = i.relam
+JOIN pg_stat_user_indexes s ON s.indexrelid = i.oid
+WHERE am.amname = 'btree' AND c.relname LIKE ANY ($1::text[])
+ORDER BY bytes DESC
+LIMIT $2
+"""
+
+TRANSACTIONS_QUERY = """
+SELECT pid, coalesce(nullif(application_name, ''), usename::text, '?') AS application,
+       coalesce(state, 'unknown') AS state,
+       extract(epoch FROM now() - xact_start)::float8 AS xact_seconds,
+       extract(epoch FROM now() - query_start)::float8 AS query_seconds,
+       wait_event_type, wait_event,
+       cardinality(pg_blocking_pids(pid)) AS blocked_by,
+       left(regexp_replace(query, '\\s+', ' ', 'g'), 200) AS query
+FROM pg_stat_activity
+WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid()
+  AND now() - xact_start > make_interval(secs => $1)
+ORDER BY xact_start
+LIMIT $2
+"""
+
+LONG_TRANSACTIONS_QUERY = """
+SELECT count(*) AS count, max(extract(epoch FROM now() - xact_start))::float8 AS oldest_seconds
+FROM pg_stat_activity
+WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid()
+  AND now() - xact_start > make_interval(secs => $1)
+"""
+
+TABLE_CACHE_QUERY = """
+SELECT relname AS name,
+       coalesce(heap_blks_hit, 0) AS heap_hit, coalesce(heap_blks_read, 0) AS heap_read,
+       coalesce(idx_blks_hit, 0) AS idx_hit, coalesce(idx_blks_read, 0) AS idx_read
+FROM pg_statio_user_tables
+WHERE relname LIKE ANY ($1::text[])
+ORDER BY coalesce(heap_blks_read, 0) + coalesce(idx_blks_read, 0) DESC
+LIMIT $2
+"""
+
+
+def hit_ratio(hit: int, read: int) -> Optional[float]:
+    """Частка читань блоків з shared buffers; None, якщо читань ще не було"""
+    total = (hit or 0) + (read or 0)
+    return (hit or 0) / total if total else None
+
+
+def estimate_table_bloat(row: Dict[str, Any], block_size: int) -> Optional[int]:
+    """Оцінка зайвих байтів у heap таблиці (None - таблицю ще не аналізували)"""
+    if row['tuples'] is None or row['tuples'] < 0 or row['row_width'] is None:
+        return None
+    per_page = max(1, (block_size - 24) // (24 + 4 + math.ceil(row['row_width'])))
+    expected = math.ceil(row['tuples'] / per_page)
+    return max(0, row['pages'] - expected) * block_size
+
+
+def estimate_index_bloat(row: Dict[str, Any], block_size: int) -> Optional[int]:
+    """Оцінка зайвих байтів у btree-індексі (None - немає статистики ключа)"""
+    if row['tuples'] is None or row['tuples'] < 0 or row['key_width'] is None:
+        return None
+    key = 8 * math.ceil(row['key_width'] / 8)
+    per_page = max(1, int((block_size - 24 - 16) * 0.9) // (8 + 4 + key))
+    # + метасторінка
+    expected = math.ceil(row['tuples'] / per_page) + 1
+    return max(0, row['pages'] - expected) * block_size
+
+
+class DatabaseDiagnostics:
+    """
+    Звіти /db через невеликий пул asyncpg до БД Dendrite.
+
+    Пул створюється при першому запиті; з'єднання позначені application_name
+    бота (щоб не рахувати їх у пулі Dendrite), працюють лише на читання й мають
+    statement_timeout. Кожен звіт кешується на DB_CACHE_TTL: повторні /db і
+    одночасні запити від кількох адміністраторів не навантажують БД.
+    """
+
+    def __init__(self, dsn: str = DB_DSN, pool_size: int = DB_POOL_SIZE, cache_ttl: float = DB_CACHE_TTL):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.cache_ttl = cache_ttl
+        self.cache = TTLCache()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.dsn)
+
+    async def pool(self) -> asyncpg.Pool:
+        if not self.enabled:
+            raise DatabaseError("підключення не налаштоване: вкажіть `MATRIX_BOT_DB_DSN` або `POSTGRES_PASSWORD`")
+        async with self._pool_lock:
+            if self._pool is None:
+                try:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn, min_size=0, max_size=self.pool_size,
+                        max_inactive_connection_lifetime=300,
+                        timeout=DB_QUERY_TIMEOUT,
+                        command_timeout=DB_QUERY_TIMEOUT,
+                        server_settings={
+                            'application_name': DB_APPLICATION_NAME,
+                            'default_transaction_read_only': 'on',
+                            'statement_timeout': str(int(DB_QUERY_TIMEOUT * 1000)),
+                        })
+                except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                    # InterfaceError - зокрема хибний DSN (ClientConfigurationError)
+                    raise DatabaseError(f"не вдалося підключитися до БД: {e}") from e
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def report(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Дані звіту (з кешу, якщо свіжі)"""
+        key = f"db/{options['report']}/{options['count']}/{options['sort']}/{options['all']}/{options['seconds']}"
+        return await self.cache.get_or_fetch(key, self.cache_ttl, lambda: self._collect(options))
+
+    async def _collect(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        pool = await self.pool()
+        collect = getattr(self, f"_collect_{options['report']}")
+        try:
+            async with pool.acquire() as connection:
+                return await collect(connection, options)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise DatabaseError(f"БД недоступна: {e}") from e
+        except asyncpg.QueryCanceledError as e:
+            raise DatabaseError(f"запит перевищив {DB_QUERY_TIMEOUT:.0f} с") from e
+        except asyncpg.PostgresError as e:
+            raise DatabaseError(str(e)) from e
+        except (asyncpg.InterfaceError, asyncpg.InternalClientError) as e:
+            # Пул, що закривається, з'єднання в непридатному стані тощо
+            raise DatabaseError(f"помилка з'єднання з БД: {e}") from e
+
+    @staticmethod
+    async def _rows(connection, query: str, *args) -> List[Dict[str, Any]]:
+        return [dict(row) for row in await connection.fetch(query, *args)]
+
+    async def _collect_status(self, connection, options):
+        server = dict(await connection.fetchrow(SERVER_QUERY))
+        connections = await self._rows(connection, CONNECTIONS_QUERY)
+        database = dict(await connection.fetchrow(DATABASE_STATS_QUERY))
+        long_tx = dict(await connection.fetchrow(LONG_TRANSACTIONS_QUERY, options['seconds']))
+        return {'server': server, 'connections': connections, 'database': database, 'long_tx': long_tx}
+
+    async def _collect_conns(self, connection, options):
+        server = dict(await connection.fetchrow(SERVER_QUERY))
+        return {'server': server, 'connections': await self._rows(connection, CONNECTIONS_QUERY)}
+
+    async def _collect_queries(self, connection, options):
+        installed = await connection.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements')")
+        if not installed:
+            raise DatabaseError(
+                "розширення pg_stat_statements не встановлене: додайте "
+                "`shared_preload_libraries = 'pg_stat_statements'` у postgresql.conf, перезапустіть postgres "
+                "і виконайте `CREATE EXTENSION pg_stat_statements;` у БД Dendrite")
+        legacy = connection.get_server_version().major < 13
+        query = STATEMENTS_QUERY.format(
+            total='total_time' if legacy else 'total_exec_time',
+            mean='mean_time' if legacy else 'mean_exec_time',
+            order=DB_QUERY_SORTS[options['sort']])
+        return {'statements': await self._rows(connection, query, options['count'])}
+
+    async def _collect_tables(self, connection, options):
+        block_size = int(await connection.fetchval("SELECT current_setting('block_size')"))
+        patterns = table_patterns(options['all'])
+        tables = await self._rows(connection, TABLES_QUERY, patterns, options['count'])
+        indexes = await self._rows(connection, INDEXES_QUERY, patterns, options['count'])
+        for row in tables:
+            row['bloat'] = estimate_table_bloat(row, block_size)
+        for row in indexes:
+            row['bloat'] = estimate_index_bloat(row, block_size)
+        return {'tables': tables, 'indexes': indexes}
+
+    async def _collect_tx(self, connection, options):
+        return {'transactions': await self._rows(connection, TRANSACTIONS_QUERY, options['seconds'], DB_DEFAULT_COUNT)}
+
+    async def _collect_cache(self, connection, options):
+        block_size = int(await connection.fetchval("SELECT current_setting('block_size')"))
+        database = dict(await connection.fetchrow(DATABASE_STATS_QUERY))
+        tables = await self._rows(connection, TABLE_CACHE_QUERY, table_patterns(options['all']), options['count'])
+        return {'database': database, 'tables': tables, 'block_size': block_size}
+
+
+def _percent(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value * 100:.1f}%"
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f} год"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f} хв"
+    return f"{seconds:.0f} с"
+
+
+def _dendrite_connections(connections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """З'єднання до БД без власного пулу бота"""
+    return [row for row in connections if row['application'] != DB_APPLICATION_NAME]
+
+
+def _saturation_line(connections: List[Dict[str, Any]], server: Dict[str, Any]) -> str:
+    rows = _dendrite_connections(connections)
+    total = sum(row['connections'] for row in rows)
+    active = sum(row['connections'] for row in rows if row['state'] == 'active')
+    saturation = total / DB_MAX_OPEN_CONNS if DB_MAX_OPEN_CONNS else 0
+    icon = '🔴' if saturation >= 1 else '🟡' if saturation >= DB_SATURATION_WARN else '🟢'
+    return (f"{icon} Пул: {total}/{DB_MAX_OPEN_CONNS} з'єднань ({saturation * 100:.0f}% max_open_conns), "
+            f"активних {active}; сервер: {server['server_connections']}/{server['max_connections']}")
+
+
+def format_db_status(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    server, database, long_tx = data['server'], data['database'], data['long_tx']
+    message = (f"🐘 **Postgres {server['version']}**, БД {format_size(server['database_bytes'])}\n"
+               f"{_saturation_line(data['connections'], server)}\n")
+    waiting = sum(row['waiting'] for row in _dendrite_connections(data['connections']))
+    if waiting:
+        message += f"🔒 Чекають на блокування: {waiting}\n"
+    ratio = hit_ratio(database['blks_hit'], database['blks_read'])
+    icon = '🟢' if ratio is None or ratio >= 0.99 else '🟡' if ratio >= 0.95 else '🔴'
+    message += f"{icon} Влучання в кеш: {_percent(ratio)}"
+    if database['stats_reset']:
+        message += f" (з {database['stats_reset']:%Y-%m-%d %H:%M})"
+    message += "\n"
+    message += (f"Транзакцій: {database['xact_commit']} commit, {database['xact_rollback']} rollback; "
+                f"deadlock: {database['deadlocks']}; тимчасові файли: {format_size(database['temp_bytes'])}\n")
+    if long_tx['count']:
+        message += (f"⏳ Довгих транзакцій (> {_duration(options['seconds'])}): {long_tx['count']}, "
+                    f"найстаріша {_duration(long_tx['oldest_seconds'])} - `/db tx`\n")
+    else:
+        message += f"✅ Транзакцій довших за {_duration(options['seconds'])} немає\n"
+    if not server['statements']:
+        message += "ℹ️ pg_stat_statements не встановлене - `/db queries` недоступна\n"
+    message += "Детальніше: `/db conns`, `/db queries`, `/db tables`, `/db tx`, `/db cache`"
+    return message
+
+
+def format_db_connections(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    message = f"🔌 **З'єднання до БД**\n{_saturation_line(data['connections'], data['server'])}\n```\n"
+    message += f"{'ЗАСТОСУНОК':<24} {'СТАН':<22} {'К-СТЬ':>6} {'ЧЕКАЮТЬ':>8} {'НАЙДОВШЕ':>9}\n"
+    for row in data['connections']:
+        message += (f"{row['application'][:24]:<24} {row['state'][:22]:<22} {row['connections']:>6} "
+                    f"{row['waiting']:>8} {_duration(row['longest_seconds']):>9}\n")
+    message += "```"
+    return message
+
+
+def format_db_queries(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    statements = data['statements']
+    if not statements:
+        return "📊 pg_stat_statements ще не зібрало жодного запиту"
+    message = f"📊 **Топ {len(statements)} запитів** (сортування: {options['sort']})\n```\n"
+    message += f"{'#':>2} {'ЧАСТКА':>7} {'ЗАГАЛОМ':>9} {'СЕРЕДНЄ':>9} {'ВИКЛИКІВ':>10} {'КЕШ':>7}\n"
+    for number, row in enumerate(statements, 1):
+        share = row['total_ms'] / row['all_ms'] if row['all_ms'] else None
+        message += (f"{number:>2} {_percent(share):>7} {_duration(row['total_ms'] / 1000):>9} "
+                    f"{row['mean_ms']:>7.1f}мс {row['calls']:>10} "
+                    f"{_percent(hit_ratio(row['blks_hit'], row['blks_read'])):>7}\n")
+    message += "```\n"
+    message += '\n'.join(f"{number}. `{row['query'][:200]}`" for number, row in enumerate(statements, 1))
+    return message
+
+
+def format_db_tables(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    scope = 'усі таблиці' if options['all'] else ', '.join(f"{p}*" for p in DB_TABLE_PREFIXES)
+    message = f"🗄 **Таблиці та індекси** ({scope}; роздуття - оцінка за статистикою)\n```\n"
+    message += f"{'ТАБЛИЦЯ':<34} {'УСЬОГО':>9} {'ІНДЕКСИ':>9} {'РОЗДУТТЯ':>9} {'МЕРТВИХ':>8} {'VACUUM':>11}\n"
+    for row in data['tables']:
+        rows = (row['live'] or 0) + (row['dead'] or 0)
+        dead = (row['dead'] or 0) / rows if rows else None
+        bloat = '-' if row['bloat'] is None else format_size(row['bloat'])
+        vacuumed = f"{row['vacuumed']:%m-%d %H:%M}" if row['vacuumed'] else 'ніколи'
+        message += (f"{row['name'][:34]:<34} {format_size(row['total_bytes']):>9} {format_size(row['index_bytes']):>9} "
+                    f"{bloat:>9} {_percent(dead):>8} {vacuumed:>11}\n")
+    message += f"\n{'ІНДЕКС':<44} {'РОЗМІР':>9} {'РОЗДУТТЯ':>9} {'СКАНУВАНЬ':>10}\n"
+    for row in data['indexes']:
+        bloat = '-' if row['bloat'] is None else format_size(row['bloat'])
+        message += f"{row['name'][:44]:<44} {format_size(row['bytes']):>9} {bloat:>9} {row['scans']:>10}\n"
+    message += "```"
+    unused = [row['name'] for row in data['indexes'] if not row['scans']]
+    if unused:
+        message += f"\n⚠️ Індекси без жодного сканування: {', '.join(unused[:5])}"
+    return message
+
+
+def format_db_transactions(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    transactions = data['transactions']
+    if not transactions:
+        return f"✅ Транзакцій довших за {_duration(options['seconds'])} немає"
+    message = f"⏳ **Транзакції довші за {_duration(options['seconds'])}**\n```\n"
+    message += f"{'PID':>7} {'ЗАСТОСУНОК':<20} {'СТАН':<20} {'ТРАНЗАКЦІЯ':>10} {'ЗАПИТ':>8} {'ЧЕКАЄ':<16} {'БЛОКУЮТЬ':>8}\n"
+    for row in transactions:
+        waiting = f"{row['wait_event_type']}:{row['wait_event']}" if row['wait_event_type'] else '-'
+        message += (f"{row['pid']:>7} {row['application'][:20]:<20} {row['state'][:20]:<20} "
+                    f"{_duration(row['xact_seconds']):>10} {_duration(row['query_seconds']):>8} "
+                    f"{waiting[:16]:<16} {row['blocked_by']:>8}\n")
+    message += "```\n"
+    message += '\n'.join(f"{row['pid']}: `{row['query'][:150]}`" for row in transactions)
+    return message
+
+
+def format_db_cache(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    database, block_size = data['database'], data['block_size']
+    ratio = hit_ratio(database['blks_hit'], database['blks_read'])
+    message = (f"💾 **Влучання в кеш** (shared buffers): БД {_percent(ratio)}, "
+               f"з диска прочитано {format_size(database['blks_read'] * block_size)}\n```\n")
+    message += f"{'ТАБЛИЦЯ (за читаннями з диска)':<34} {'HEAP':>7} {'ІНДЕКСИ':>8} {'З ДИСКА':>9}\n"
+    for row in data['tables']:
+        reads = (row['heap_read'] + row['idx_read']) * block_size
+        message += (f"{row['name'][:34]:<34} {_percent(hit_ratio(row['heap_hit'], row['heap_read'])):>7} "
+                    f"{_percent(hit_ratio(row['idx_hit'], row['idx_read'])):>8} {format_size(reads):>9}\n")
+    message += "```"
+    return message
+
+
+DB_FORMATTERS = {
+    'status': format_db_status,
+    'conns': format_db_connections,
+    'queries': format_db_queries,
+    'tables': format_db_tables,
+    'tx': format_db_transactions,
+    'cache': format_db_cache,
+}
+
+
+def format_db_report(data: Dict[str, Any], options: Dict[str, Any]) -> str:
+    return DB_FORMATTERS[options['report']](data, options)
+
+
+async def _main(args: List[str]):
+    """Звіт у термінал: MATRIX_BOT_DB_DSN=postgresql://... python db.py tables --all"""
+    options = parse_db_args(args)
+    diagnostics = DatabaseDiagnostics()
+    try:
+        print(format_db_report(await diagnostics.report(options), options))
+    finally:
+        await diagnostics.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(_main(sys.argv[1:]))
+    except (ValueError, DatabaseError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
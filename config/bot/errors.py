@@ -0,0 +1,308 @@
+"""
+/errors: зведення помилок з логів усіх сервісів, згрупованих за відбитком повідомлення
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from admin_api import AdminApiClient, AdminApiError
+from logs import LOGS_MAX_LINES, SINCE_ERROR, SINCE_PATTERN, logs_stream_endpoint
+
+# Вікно за замовчуванням для /errors
+ERRORS_DEFAULT_SINCE = os.getenv('MATRIX_BOT_ERRORS_SINCE', '15m')
+# Скільки сервісів читати одночасно
+ERRORS_CONCURRENCY = int(os.getenv('MATRIX_BOT_ERRORS_CONCURRENCY', '4'))
+# Межа груп на сервіс: нові відбитки понад неї лише рахуються (пам'ять не росте з обсягом логів)
+ERRORS_MAX_GROUPS = int(os.getenv('MATRIX_BOT_ERRORS_MAX_GROUPS', '200'))
+# Скільки найчастіших груп показувати для кожного сервісу
+ERRORS_TOP = int(os.getenv('MATRIX_BOT_ERRORS_TOP', '5'))
+# Довжина відбитка та прикладу повідомлення (символи)
+ERRORS_FINGERPRINT_CHARS = 200
+ERRORS_SAMPLE_CHARS = 160
+
+ERRORS_USAGE = "❌ Використання: `/errors [service|glob ...] [--since 15m] [--warn]`"
+
+# Рівні, що потрапляють у зведення, від найважчого
+SEVERITY = {'fatal': 0, 'error': 1, 'warn': 2}
+
+LEVEL_NAMES = {
+    'panic': 'fatal', 'fatal': 'fatal', 'emerg': 'fatal', 'alert': 'fatal', 'crit': 'fatal', 'critical': 'fatal',
+    'error': 'error', 'err': 'error', 'eror': 'error',
+    'warn': 'warn', 'warning': 'warn',
+    'info': 'info', 'notice': 'info', 'log': 'info', 'debug': 'info', 'trace': 'info',
+    'statement': 'info', 'detail': 'info', 'hint': 'info',
+}
+
+# Часова мітка Docker (timestamps=true), яку адмін-панель лишає на початку рядка
+DOCKER_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2})\S*\s')
+
+# Явний рівень у рядку: logrus level=error, JSON "level":"error", [ERROR] / [mau.as/ERROR] / nginx [error],
+# postgres ERROR: / FATAL:
+LEVEL_FIELD = re.compile(
+    r'\b(?:level|lvl)=(\w+)'
+    r'|"(?:level|severity|lvl)"\s*:\s*"(\w+)"'
+    r'|\[(?:[\w.\-]+/)?([A-Za-z]+)\]'
+    r'|\b(PANIC|FATAL|ERROR|WARNING|WARN|CRITICAL|LOG|STATEMENT|DETAIL|HINT|INFO|NOTICE|DEBUG)\b:?'
+)
+# Рядок без явного рівня: слова, за якими адмін-панель і відібрала його
+FATAL_WORDS = re.compile(r'\b(?:panic|fatal)\b', re.IGNORECASE)
+ERROR_WORDS = re.compile(r'\b(?:crit(?:ical)?|error|err|exception|traceback)\b', re.IGNORECASE)
+WARN_WORDS = re.compile(r'\bwarn(?:ing)?\b', re.IGNORECASE)
+
+# Повідомлення та помилка у logrus (Dendrite): msg="..." error="..."
+LOGRUS_FIELD = re.compile(r'\b(msg|error|err)="((?:[^"\\]|\\.)*)"')
+# Префікс рядка до тексту повідомлення: власні часові мітки, [теги], pid nginx, рівень
+LINE_PREFIX = re.compile(
+    r'^(?:[\[(]?\d{4}[-/]\d{2}[-/]\d{2}[ T][\d:.,]+(?:Z|[+-]\d{2}:?\d{2}| [A-Z]{3,4})?[\])]?\s*'
+    r'|\[[^\]]{0,40}\]\s*|\d+#\d+:\s*|\*\d+\s+'
+    r'|(?:PANIC|FATAL|ERROR|WARNING|WARN|CRITICAL|INFO|NOTICE|DEBUG|LOG):?\s+)+'
+)
+
+# Змінні частини повідомлення, що маскуються у відбитку (один прохід). Довгі слова (токени,
+# UUID, хеші) перевіряються на цифри вже у функції заміни - це дешевше за lookahead на кожному слові
+FINGERPRINT_PARTS = re.compile(
+    r'(?P<user>@[\w.=\-/+]+:[\w.\-]+(?::\d+)?)'
+    r'|(?P<room>![\w.=\-/+]+:[\w.\-]+(?::\d+)?)'
+    r'|(?P<alias>#[\w.=\-/+]+:[\w.\-]+(?::\d+)?)'
+    r'|(?P<event>\$[\w\-+/=]{8,}(?::[\w.\-]+)?)'
+    r'|(?P<ip>\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b)'
+    r'|(?P<word>\b[\w\-]{12,})'
+    r'|(?P<n>\d+(?:\.\d+)?)'
+)
+FINGERPRINT_LABELS = {name: f"<{name}>" for name in ('user', 'room', 'alias', 'event', 'ip', 'n')}
+DIGIT = re.compile(r'\d')
+WHITESPACE = re.compile(r'\s+')
+
+
+def parse_errors_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /errors; ValueError з поясненням при помилці"""
+    options = {'services': [], 'since': ERRORS_DEFAULT_SINCE, 'warn': False}
+    rest = list(args)
+    while rest:
+        arg = rest.pop(0)
+        if arg == '--since':
+            if not rest:
+                raise ValueError(ERRORS_USAGE)
+            options['since'] = rest.pop(0)
+        elif arg == '--warn':
+            options['warn'] = True
+        elif arg.startswith('-'):
+            raise ValueError(ERRORS_USAGE)
+        else:
+            options['services'].append(arg)
+    if not SINCE_PATTERN.match(options['since']):
+        raise ValueError(SINCE_ERROR)
+    return options
+
+
+def errors_stream_endpoint(service: str, options: Dict[str, Any]) -> str:
+    """Потік логів сервісу за вікно; адмін-панель заздалегідь відкидає рядки без маркерів помилок"""
+    return logs_stream_endpoint({
+        'service': service,
+        'lines': None,
+        'since': options['since'],
+        'grep': None,
+        'level': 'warn' if options['warn'] else 'error',
+        'follow': False,
+    })
+
+
+def classify(text: str) -> str:
+    """Рівень рядка: перший упізнаний явний маркер, інакше - за словами помилок"""
+    for match in LEVEL_FIELD.finditer(text):
+        level = LEVEL_NAMES.get(next(group for group in match.groups() if group).lower())
+        if level:
+            return level
+    if FATAL_WORDS.search(text):
+        return 'fatal'
+    if ERROR_WORDS.search(text):
+        return 'error'
+    if WARN_WORDS.search(text):
+        return 'warn'
+    return 'info'
+
+
+def extract_message(text: str) -> str:
+    """Текст повідомлення без часових міток і службових полів (JSON, logrus або звичайний рядок)"""
+    if text.startswith('{'):
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            message = str(record.get('message') or record.get('msg') or '')
+            error = record.get('error') or record.get('err')
+            if message or error:
+                return f"{message}: {error}" if message and error else str(message or error)
+    fields = dict(LOGRUS_FIELD.findall(text))
+    if 'msg' in fields:
+        error = fields.get('error') or fields.get('err')
+        return f"{fields['msg']}: {error}" if error else fields['msg']
+    return LINE_PREFIX.sub('', text, count=1)
+
+
+def _mask(match: re.Match) -> str:
+    if match.lastgroup == 'word':
+        word = match.group()
+        return '<id>' if DIGIT.search(word) else word
+    return FINGERPRINT_LABELS[match.lastgroup]
+
+
+def fingerprint(message: str) -> str:
+    """Відбиток: ID користувачів/кімнат/подій, UUID, адреси та числа замінено на мітки"""
+    masked = FINGERPRINT_PARTS.sub(_mask, message)
+    return WHITESPACE.sub(' ', masked).strip()[:ERRORS_FINGERPRINT_CHARS]
+
+
+class ErrorGroup:
+    """Схожі повідомлення одного рівня: кількість, перша/остання поява, приклад"""
+
+    __slots__ = ('level', 'fingerprint', 'sample', 'count', 'first_seen', 'last_seen')
+
+    def __init__(self, level: str, fingerprint: str, sample: str, seen: Optional[str]):
+        self.level = level
+        self.fingerprint = fingerprint
+        self.sample = sample
+        self.count = 0
+        self.first_seen = seen
+        self.last_seen = seen
+
+
+class ServiceErrors:
+    """
+    Потокове групування рядків логу одного сервісу.
+
+    Пам'ять обмежена `max_groups` групами незалежно від обсягу логів:
+    рядки з новими відбитками понад межу лише рахуються в `overflow`.
+    """
+
+    def __init__(self, service: str, include_warnings: bool = False, max_groups: int = ERRORS_MAX_GROUPS):
+        self.service = service
+        self.include_warnings = include_warnings
+        self.max_groups = max_groups
+        self.groups: Dict[Tuple[str, str], ErrorGroup] = {}
+        self.lines = 0
+        self.matched = 0
+        self.overflow = 0
+        self.error: Optional[str] = None
+
+    def add(self, line: str):
+        self.lines += 1
+        seen = None
+        stamp = DOCKER_TIMESTAMP.match(line)
+        if stamp:
+            seen = f"{stamp.group(1)} {stamp.group(2)}"
+            line = line[stamp.end():]
+        level = classify(line)
+        if level not in SEVERITY or (level == 'warn' and not self.include_warnings):
+            return
+        self.matched += 1
+
+        message = extract_message(line)
+        key = (level, fingerprint(message))
+        group = self.groups.get(key)
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                self.overflow += 1
+                return
+            group = self.groups[key] = ErrorGroup(level, key[1], message[:ERRORS_SAMPLE_CHARS], seen)
+        group.count += 1
+        if seen:
+            # Docker віддає рядки за часом, але stdout і stderr можуть трохи перемішатися
+            if group.first_seen is None or seen < group.first_seen:
+                group.first_seen = seen
+            if group.last_seen is None or seen > group.last_seen:
+                group.last_seen = seen
+
+    @property
+    def truncated(self) -> bool:
+        """Адмін-панель обрізала потік на LOGS_MAX_LINES рядках"""
+        return self.lines >= LOGS_MAX_LINES
+
+    def top(self, count: int = ERRORS_TOP) -> List[ErrorGroup]:
+        return heapq.nlargest(count, self.groups.values(), key=lambda g: (g.count, -SEVERITY[g.level]))
+
+
+class ErrorScanner:
+    """Одночасне читання логів кількох сервісів з адмін-панелі з групуванням помилок"""
+
+    def __init__(self, admin_api: AdminApiClient, concurrency: int = ERRORS_CONCURRENCY):
+        self.admin_api = admin_api
+        self.concurrency = concurrency
+
+    async def scan(self, services: List[str], options: Dict[str, Any]) -> List[ServiceErrors]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def scan_one(service: str) -> ServiceErrors:
+            async with semaphore:
+                return await self.scan_service(service, options)
+
+        return list(await asyncio.gather(*(scan_one(service) for service in services)))
+
+    async def scan_service(self, service: str, options: Dict[str, Any]) -> ServiceErrors:
+        result = ServiceErrors(service, options['warn'])
+        try:
+            async for line in self.admin_api.stream_lines(errors_stream_endpoint(service, options),
+                                                          timeout=self.admin_api.timeout_for('logs')):
+                result.add(line)
+        except AdminApiError as e:
+            result.error = str(e)
+        except asyncio.TimeoutError:
+            result.error = "таймаут читання логів"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.error = str(e)
+        return result
+
+
+def _seen(value: Optional[str], today: str) -> str:
+    if not value:
+        return '-'
+    return value[11:] if value.startswith(today) else value[5:16]
+
+
+def format_errors(results: List[ServiceErrors], options: Dict[str, Any], elapsed: float) -> str:
+    """Зведення: для кожного сервісу з помилками - рейтинг груп за кількістю"""
+    levels = 'помилки та попередження' if options['warn'] else 'помилки'
+    failed = [r for r in results if r.error]
+    clean = [r.service for r in results if not r.error and not r.matched]
+    noisy = sorted((r for r in results if not r.error and r.matched), key=lambda r: r.matched, reverse=True)
+    total = sum(r.matched for r in noisy)
+
+    if not noisy and not failed:
+        return f"✅ За {options['since']} {levels} в логах {len(results)} сервісів не знайдено"
+    message = (f"🚨 **{levels.capitalize()} за {options['since']}**: {total} рядків у {len(noisy)} "
+               f"з {len(results)} сервісів ({sum(r.lines for r in results)} рядків прочитано за {elapsed:.1f} с, "
+               f"час UTC)\n")
+
+    today = time.strftime('%Y-%m-%d', time.gmtime())
+    for result in noisy:
+        top = result.top()
+        message += f"\n**{result.service}** - {result.matched} рядків, {len(result.groups)} груп\n```\n"
+        message += f"{'#':>2} {'К-СТЬ':>7} {'ПЕРША':>11} {'ОСТАННЯ':>11} {'РІВЕНЬ':<6}\n"
+        for number, group in enumerate(top, 1):
+            message += (f"{number:>2} {group.count:>7} {_seen(group.first_seen, today):>11} "
+                        f"{_seen(group.last_seen, today):>11} {group.level:<6}\n")
+        message += "```\n"
+        message += '\n'.join(f"{number}. `{group.sample.replace('`', chr(39))}`" for number, group in enumerate(top, 1))
+        rest = len(result.groups) - len(top)
+        if rest > 0:
+            message += f"\n... ще {rest} груп ({result.matched - result.overflow - sum(g.count for g in top)} рядків)"
+        if result.overflow:
+            message += f"\n⚠️ {result.overflow} рядків з новими відбитками понад ліміт {result.max_groups} груп"
+        if result.truncated:
+            message += f"\n⚠️ Прочитано лише перші {LOGS_MAX_LINES} рядків - звузьте `--since`"
+        message += "\n"
+
+    for result in failed:
+        message += f"\n⚠️ **{result.service}**: не вдалося прочитати логи: {result.error}"
+    if clean:
+        message += f"\n✅ Без помилок: {', '.join(clean)}"
+    return message.rstrip()
@@ -0,0 +1,153 @@
+"""
+Паралельні дії над кількома сервісами з урахуванням залежностей
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import fnmatch
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from admin_api import AdminApiClient
+
+logger = logging.getLogger(__name__)
+
+# Скільки сервісів одного рівня обробляти одночасно
+FANOUT_CONCURRENCY = int(os.getenv('MATRIX_BOT_FANOUT_CONCURRENCY', '4'))
+# Скільки чекати на здоровий стан після дії (с)
+FANOUT_HEALTH_TIMEOUT = float(os.getenv('MATRIX_BOT_FANOUT_HEALTH_TIMEOUT', '120'))
+FANOUT_HEALTH_POLL = 2
+
+# Залежності сервісів (відповідають depends_on у docker-compose.yml)
+SERVICE_DEPENDENCIES = {
+    'dendrite': ['postgres', 'redis'],
+    'signal-bridge': ['dendrite'],
+    'whatsapp-bridge': ['dendrite'],
+    'discord-bridge': ['dendrite'],
+    'admin-panel': ['dendrite', 'postgres'],
+    'matrix-bot': ['dendrite', 'admin-panel'],
+    'nginx': ['dendrite', 'element-web', 'admin-panel'],
+    'cloudflared': ['nginx'],
+}
+
+
+def service_tier(name: str, dependencies: Dict[str, List[str]] = SERVICE_DEPENDENCIES,
+                 _seen: Optional[set] = None) -> int:
+    """Рівень сервісу: 0 - без залежностей, далі - 1 + максимальний рівень залежностей"""
+    _seen = _seen or set()
+    if name in _seen:
+        return 0
+    deps = dependencies.get(name, [])
+    if not deps:
+        return 0
+    return 1 + max(service_tier(dep, dependencies, _seen | {name}) for dep in deps)
+
+
+def order_tiers(names: List[str], reverse: bool = False) -> List[List[str]]:
+    """Групування сервісів за рівнями; reverse - залежні сервіси першими (для stop)"""
+    tiers: Dict[int, List[str]] = {}
+    for name in names:
+        tiers.setdefault(service_tier(name), []).append(name)
+    ordered = [sorted(tiers[level]) for level in sorted(tiers)]
+    return list(reversed(ordered)) if reverse else ordered
+
+
+def expand_targets(patterns: List[str], known: List[str]) -> Tuple[List[str], List[str]]:
+    """Розгортання glob-шаблонів за відомими сервісами; повертає (сервіси, шаблони без збігів)"""
+    targets: List[str] = []
+    unmatched: List[str] = []
+    for pattern in patterns:
+        if any(ch in pattern for ch in '*?['):
+            matches = sorted(name for name in known if fnmatch.fnmatchcase(name, pattern))
+            if not matches:
+                unmatched.append(pattern)
+            targets.extend(m for m in matches if m not in targets)
+        elif pattern not in targets:
+            targets.append(pattern)
+    return targets, unmatched
+
+
+class TargetResult:
+    """Результат дії над одним сервісом"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ok = False
+        self.error: Optional[str] = None
+        self.action_time = 0.0
+        self.health_time = 0.0
+
+    @property
+    def total_time(self) -> float:
+        return self.action_time + self.health_time
+
+
+class ServiceFanout:
+    """Виконання дії над сервісами: рівень за рівнем, паралельно всередині рівня"""
+
+    def __init__(self, admin_api: AdminApiClient, concurrency: int = FANOUT_CONCURRENCY,
+                 health_timeout: float = FANOUT_HEALTH_TIMEOUT):
+        self.admin_api = admin_api
+        self.concurrency = concurrency
+        self.health_timeout = health_timeout
+
+    async def run(self, action: str, targets: List[str],
+                  endpoint_for: Callable[[str], str]) -> List[TargetResult]:
+        """Дія над сервісами; stop виконується у зворотному порядку залежностей"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: List[TargetResult] = []
+        for tier in order_tiers(targets, reverse=(action == 'stop')):
+            results.extend(await asyncio.gather(
+                *(self._run_one(semaphore, action, name, endpoint_for(name)) for name in tier)
+            ))
+        return results
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, action: str, name: str, endpoint: str) -> TargetResult:
+        result = TargetResult(name)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await self.admin_api.request(endpoint, 'POST')
+            result.action_time = time.perf_counter() - started
+            if not response.get('success'):
+                result.error = response.get('error', 'Невідома помилка')
+                return result
+
+            started = time.perf_counter()
+            want_running = action != 'stop'
+            if await self.wait_for_state(name, want_running):
+                result.ok = True
+            else:
+                result.error = f"не {'запустився' if want_running else 'зупинився'} за {self.health_timeout:.0f} с"
+            result.health_time = time.perf_counter() - started
+        return result
+
+    async def wait_for_state(self, name: str, running: bool) -> bool:
+        """Очікування, поки сервіс стане здоровим (або зупиниться) за даними /api/health"""
+        deadline = time.monotonic() + self.health_timeout
+        while time.monotonic() < deadline:
+            # Через кеш: кілька сервісів, що чекають одночасно, ділять один запит
+            response = await self.admin_api.request('health')
+            if response.get('success'):
+                for item in response.get('health', []):
+                    if item.get('name') == name and bool(item.get('healthy')) == running:
+                        return True
+            await asyncio.sleep(FANOUT_HEALTH_POLL)
+        return False
+
+
+def format_fanout_results(action: str, results: List[TargetResult], elapsed: float,
+                          unmatched: List[str] = ()) -> str:
+    """Зведене повідомлення з часом по кожному сервісу"""
+    succeeded = sum(1 for r in results if r.ok)
+    emoji = "✅" if succeeded == len(results) and not unmatched else "⚠️" if succeeded else "❌"
+    message = f"{emoji} **{action}**: {succeeded}/{len(results)} за {elapsed:.1f} с\n\n"
+    for r in results:
+        if r.ok:
+            message += f"🟢 **{r.name}** - {r.total_time:.1f} с (дія {r.action_time:.1f} с, health {r.health_time:.1f} с)\n"
+        else:
+            message += f"🔴 **{r.name}** - {r.error} ({r.total_time:.1f} с)\n"
+    for pattern in unmatched:
+        message += f"⚪ `{pattern}` - немає збігів\n"
+    return message
@@ -0,0 +1,13 @@
+"""
+Спільні допоміжні функції форматування відповідей бота
+Автор: Matrix Setup Team
+"""
+
+
+def format_size(size: float) -> str:
+    """Розмір у КБ/МБ/ГБ"""
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:.1f} ГБ"
+    if size >= 1024 ** 2:
+        return f"{size / 1024 ** 2:.0f} МБ"
+    return f"{size / 1024:.0f} КБ"
@@ -0,0 +1,129 @@
+"""
+Подієвий моніторинг стану контейнерів для Matrix бота
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from admin_api import AdminApiClient, AdminApiError
+
+logger = logging.getLogger(__name__)
+
+# Резервне опитування /api/health на випадок пропущених подій (с)
+HEALTH_RECONCILE_INTERVAL = float(os.getenv('HEALTH_RECONCILE_INTERVAL', '600'))
+# Адмін-панель надсилає ping кожні 30 с; без даних довше - перепідключення
+EVENTS_READ_TIMEOUT = 90
+EVENTS_MAX_BACKOFF = 60
+
+ChangeCallback = Callable[[str, Optional[dict], dict], Awaitable[None]]
+
+
+class HealthMonitor:
+    """
+    Таблиця стану сервісів, що оновлюється потоком подій Docker
+    (`/api/events/stream`) та рідким звірянням з `/api/health`.
+    """
+
+    def __init__(self, admin_api: AdminApiClient, on_change: ChangeCallback,
+                 reconcile_interval: float = HEALTH_RECONCILE_INTERVAL):
+        self.admin_api = admin_api
+        self.on_change = on_change
+        self.reconcile_interval = reconcile_interval
+        self.state: Dict[str, dict] = {}
+        self.events_received = 0
+        self.reconciles = 0
+        self.connected = False
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """Запуск підписки на події та резервного опитування"""
+        await asyncio.gather(self._watch_events(), self._reconcile_loop())
+
+    async def reconcile(self):
+        """Звіряння таблиці стану з повним знімком /api/health"""
+        started_ms = int(time.time() * 1000)
+        response = await self.admin_api.request('health', use_cache=False)
+        if not response.get('success'):
+            logger.error(f"Помилка звіряння стану: {response.get('error', 'Невідома помилка')}")
+            return
+
+        self.reconciles += 1
+        seen = set()
+        for item in response.get('health', []):
+            seen.add(item['name'])
+            await self.apply(item['name'], item.get('status'), bool(item.get('healthy')), started_ms)
+        for name in list(self.state):
+            if name not in seen and self.state[name]['status'] != 'removed':
+                await self.apply(name, 'removed', False, started_ms)
+
+    async def apply(self, name: str, status: str, healthy: bool, timestamp_ms: int):
+        """Оновлення стану сервісу; викликає on_change при зміні"""
+        previous = self.state.get(name)
+        if previous is not None:
+            # Знімок, зроблений до останньої події, не перезаписує її
+            if timestamp_ms < previous['updated']:
+                return
+            if previous['status'] == status and previous['healthy'] == healthy:
+                previous['updated'] = timestamp_ms
+                return
+
+        current = {
+            'status': status,
+            'healthy': healthy,
+            'updated': timestamp_ms,
+            'since': timestamp_ms,
+        }
+        self.state[name] = current
+        try:
+            await self.on_change(name, previous, current)
+        except Exception as e:
+            logger.error(f"Помилка обробки зміни стану {name}: {e}")
+
+    async def _watch_events(self):
+        backoff = 1
+        while True:
+            try:
+                stream = self.admin_api.stream_lines('events/stream', read_timeout=EVENTS_READ_TIMEOUT)
+                first = True
+                async for line in stream:
+                    if first:
+                        # Після (пере)підключення звіряємося, щоб не пропустити зміни
+                        first = False
+                        self.connected = True
+                        backoff = 1
+                        self._reconcile_task = asyncio.create_task(self.reconcile())
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get('type') != 'container' or not event.get('status'):
+                        continue
+                    self.events_received += 1
+                    await self.apply(event['name'], event['status'], bool(event.get('healthy')),
+                                     int(event.get('time') or time.time() * 1000))
+                logger.warning("Потік подій адмін-панелі завершився, перепідключення")
+            except asyncio.CancelledError:
+                raise
+            except (AdminApiError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Потік подій недоступний ({e}), працює лише опитування")
+            except Exception as e:
+                logger.error(f"Помилка потоку подій: {e}")
+            self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, EVENTS_MAX_BACKOFF)
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Помилка звіряння стану: {e}")
+            await asyncio.sleep(self.reconcile_interval)
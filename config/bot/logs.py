@@ -0,0 +1,174 @@
+"""
+Потокові логи для Matrix бота: розбір аргументів /logs та розбиття на сторінки
+Автор: Matrix Setup Team
+"""
+
+import os
+import re
+import tempfile
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, urlencode
+
+# Максимальна довжина однієї сторінки логів у повідомленні (символи)
+LOGS_PAGE_CHARS = int(os.getenv('MATRIX_BOT_LOGS_PAGE_CHARS', '3500'))
+# Скільки сторінок надсилати повідомленнями; решта йде файлом
+LOGS_MAX_PAGES = int(os.getenv('MATRIX_BOT_LOGS_MAX_PAGES', '5'))
+# Верхня межа рядків, які адмін-панель віддасть за один запит
+LOGS_MAX_LINES = int(os.getenv('MATRIX_BOT_LOGS_MAX_LINES', '200000'))
+# Режим follow: інтервал між повідомленнями та максимальна тривалість (с)
+LOGS_FOLLOW_INTERVAL = float(os.getenv('MATRIX_BOT_LOGS_FOLLOW_INTERVAL', '5'))
+LOGS_FOLLOW_DURATION = float(os.getenv('MATRIX_BOT_LOGS_FOLLOW_DURATION', '600'))
+
+LOG_LEVELS = ('error', 'warn', 'info')
+
+# --since: відносний час (15m, 2h, 1d), unix час або ISO дата - розбирає адмін-панель
+SINCE_PATTERN = re.compile(r'^(\d+[smhd]|\d+|\d{4}-\d{2}-\d{2}.*)$')
+SINCE_ERROR = "❌ `--since` приймає 15m, 2h, 1d, unix час або ISO дату"
+
+LOGS_USAGE = ("❌ Використання: `/logs <service> [lines] [follow] [--grep <regex>] "
+              "[--level error|warn|info] [--since 15m] [--file]`")
+
+
+def parse_logs_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /logs; ValueError з поясненням при помилці"""
+    if not args:
+        raise ValueError(LOGS_USAGE)
+
+    options = {
+        'service': args[0],
+        'lines': None,
+        'follow': False,
+        'grep': None,
+        'level': None,
+        'since': None,
+        'file': False,
+    }
+    rest = list(args[1:])
+    while rest:
+        arg = rest.pop(0)
+        if arg in ('--grep', '--level', '--since'):
+            if not rest:
+                raise ValueError(LOGS_USAGE)
+            options[arg[2:]] = rest.pop(0)
+        elif arg == 'follow' or arg == '--follow':
+            options['follow'] = True
+        elif arg == '--file':
+            options['file'] = True
+        elif arg.isdigit():
+            options['lines'] = int(arg)
+        else:
+            raise ValueError(LOGS_USAGE)
+
+    if options['grep']:
+        try:
+            re.compile(options['grep'])
+        except re.error as e:
+            raise ValueError(f"❌ Невірний регулярний вираз: {e}")
+    if options['level'] and options['level'] not in LOG_LEVELS:
+        raise ValueError(f"❌ Рівень має бути одним з: {', '.join(LOG_LEVELS)}")
+    if options['since'] and not SINCE_PATTERN.match(options['since']):
+        raise ValueError(SINCE_ERROR)
+    return options
+
+
+def logs_stream_endpoint(options: Dict[str, Any]) -> str:
+    """Endpoint адмін-панелі для потокових логів з фільтрами"""
+    query = {}
+    if options['lines'] is not None:
+        query['lines'] = options['lines']
+    elif options['follow']:
+        query['lines'] = 10
+    elif not options['since']:
+        query['lines'] = 100
+    for key in ('since', 'grep', 'level'):
+        if options[key]:
+            query[key] = options[key]
+    if options['follow']:
+        query['follow'] = 1
+    else:
+        query['limit'] = LOGS_MAX_LINES
+    return f"logs/{quote(options['service'], safe='')}/stream?{urlencode(query)}"
+
+
+class LogPager:
+    """
+    Накопичує рядки логів у сторінки фіксованого розміру.
+
+    У пам'яті тримається лише поточна сторінка; після `max_pages` сторінок
+    (або одразу, якщо `to_file`) рядки пишуться у тимчасовий файл.
+    """
+
+    def __init__(self, page_chars: int = LOGS_PAGE_CHARS, max_pages: int = LOGS_MAX_PAGES,
+                 to_file: bool = False):
+        self.page_chars = page_chars
+        self.max_pages = 0 if to_file else max_pages
+        self.pages_sent = 0
+        self.total_lines = 0
+        self.file_lines = 0
+        self._page: List[str] = []
+        self._page_size = 0
+        self._file = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def add(self, line: str) -> Optional[str]:
+        """Додає рядок; повертає готову сторінку, якщо вона заповнилась"""
+        self.total_lines += 1
+        if self.pages_sent >= self.max_pages:
+            self._write_file(line)
+            return None
+
+        line = line[:self.page_chars]
+        page = None
+        if self._page and self._page_size + len(line) + 1 > self.page_chars:
+            page = self._take_page()
+            if self.pages_sent >= self.max_pages:
+                self._write_file(line)
+                return page
+        self._page.append(line)
+        self._page_size += len(line) + 1
+        return page
+
+    def finish(self) -> Optional[str]:
+        """Залишок поточної сторінки (якщо є)"""
+        if not self._page:
+            return None
+        if self.spilled:
+            # Файл уже створено - дописуємо залишок туди ж для цілісності
+            for line in self._page:
+                self._write_file(line)
+            self._page = []
+            return None
+        return self._take_page()
+
+    def file_path(self) -> Optional[str]:
+        """Шлях до файлу з рештою логів (файл закривається)"""
+        if self._file is None:
+            return None
+        self._file.close()
+        return self._file.name
+
+    def cleanup(self):
+        """Видалення тимчасового файлу"""
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._file.name)
+            except OSError:
+                pass
+            self._file = None
+
+    def _take_page(self) -> str:
+        page = '\n'.join(self._page)
+        self._page = []
+        self._page_size = 0
+        self.pages_sent += 1
+        return page
+
+    def _write_file(self, line: str):
+        if self._file is None:
+            self._file = tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.log', delete=False)
+        self._file.write(line + '\n')
+        self.file_lines += 1
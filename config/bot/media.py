@@ -0,0 +1,392 @@
+"""
+/media: інкрементальний індекс медіа-сховища Dendrite - обсяг, приріст, гістограма
+розмірів, найбільші файли, частка мініатюр і пробний прогін політик зберігання
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from formatting import format_size
+from state_store import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Каталог медіа Dendrite (media_api.base_path у dendrite.yaml), змонтований лише на читання
+MEDIA_DIR = os.getenv('MATRIX_BOT_MEDIA_DIR', '/var/lib/matrix/media')
+# Паралельні потоки обходу: час іде на stat/scandir, які відпускають GIL
+MEDIA_SCAN_WORKERS = int(os.getenv('MATRIX_BOT_MEDIA_SCAN_WORKERS', '8'))
+# Індекс, молодший за стільки секунд, використовується без повторного обходу
+MEDIA_INDEX_MAX_AGE = float(os.getenv('MATRIX_BOT_MEDIA_INDEX_MAX_AGE', '300'))
+MEDIA_INDEX_FILE = 'media-index.sqlite'
+MEDIA_TOP_COUNT = 5
+# Скільки каталогів записується в індекс однією транзакцією
+MEDIA_WRITE_BATCH = 5000
+# Скільки каталогів обходить один потік за одне завдання
+MEDIA_SCAN_CHUNK = 256
+MEDIA_HISTORY_DAYS = 35
+
+# Dendrite кладе мініатюри поруч з оригіналом: <hash>/file та <hash>/thumbnail-<w>x<h>-<метод>
+THUMBNAIL_PREFIX = 'thumbnail-'
+
+# Межі гістограми (байти); max_file_size_bytes у dendrite.yaml - 10 МБ
+MEDIA_HISTOGRAM = (
+    ('< 10 КБ', 10 * 1024),
+    ('10-100 КБ', 100 * 1024),
+    ('100 КБ-1 МБ', 1024 ** 2),
+    ('1-5 МБ', 5 * 1024 ** 2),
+    ('5-10 МБ', 10 * 1024 ** 2),
+    ('> 10 МБ', None),
+)
+
+MEDIA_USAGE = ("❌ Використання: `/media stats [n] [--rescan]` або "
+               "`/media retention <вік, напр. 90d> [--min-size 1M] [--thumbnails]`")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    thumbnail INTEGER NOT NULL,
+    PRIMARY KEY (dir, name)
+);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    dirs INTEGER NOT NULL,
+    rescanned INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+"""
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+_AGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+
+
+def parse_size(value: str) -> int:
+    """'512K', '5M', '1G' -> байти"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([kmg]?)b?', value.strip().lower())
+    if not match:
+        raise ValueError(MEDIA_USAGE)
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def parse_age(value: str) -> float:
+    """'36h', '90d', '12w', '6m', '1y' -> секунди"""
+    match = re.fullmatch(r'(\d+)([hdwmy])', value.strip().lower())
+    if not match:
+        raise ValueError(MEDIA_USAGE)
+    return int(match.group(1)) * _AGE_UNITS[match.group(2)]
+
+
+def parse_media_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /media; ValueError з поясненням при помилці"""
+    if not args or args[0] not in ('stats', 'retention'):
+        raise ValueError(MEDIA_USAGE)
+    rest = list(args[1:])
+    options = {'action': args[0], 'count': MEDIA_TOP_COUNT, 'rescan': False,
+               'age': None, 'age_text': None, 'min_size': 0, 'thumbnails': False}
+    if options['action'] == 'retention':
+        if not rest:
+            raise ValueError(MEDIA_USAGE)
+        options['age_text'] = rest.pop(0)
+        options['age'] = parse_age(options['age_text'])
+    while rest:
+        arg = rest.pop(0)
+        if arg == '--rescan':
+            options['rescan'] = True
+        elif arg == '--min-size' and options['action'] == 'retention' and rest:
+            options['min_size'] = parse_size(rest.pop(0))
+        elif arg == '--thumbnails' and options['action'] == 'retention':
+            options['thumbnails'] = True
+        elif arg.isdigit() and int(arg) > 0 and options['action'] == 'stats':
+            options['count'] = int(arg)
+        else:
+            raise ValueError(MEDIA_USAGE)
+    return options
+
+
+def _visit(base_path: str, relative: str, known: Optional[Tuple[int, str]]):
+    """
+    Один каталог: (шлях, mtime_ns, підкаталоги, файли). Якщо mtime не змінився з
+    попереднього обходу, набір записів той самий - файли не перелічуються (None).
+    mtime береться до читання каталогу: зміна під час обходу дасть новий mtime
+    і каталог перечитається наступного разу.
+    """
+    full = os.path.join(base_path, relative) if relative else base_path
+    try:
+        mtime = os.stat(full).st_mtime_ns
+        if known is not None and known[0] == mtime:
+            return relative, mtime, known[1].split('\n') if known[1] else [], None
+        files, subdirs = [], []
+        with os.scandir(full) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((entry.name, stat.st_size, int(stat.st_mtime)))
+        return relative, mtime, subdirs, files
+    except FileNotFoundError:
+        # Видалено між переліком батьківського каталогу та цим обходом
+        return relative, None, [], None
+
+
+def _visit_chunk(base_path: str, chunk: List[Tuple[str, Optional[Tuple[int, str]]]]):
+    # Пакет каталогів на одне завдання пулу: майже всі вони незмінні (один stat),
+    # і окремий future на кожен коштував би більше за сам stat
+    return [_visit(base_path, relative, known) for relative, known in chunk]
+
+
+class MediaIndex:
+    """
+    Індекс медіа-сховища в SQLite (у каталозі стану бота).
+
+    Обхід іде рівнями дерева паралельно в MEDIA_SCAN_WORKERS потоках. Для кожного
+    каталогу спершу порівнюється mtime з індексом: каталог перечитується (scandir +
+    stat файлів) лише якщо в ньому додались або зникли записи. Для сховища Dendrite,
+    де файли не змінюються після завантаження, повторний обхід коштує один stat на
+    каталог замість stat на кожен файл, а звіти - це SQL-запити до індексу.
+    """
+
+    def __init__(self, base_path: str = MEDIA_DIR, path: Optional[str] = None,
+                 workers: int = MEDIA_SCAN_WORKERS):
+        self.base_path = base_path
+        self.path = path or os.path.join(STATE_DIR, MEDIA_INDEX_FILE)
+        self.workers = workers
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        return connection
+
+    @staticmethod
+    def is_fresh(scan: Optional[Dict[str, Any]]) -> bool:
+        return bool(scan) and time.time() - scan['finished'] < MEDIA_INDEX_MAX_AGE
+
+    async def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Оновлення індексу, якщо він застарів; одночасні виклики чекають на один обхід"""
+        async with self._lock:
+            last = await asyncio.to_thread(self.last_scan)
+            if not force and self.is_fresh(last):
+                return last
+            return await asyncio.to_thread(self.scan)
+
+    def last_scan(self) -> Optional[Dict[str, Any]]:
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                'SELECT id, finished, files, bytes, dirs, rescanned, seconds FROM scans ORDER BY id DESC LIMIT 1'
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return dict(zip(('id', 'finished', 'files', 'bytes', 'dirs', 'rescanned', 'seconds'), row))
+
+    def scan(self) -> Dict[str, Any]:
+        """Інкрементальний обхід; повертає підсумок обходу"""
+        if not os.path.isdir(self.base_path):
+            raise FileNotFoundError(f"каталог медіа {self.base_path} недоступний (чи змонтовано volume?)")
+        started = time.perf_counter()
+        connection = self._connect()
+        try:
+            scan_id = (connection.execute('SELECT coalesce(max(id), 0) FROM scans').fetchone()[0]) + 1
+            known = {path: (mtime, subdirs) for path, mtime, subdirs
+                     in connection.execute('SELECT path, mtime_ns, subdirs FROM dirs')}
+            dirs = rescanned = 0
+            frontier = ['']
+            with ThreadPoolExecutor(self.workers) as pool:
+                while frontier:
+                    next_frontier: List[str] = []
+                    for offset in range(0, len(frontier), MEDIA_WRITE_BATCH):
+                        batch = [(relative, known.get(relative))
+                                 for relative in frontier[offset:offset + MEDIA_WRITE_BATCH]]
+                        chunks = [batch[i:i + MEDIA_SCAN_CHUNK] for i in range(0, len(batch), MEDIA_SCAN_CHUNK)]
+                        changed, removed = [], []
+                        for results in pool.map(lambda chunk: _visit_chunk(self.base_path, chunk), chunks):
+                            for relative, mtime, subdirs, files in results:
+                                if mtime is None:
+                                    removed.append(relative)
+                                    continue
+                                dirs += 1
+                                next_frontier.extend(f"{relative}/{name}" if relative else name for name in subdirs)
+                                if files is None:
+                                    continue
+                                changed.append((relative, mtime, subdirs, files))
+                                # Підкаталоги, що зникли з переліку, видаляються з індексу разом з вмістом
+                                previous = known.get(relative)
+                                if previous and previous[1]:
+                                    removed.extend(f"{relative}/{name}" if relative else name
+                                                   for name in set(previous[1].split('\n')) - set(subdirs))
+                        rescanned += len(changed)
+                        self._write(connection, changed, removed)
+                    frontier = next_frontier
+
+            with connection:
+                files, size = connection.execute('SELECT count(*), coalesce(sum(size), 0) FROM files').fetchone()
+                seconds = time.perf_counter() - started
+                connection.execute('INSERT INTO scans VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   (scan_id, time.time(), files, size, dirs, rescanned, seconds))
+                # Історії обходів вистачає на приріст за місяць
+                connection.execute('DELETE FROM scans WHERE finished < ?', (time.time() - MEDIA_HISTORY_DAYS * 86400,))
+            logger.info(f"Індекс медіа: {dirs} каталогів ({rescanned} перечитано), {files} файлів за {seconds:.1f} с")
+        finally:
+            connection.close()
+        return {'id': scan_id, 'finished': time.time(), 'files': files, 'bytes': size,
+                'dirs': dirs, 'rescanned': rescanned, 'seconds': seconds}
+
+    @staticmethod
+    def _write(connection: sqlite3.Connection, changed, removed):
+        with connection:
+            for relative in removed:
+                # Піддерево: сам каталог і все, що починається з "<шлях>/" ('0' - наступний після '/')
+                subtree = (relative, relative + '/', relative + '0')
+                connection.execute('DELETE FROM files WHERE dir = ? OR (dir >= ? AND dir < ?)', subtree)
+                connection.execute('DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)', subtree)
+            for relative, mtime, subdirs, files in changed:
+                connection.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                                   (relative, mtime, '\n'.join(subdirs)))
+                connection.execute('DELETE FROM files WHERE dir = ?', (relative,))
+                connection.executemany(
+                    'INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                    [(relative, name, size, mtime, name.startswith(THUMBNAIL_PREFIX))
+                     for name, size, mtime in files])
+
+    def stats(self, count: int = MEDIA_TOP_COUNT, now: Optional[float] = None) -> Dict[str, Any]:
+        """Агрегати для /media stats з індексу"""
+        now = now or time.time()
+        connection = self._connect()
+        try:
+            totals = connection.execute(
+                'SELECT thumbnail, count(*), coalesce(sum(size), 0) FROM files GROUP BY thumbnail').fetchall()
+            by_kind = {bool(thumbnail): (files, size) for thumbnail, files, size in totals}
+            growth = {}
+            for days in (1, 7, 30):
+                growth[days] = connection.execute(
+                    'SELECT count(*), coalesce(sum(size), 0) FROM files WHERE mtime >= ?',
+                    (now - days * 86400,)).fetchone()
+            cases = [f"WHEN size < {bound} THEN {index}" if bound is not None else f"ELSE {index}"
+                     for index, (_, bound) in enumerate(MEDIA_HISTOGRAM)]
+            histogram = dict((bucket, (files, size)) for bucket, files, size in connection.execute(
+                f"SELECT CASE {' '.join(cases)} END AS bucket, count(*), sum(size) "
+                "FROM files WHERE thumbnail = 0 GROUP BY bucket"))
+            largest = connection.execute(
+                'SELECT dir, name, size, mtime FROM files ORDER BY size DESC LIMIT ?', (count,)).fetchall()
+            # Приріст за історією обходів: найстаріший обхід не раніше ніж тиждень тому
+            week_ago = connection.execute(
+                'SELECT finished, bytes FROM scans WHERE finished >= ? ORDER BY id LIMIT 1',
+                (now - 7 * 86400,)).fetchone()
+        finally:
+            connection.close()
+        return {'originals': by_kind.get(False, (0, 0)), 'thumbnails': by_kind.get(True, (0, 0)),
+                'growth': growth, 'histogram': histogram, 'largest': largest, 'week_ago': week_ago}
+
+    def retention(self, age: float, min_size: int = 0, thumbnails_only: bool = False,
+                  now: Optional[float] = None) -> Dict[str, Any]:
+        """Що видалила б політика «старше за age (і не менше min_size)», без видалення"""
+        now = now or time.time()
+        condition = 'mtime < ? AND size >= ?'
+        if thumbnails_only:
+            condition += ' AND thumbnail = 1'
+        connection = self._connect()
+        try:
+            matched = connection.execute(
+                f'SELECT count(*), coalesce(sum(size), 0), count(DISTINCT dir) FROM files WHERE {condition}',
+                (now - age, min_size)).fetchone()
+            total = connection.execute('SELECT count(*), coalesce(sum(size), 0) FROM files').fetchone()
+            # Приріст за 30 днів - щоб оцінити, на скільки вистачить звільненого місця
+            added = connection.execute('SELECT coalesce(sum(size), 0) FROM files WHERE mtime >= ?',
+                                       (now - 30 * 86400,)).fetchone()[0]
+        finally:
+            connection.close()
+        return {'files': matched[0], 'bytes': matched[1], 'media': matched[2],
+                'total_files': total[0], 'total_bytes': total[1], 'daily_growth': added / 30}
+
+
+def _media_id(directory: str) -> str:
+    """a/b/cdef... -> abcdef... (base64-хеш Dendrite, розкладений по каталогах)"""
+    return directory.replace(os.sep, '')
+
+
+def _percent(part: float, total: float) -> str:
+    return f"{part / total * 100:.1f}%" if total else '-'
+
+
+def _age(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{seconds / 86400:.0f} дн"
+    return f"{seconds / 3600:.0f} год"
+
+
+def format_scan(scan: Dict[str, Any]) -> str:
+    return (f"Індекс: {scan['dirs']} каталогів, перечитано {scan['rescanned']} за {scan['seconds']:.1f} с, "
+            f"{time.strftime('%H:%M:%S', time.localtime(scan['finished']))}")
+
+
+def format_media_stats(stats: Dict[str, Any], scan: Dict[str, Any], now: Optional[float] = None) -> str:
+    now = now or time.time()
+    originals, thumbnails = stats['originals'], stats['thumbnails']
+    total_files, total_bytes = originals[0] + thumbnails[0], originals[1] + thumbnails[1]
+    message = (f"🖼 **Медіа-сховище**: {format_size(total_bytes)}, {total_files} файлів\n"
+               f"Оригінали: {format_size(originals[1])} ({originals[0]}); мініатюри: {format_size(thumbnails[1])} "
+               f"({thumbnails[0]}), +{_percent(thumbnails[1], originals[1])} до оригіналів\n")
+    day, week, month = (stats['growth'][days] for days in (1, 7, 30))
+    message += (f"📈 Приріст: за добу {format_size(day[1])} ({day[0]}), за тиждень {format_size(week[1])}, "
+                f"за 30 днів {format_size(month[1])} (≈{format_size(month[1] / 30)}/добу)\n")
+    if stats['week_ago'] and now - stats['week_ago'][0] >= 86400:
+        finished, size = stats['week_ago']
+        delta = total_bytes - size
+        message += f"За обходами з {time.strftime('%Y-%m-%d', time.localtime(finished))}: {'+' if delta >= 0 else '-'}{format_size(abs(delta))}\n"
+
+    message += f"```\n{'РОЗМІР ОРИГІНАЛУ':<16} {'ФАЙЛІВ':>9} {'ЧАСТКА':>7} {'ОБСЯГ':>9}\n"
+    for index, (title, _) in enumerate(MEDIA_HISTOGRAM):
+        files, size = stats['histogram'].get(index, (0, 0))
+        message += f"{title:<16} {files:>9} {_percent(files, originals[0]):>7} {format_size(size):>9}\n"
+    message += "```\n"
+    if stats['largest']:
+        message += "**Найбільші файли:**\n"
+        for directory, name, size, mtime in stats['largest']:
+            kind = '' if name == 'file' else f" ({name})"
+            message += f"• `{_media_id(directory)}`{kind} - {format_size(size)}, {_age(now - mtime)} тому\n"
+    message += format_scan(scan)
+    return message
+
+
+def format_media_retention(result: Dict[str, Any], options: Dict[str, Any], scan: Dict[str, Any]) -> str:
+    policy = f"старші за {options['age_text']}"
+    if options['min_size']:
+        policy += f", від {format_size(options['min_size'])}"
+    if options['thumbnails']:
+        policy += ", лише мініатюри"
+    message = (f"🧹 **Пробний прогін політики зберігання** ({policy}) - нічого не видаляється\n"
+               f"Під політику потрапляють {result['files']} файлів ({result['media']} медіа): "
+               f"{format_size(result['bytes'])} з {format_size(result['total_bytes'])} "
+               f"({_percent(result['bytes'], result['total_bytes'])})\n"
+               f"Залишиться: {format_size(result['total_bytes'] - result['bytes'])}, "
+               f"{result['total_files'] - result['files']} файлів\n")
+    if result['daily_growth'] > 0:
+        message += (f"Звільнене місце - це ≈{result['bytes'] / result['daily_growth']:.0f} днів приросту "
+                    f"(≈{format_size(result['daily_growth'])}/добу за останні 30 днів)\n")
+    message += format_scan(scan)
+    return message
@@ -0,0 +1,122 @@
+"""
+Prometheus метрики Matrix бота
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import logging
+import os
+from typing import Callable, Dict
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Порт HTTP endpoint'у /metrics (0 вимикає)
+METRICS_PORT = int(os.getenv('MATRIX_BOT_METRICS_PORT', '9000'))
+# Період вимірювання затримки event loop (с)
+LOOP_LAG_INTERVAL = 1.0
+
+# Дії в шляхах API, що залишаються в мітці endpoint (решта - імена сервісів/бекапів)
+ENDPOINT_ACTIONS = {'start', 'stop', 'restart', 'create', 'restore', 'status', 'send', 'stream',
+                    'pull', 'recreate', 'rollback'}
+
+SYNC_LATENCY = Histogram(
+    'matrix_bot_sync_duration_seconds', 'Тривалість запиту /sync (включно з long-poll очікуванням)',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60),
+)
+SYNC_ERRORS = Counter('matrix_bot_sync_errors_total', 'Помилки синхронізації')
+
+COMMAND_LATENCY = Histogram(
+    'matrix_bot_command_duration_seconds', 'Час виконання обробника команди', ['command'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900),
+)
+COMMAND_QUEUE_WAIT = Histogram(
+    'matrix_bot_command_queue_seconds', 'Очікування команди в черзі планувальника', ['command'],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+COMMANDS_TOTAL = Counter('matrix_bot_commands_total', 'Виконані команди', ['command', 'result'])
+
+ADMIN_API_LATENCY = Histogram(
+    'matrix_bot_admin_api_duration_seconds', 'Тривалість запитів до API адмін-панелі', ['endpoint', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 120, 900),
+)
+ADMIN_API_RESPONSES = Counter(
+    'matrix_bot_admin_api_responses_total', 'Відповіді API адмін-панелі за статус-кодом', ['endpoint', 'method', 'status'],
+)
+
+ROOM_SEND_LATENCY = Histogram(
+    'matrix_bot_room_send_duration_seconds', 'Тривалість room_send', ['msgtype'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ROOM_SEND_FAILURES = Counter('matrix_bot_room_send_failures_total', 'Невдалі room_send', ['msgtype'])
+
+PROBE_LATENCY = Histogram(
+    'matrix_bot_probe_duration_seconds', 'Синтетична проба homeserver: тривалість кроку', ['step'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PROBE_FAILURES = Counter('matrix_bot_probe_failures_total', 'Невдалі кроки синтетичної проби', ['step'])
+
+EVENT_LOOP_LAG = Histogram(
+    'matrix_bot_event_loop_lag_seconds', 'Затримка event loop відносно запланованого пробудження',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_LOOP_LAG_LAST = Gauge('matrix_bot_event_loop_lag_last_seconds', 'Остання виміряна затримка event loop')
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Мітка endpoint'у з обмеженою кардинальністю: 'service/restart/dendrite' -> 'service/restart'"""
+    parts = endpoint.split('?', 1)[0].strip('/').split('/')
+    label = [parts[0]]
+    label.extend(part for part in parts[1:] if part in ENDPOINT_ACTIONS)
+    return '/'.join(label)
+
+
+class StatsCollector:
+    """Експорт лічильників, які бот уже веде сам (кеш, монітор, сповіщення, задачі)"""
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name: str, source: Callable[[], Dict[str, float]], counters=()):
+        """Джерело статистики; ключі з `counters` експортуються як Counter, решта - Gauge"""
+        self._sources[name] = (source, set(counters))
+
+    def collect(self):
+        for name, (source, counters) in self._sources.items():
+            try:
+                stats = source()
+            except Exception as e:
+                logger.error(f"Помилка збору метрик {name}: {e}")
+                continue
+            for key, value in stats.items():
+                metric_name = f"matrix_bot_{name}_{key}"
+                if key in counters:
+                    yield CounterMetricFamily(metric_name, f"{name}: {key}", value=value)
+                else:
+                    yield GaugeMetricFamily(metric_name, f"{name}: {key}", value=value)
+
+
+STATS = StatsCollector()
+REGISTRY.register(STATS)
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> bool:
+    """Запуск HTTP сервера /metrics у фоновому потоці"""
+    if port <= 0:
+        return False
+    start_http_server(port)
+    logger.info(f"Метрики Prometheus доступні на порту {port}")
+    return True
+
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL):
+    """Вимірювання затримки event loop: наскільки пізніше запланованого прокидається sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
@@ -0,0 +1,186 @@
+"""
+Черга вихідних повідомлень Matrix бота з урахуванням rate limit
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import nio
+
+from metrics import ROOM_SEND_FAILURES, ROOM_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Максимальна кількість повідомлень у черзі однієї кімнати
+OUTBOX_MAX_QUEUE = int(os.getenv('MATRIX_BOT_OUTBOX_MAX_QUEUE', '200'))
+# Скільки разів повторювати надсилання перед відмовою
+OUTBOX_MAX_RETRIES = int(os.getenv('MATRIX_BOT_OUTBOX_MAX_RETRIES', '5'))
+# Максимальна довжина об'єднаного повідомлення (ліміт події Matrix - 64 КБ)
+OUTBOX_MERGE_CHARS = int(os.getenv('MATRIX_BOT_OUTBOX_MERGE_CHARS', '16000'))
+OUTBOX_MAX_BACKOFF = 60
+# Скільки чекати доставки черги при зупинці бота (с)
+OUTBOX_DRAIN_TIMEOUT = 10
+
+# Помилки, які не мають сенсу повторювати
+PERMANENT_ERRORS = {'M_FORBIDDEN', 'M_NOT_FOUND', 'M_BAD_JSON', 'M_NOT_JSON', 'M_TOO_LARGE', 'M_UNKNOWN_TOKEN'}
+
+
+class OutboundMessage:
+    """Повідомлення в черзі; future отримує event_id (або None при відмові)"""
+
+    def __init__(self, room_id: str, content: Dict[str, Any], future: asyncio.Future, merge: bool = True):
+        self.room_id = room_id
+        self.content = content
+        self.future = future
+        self.merge = merge
+
+    @property
+    def mergeable(self) -> bool:
+        # Повідомлення, яке потім редагуватимуть, має бути окремою подією: правка (m.replace)
+        # об'єднаної події затерла б відповіді інших команд
+        return self.merge and self.content.get('msgtype') == 'm.text' and set(self.content) == {'msgtype', 'body'}
+
+
+class Outbox:
+    """
+    Черга повідомлень на кожну кімнату з окремим обробником.
+
+    Послідовні текстові повідомлення в одну кімнату об'єднуються в одну подію,
+    M_LIMIT_EXCEEDED чекає `retry_after_ms`, інші збої повторюються з
+    експоненційною паузою. При зупинці черга доставляється до кінця.
+    """
+
+    def __init__(self, send: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+                 max_queue: int = OUTBOX_MAX_QUEUE):
+        self.send = send
+        self.max_queue = max_queue
+        self._queues: Dict[str, Deque[OutboundMessage]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._closing = False
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    def enqueue(self, room_id: str, content: Dict[str, Any], mergeable: bool = True) -> asyncio.Future:
+        """Постановка повідомлення в чергу кімнати; mergeable=False - завжди окрема подія"""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(room_id, deque())
+        if self._closing or len(queue) >= self.max_queue:
+            self.dropped += 1
+            reason = "бот зупиняється" if self._closing else "черга переповнена"
+            logger.error(f"Повідомлення в {room_id} відкинуто: {reason}")
+            future.set_result(None)
+            return future
+
+        queue.append(OutboundMessage(room_id, content, future, mergeable))
+        worker = self._workers.get(room_id)
+        if worker is None or worker.done():
+            self._workers[room_id] = asyncio.create_task(self._worker(room_id), name=f"outbox-{room_id}")
+        return future
+
+    def depth(self) -> int:
+        """Загальна кількість повідомлень у чергах"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self.depth(),
+            'sent': self.sent,
+            'merged': self.merged,
+            'dropped': self.dropped,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+        }
+
+    async def close(self, timeout: float = OUTBOX_DRAIN_TIMEOUT):
+        """Доставка залишку черг при зупинці; що не встигло - відкидається"""
+        self._closing = True
+        workers = [w for w in self._workers.values() if not w.done()]
+        if workers:
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+            for worker in pending:
+                worker.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        for queue in self._queues.values():
+            while queue:
+                message = queue.popleft()
+                self.dropped += 1
+                if not message.future.done():
+                    message.future.set_result(None)
+
+    async def _worker(self, room_id: str):
+        queue = self._queues[room_id]
+        while queue:
+            batch = self._take_batch(queue)
+            await self._deliver(room_id, batch)
+
+    def _take_batch(self, queue: Deque[OutboundMessage]) -> List[OutboundMessage]:
+        batch = [queue.popleft()]
+        if not batch[0].mergeable:
+            return batch
+        size = len(batch[0].content['body'])
+        while queue and queue[0].mergeable and size + 2 + len(queue[0].content['body']) <= OUTBOX_MERGE_CHARS:
+            message = queue.popleft()
+            size += 2 + len(message.content['body'])
+            batch.append(message)
+        self.merged += len(batch) - 1
+        return batch
+
+    async def _deliver(self, room_id: str, batch: List[OutboundMessage]):
+        if len(batch) == 1:
+            content = batch[0].content
+        else:
+            content = {'msgtype': 'm.text', 'body': '\n\n'.join(m.content['body'] for m in batch)}
+        msgtype = content.get('msgtype', 'unknown')
+
+        attempt = 0
+        delay = 1
+        while True:
+            error: Optional[str] = None
+            response = None
+            try:
+                with ROOM_SEND_LATENCY.labels(msgtype).time():
+                    response = await self.send(room_id, content)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e)
+
+            if response is not None and not isinstance(response, nio.ErrorResponse):
+                self.sent += 1
+                self._resolve(batch, getattr(response, 'event_id', None))
+                return
+
+            ROOM_SEND_FAILURES.labels(msgtype).inc()
+            errcode = getattr(response, 'status_code', None)
+            error = error or getattr(response, 'message', None) or 'Невідома помилка'
+            attempt += 1
+            if errcode in PERMANENT_ERRORS or attempt > OUTBOX_MAX_RETRIES:
+                self.dropped += len(batch)
+                logger.error(f"Повідомлення в {room_id} не доставлено після {attempt} спроб: {error}")
+                self._resolve(batch, None)
+                return
+
+            self.retries += 1
+            retry_after_ms = getattr(response, 'retry_after_ms', None)
+            if errcode == 'M_LIMIT_EXCEEDED' or retry_after_ms:
+                self.rate_limited += 1
+                wait = (retry_after_ms or delay * 1000) / 1000
+            else:
+                wait = delay
+            delay = min(delay * 2, OUTBOX_MAX_BACKOFF)
+            logger.warning(f"Помилка надсилання в {room_id} ({error}), повтор через {wait:.1f} с")
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _resolve(batch: List[OutboundMessage], event_id: Optional[str]):
+        for message in batch:
+            if not message.future.done():
+                message.future.set_result(event_id)
@@ -0,0 +1,289 @@
+"""
+Синтетична проба затримок homeserver: відправка, ехо в sync, медіа та /versions
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import nio
+
+from admin_api import parse_ttls
+from alerts import AlertManager
+from metrics import PROBE_FAILURES, PROBE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Кімната для маркерних подій (порожньо - проба вимкнена); краще окрема, без людей
+PROBE_ROOM_ID = os.getenv('MATRIX_BOT_PROBE_ROOM_ID', '')
+# Період проби та таймаут одного кроку (с)
+PROBE_INTERVAL = float(os.getenv('MATRIX_BOT_PROBE_INTERVAL', '60'))
+PROBE_TIMEOUT = float(os.getenv('MATRIX_BOT_PROBE_TIMEOUT', '30'))
+# Вікно, за яке рахуються перцентилі (с)
+PROBE_WINDOW = float(os.getenv('MATRIX_BOT_PROBE_WINDOW', '3600'))
+# Розмір тестового файлу для завантаження медіа (байти)
+PROBE_MEDIA_BYTES = int(os.getenv('MATRIX_BOT_PROBE_MEDIA_BYTES', '65536'))
+# Пороги p95 для тривоги (с); тривога лише за достатньої кількості вимірів
+PROBE_P95_THRESHOLDS = parse_ttls(os.getenv('MATRIX_BOT_PROBE_P95_THRESHOLDS', ''), {
+    'versions': 0.5,
+    'send': 1.0,
+    'echo': 2.0,
+    'upload': 2.0,
+    'download': 2.0,
+})
+PROBE_MIN_SAMPLES = 5
+PROBE_MAX_SAMPLES = 10000
+
+# Поле вмісту маркерної події, за яким бот впізнає власне ехо в sync
+PROBE_FIELD = 'matrix_admin_bot.probe'
+
+PROBE_STEPS = {
+    'versions': '/versions',
+    'send': 'room_send',
+    'echo': 'ехо в sync',
+    'upload': 'медіа upload',
+    'download': 'медіа download',
+}
+
+
+class RollingPercentiles:
+    """Виміри за останні `window` секунд; перцентилі за найближчим рангом"""
+
+    def __init__(self, window: float = PROBE_WINDOW, max_samples: int = PROBE_MAX_SAMPLES):
+        self.window = window
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+        self.failures: Deque[float] = deque(maxlen=max_samples)
+        self.last: Optional[float] = None
+
+    def add(self, value: float, now: Optional[float] = None):
+        self.samples.append((now or time.time(), value))
+        self.last = value
+
+    def add_failure(self, now: Optional[float] = None):
+        self.failures.append(now or time.time())
+        self.last = None
+
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        while self.failures and self.failures[0] < cutoff:
+            self.failures.popleft()
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """count, errors, p50, p95, p99, max за вікно"""
+        self._trim(now or time.time())
+        values = sorted(value for _, value in self.samples)
+        result: Dict[str, Optional[float]] = {'count': len(values), 'errors': len(self.failures)}
+        for name, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            result[name] = values[min(len(values) - 1, int(q * len(values)))] if values else None
+        result['max'] = values[-1] if values else None
+        return result
+
+
+class LatencyProbe:
+    """
+    Періодична проба того, що бачать користувачі: скільки триває відповідь
+    /_matrix/client/versions, підтвердження room_send маркерної події, поява
+    цієї події у власному sync бота та завантаження/скачування медіа.
+
+    Виміри зберігаються у ковзному вікні (перцентилі для /latency) та в
+    Prometheus; перевищення порогу p95 іде в AlertManager як стан
+    `latency/<крок>` з тим самим гістерезисом, що й здоров'я сервісів.
+    """
+
+    def __init__(self, get_client: Callable[[], Optional[nio.AsyncClient]], alerts: AlertManager,
+                 room_id: str = PROBE_ROOM_ID, interval: float = PROBE_INTERVAL,
+                 timeout: float = PROBE_TIMEOUT):
+        self.get_client = get_client
+        self.alerts = alerts
+        self.room_id = room_id
+        self.interval = interval
+        self.timeout = timeout
+        self.stats = {step: RollingPercentiles() for step in PROBE_STEPS}
+        self.probes = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.room_id)
+
+    async def on_event(self, room, event):
+        """Callback sync для m.notice: ехо маркерної події"""
+        if room.room_id != self.room_id:
+            return
+        marker = event.source.get('content', {}).get(PROBE_FIELD)
+        future = self._pending.get(marker.get('id')) if isinstance(marker, dict) else None
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def run(self):
+        """Фонова проба кожні `interval` секунд"""
+        client = self.get_client()
+        if client is not None:
+            # Вхід у кімнату проби (ідемпотентний; бот сам запрошень не приймає)
+            response = await client.join(self.room_id)
+            if isinstance(response, nio.JoinError):
+                logger.warning(f"Не вдалося увійти в кімнату проби {self.room_id}: {response.message}")
+        while True:
+            try:
+                await self.probe_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Помилка проби затримок: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def probe_once(self) -> Dict[str, Optional[float]]:
+        """Один прохід усіх кроків; повертає тривалість кожного (None - збій)"""
+        async with self._lock:
+            client = self.get_client()
+            if client is None:
+                return {}
+            results = {'versions': await self._step('versions', self._versions(client))}
+            send, echo = await self._send_and_echo(client)
+            results['send'], results['echo'] = send, echo
+            upload_time, content_uri = await self._upload(client)
+            results['upload'] = upload_time
+            if content_uri:
+                results['download'] = await self._step('download', self._download(client, content_uri))
+            else:
+                results['download'] = self._fail('download', 'немає файлу після невдалого upload')
+            self.probes += 1
+            await self.evaluate()
+            return results
+
+    async def _step(self, step: str, operation) -> Optional[float]:
+        """Тривалість кроку з таймаутом; результат записується у статистику"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(operation, self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._fail(step, str(e) or type(e).__name__)
+        return self._record(step, time.perf_counter() - started)
+
+    def _record(self, step: str, elapsed: float) -> float:
+        self.stats[step].add(elapsed)
+        PROBE_LATENCY.labels(step).observe(elapsed)
+        return elapsed
+
+    def _fail(self, step: str, error: str) -> None:
+        logger.warning(f"Проба {step}: {error}")
+        self.stats[step].add_failure()
+        PROBE_FAILURES.labels(step).inc()
+        return None
+
+    @staticmethod
+    async def _versions(client: nio.AsyncClient):
+        response = await client.send('GET', '/_matrix/client/versions')
+        try:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            await response.read()
+        finally:
+            response.release()
+
+    async def _send_and_echo(self, client: nio.AsyncClient) -> Tuple[Optional[float], Optional[float]]:
+        """Маркерна подія: час підтвердження сервером і час до появи в sync бота"""
+        probe_id = uuid.uuid4().hex
+        echo = asyncio.get_running_loop().create_future()
+        self._pending[probe_id] = echo
+        content = {
+            'msgtype': 'm.notice',
+            'body': f"⏱ latency probe {probe_id[:8]}",
+            PROBE_FIELD: {'id': probe_id, 'ts': int(time.time() * 1000)},
+        }
+        try:
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(client.room_send(self.room_id, 'm.room.message', content), self.timeout)
+            except asyncio.TimeoutError:
+                return self._fail('send', 'таймаут'), self._fail('echo', 'подію не надіслано')
+            if isinstance(response, nio.ErrorResponse):
+                return self._fail('send', response.message), self._fail('echo', 'подію не надіслано')
+            send = self._record('send', time.perf_counter() - started)
+            try:
+                # Ехо могло прийти ще до відповіді room_send - future вже виконано
+                arrived = await asyncio.wait_for(echo, self.timeout)
+            except asyncio.TimeoutError:
+                return send, self._fail('echo', f"подія не з'явилась у sync за {self.timeout:.0f} с")
+            return send, self._record('echo', arrived - started)
+        finally:
+            self._pending.pop(probe_id, None)
+
+    async def _upload(self, client: nio.AsyncClient) -> Tuple[Optional[float], Optional[str]]:
+        payload = os.urandom(PROBE_MEDIA_BYTES)
+        started = time.perf_counter()
+        try:
+            response, _ = await asyncio.wait_for(
+                client.upload(io.BytesIO(payload), content_type='application/octet-stream',
+                              filename='latency-probe.bin', filesize=len(payload)),
+                self.timeout)
+        except asyncio.TimeoutError:
+            return self._fail('upload', 'таймаут'), None
+        if isinstance(response, nio.UploadError):
+            return self._fail('upload', response.message), None
+        return self._record('upload', time.perf_counter() - started), response.content_uri
+
+    @staticmethod
+    async def _download(client: nio.AsyncClient, content_uri: str):
+        response = await client.download(mxc=content_uri)
+        if isinstance(response, nio.DownloadError):
+            raise RuntimeError(response.message)
+        if len(response.body) != PROBE_MEDIA_BYTES:
+            raise RuntimeError(f"отримано {len(response.body)} байт замість {PROBE_MEDIA_BYTES}")
+
+    async def evaluate(self):
+        """Порівняння p95 з порогами; стан кожного кроку передається в AlertManager"""
+        for step in PROBE_STEPS:
+            summary = self.stats[step].summary()
+            threshold = PROBE_P95_THRESHOLDS.get(step)
+            if threshold is None or summary['count'] < PROBE_MIN_SAMPLES:
+                continue
+            slow = summary['p95'] > threshold
+            status = (f"p95 {summary['p95'] * 1000:.0f} мс "
+                      f"{'>' if slow else '<='} поріг {threshold * 1000:.0f} мс")
+            if self.stats[step].last is None:
+                # Останній вимір - збій (таймаут): теж привід для тривоги
+                slow, status = True, f"збій останньої проби, {status}"
+            await self.alerts.observe(f"latency/{step}", not slow, status)
+
+
+def _ms(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value * 1000:.0f}"
+
+
+def format_latency(probe: LatencyProbe, results: Optional[Dict[str, Optional[float]]] = None) -> str:
+    """Таблиця перцентилів за вікно (і результат щойно виконаної проби)"""
+    if not probe.enabled:
+        return ("⏱ Проба затримок вимкнена: вкажіть окрему кімнату в `MATRIX_BOT_PROBE_ROOM_ID` "
+                "та запросіть у неї бота")
+    message = (f"⏱ **Затримки homeserver** (вікно {PROBE_WINDOW / 60:.0f} хв, "
+               f"проба кожні {probe.interval:.0f} с, мс)\n```\n")
+    message += f"{'КРОК':<15} {'p50':>6} {'p95':>6} {'p99':>6} {'макс':>6} {'поріг':>6} {'вимірів':>8} {'збоїв':>6}"
+    if results is not None:
+        message += f" {'зараз':>6}"
+    message += "\n"
+    lines: List[str] = []
+    for step, title in PROBE_STEPS.items():
+        s = probe.stats[step].summary()
+        threshold = PROBE_P95_THRESHOLDS.get(step)
+        line = (f"{title:<15} {_ms(s['p50']):>6} {_ms(s['p95']):>6} {_ms(s['p99']):>6} {_ms(s['max']):>6} "
+                f"{_ms(threshold):>6} {s['count']:>8} {s['errors']:>6}")
+        if results is not None:
+            line += f" {_ms(results.get(step)) if results.get(step) is not None else 'збій':>6}"
+        lines.append(line)
+    message += '\n'.join(lines) + "\n```"
+    slow = [PROBE_STEPS.get(name.split('/', 1)[1], name) for name in probe.alerts.firing() if name.startswith('latency/')]
+    if slow:
+        message += f"\n🔴 Перевищено поріг p95: {', '.join(slow)}"
+    return message
@@ -0,0 +1,243 @@
+"""
+Поетапне оновлення сервісів: паралельне завантаження образів,
+перестворення за рівнями залежностей з перевіркою здоров'я та відкатом
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from admin_api import AdminApiClient, AdminApiError
+from fanout import ServiceFanout, order_tiers
+from formatting import format_size
+
+logger = logging.getLogger(__name__)
+
+# Скільки образів завантажувати одночасно
+UPDATE_PULL_CONCURRENCY = int(os.getenv('MATRIX_BOT_UPDATE_PULL_CONCURRENCY', '3'))
+# Як часто надсилати прогрес завантаження в кімнату (с)
+UPDATE_PROGRESS_INTERVAL = float(os.getenv('MATRIX_BOT_UPDATE_PROGRESS_INTERVAL', '15'))
+# Скільки секунд сервіс має лишатися здоровим після перестворення (ловить цикли падінь)
+UPDATE_SETTLE_SECONDS = float(os.getenv('MATRIX_BOT_UPDATE_SETTLE_SECONDS', '15'))
+# Адмін-панель надсилає прогрес щосекунди; без даних довше - завантаження вважається зависшим
+UPDATE_PULL_READ_TIMEOUT = 300
+
+# Сервіси, що самі виконують оновлення: образ завантажується, а перестворення - лише через /update all
+SELF_MANAGED_SERVICES = ('admin-panel', 'matrix-bot')
+
+# Стани оновлення сервісу
+PENDING = 'pending'
+UNCHANGED = 'unchanged'
+PULLED = 'pulled'
+UPDATED = 'updated'
+FAILED = 'failed'
+ROLLED_BACK = 'rolled_back'
+
+
+class ServiceUpdate:
+    """Оновлення одного сервісу"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = PENDING
+        self.image: Optional[str] = None
+        self.image_id: Optional[str] = None
+        self.previous_image_id: Optional[str] = None
+        self.changed = False
+        self.current = 0
+        self.total = 0
+        self.pull_time = 0.0
+        self.downtime = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def recreated(self) -> bool:
+        return self.state in (UPDATED, FAILED) and self.downtime > 0
+
+
+class RollingUpdate:
+    """
+    Оновлення без одночасного простою всіх сервісів.
+
+    Образи завантажуються паралельно з прогресом у кімнату. Перестворюються
+    лише сервіси зі зміненим образом - рівень за рівнем залежностей
+    (postgres/redis -> dendrite -> мости). Наступний рівень стартує, коли
+    попередній здоровий за /api/health; якщо рівень не став здоровим,
+    уже оновлені сервіси повертаються на попередні образи у зворотному порядку.
+    """
+
+    def __init__(self, admin_api: AdminApiClient, fanout: ServiceFanout,
+                 report: Callable[[str], Awaitable[None]],
+                 pull_concurrency: int = UPDATE_PULL_CONCURRENCY,
+                 settle_seconds: float = UPDATE_SETTLE_SECONDS,
+                 progress_interval: float = UPDATE_PROGRESS_INTERVAL):
+        self.admin_api = admin_api
+        self.fanout = fanout
+        self.report = report
+        self.pull_concurrency = pull_concurrency
+        self.settle_seconds = settle_seconds
+        self.progress_interval = progress_interval
+        self.rolled_back = False
+
+    async def run(self, names: List[str]) -> List[ServiceUpdate]:
+        """Повне поетапне оновлення; повертає стан кожного сервісу"""
+        updates = {name: ServiceUpdate(name) for name in names}
+        await self.pull_all(list(updates.values()))
+
+        changed = [u.name for u in updates.values()
+                   if u.state == PULLED and u.changed and u.name not in SELF_MANAGED_SERVICES]
+        tiers = order_tiers(changed)
+        semaphore = asyncio.Semaphore(self.fanout.concurrency)
+        done: List[List[ServiceUpdate]] = []
+        for level, tier in enumerate(tiers, 1):
+            await self.report(f"🔁 Рівень {level}/{len(tiers)}: {', '.join(tier)}")
+            batch = [updates[name] for name in tier]
+            await asyncio.gather(*(self._recreate(semaphore, u) for u in batch))
+            done.append(batch)
+            failed = [u for u in batch if u.state == FAILED]
+            if failed:
+                await self.report("⚠️ Рівень не став здоровим (" + ', '.join(u.name for u in failed) + "), відкат...")
+                await self.rollback(done)
+                break
+        return list(updates.values())
+
+    async def pull_all(self, updates: List[ServiceUpdate]):
+        """Паралельне завантаження образів з періодичним звітом про прогрес"""
+        semaphore = asyncio.Semaphore(self.pull_concurrency)
+        reporter = asyncio.create_task(self._report_progress(updates))
+        try:
+            await asyncio.gather(*(self._pull(semaphore, u) for u in updates))
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+    async def _pull(self, semaphore: asyncio.Semaphore, update: ServiceUpdate):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async for line in self.admin_api.stream_lines(f"update/pull/{update.name}", method='POST',
+                                                              read_timeout=UPDATE_PULL_READ_TIMEOUT):
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    update.image = event.get('image', update.image)
+                    update.current = event.get('current', update.current)
+                    update.total = event.get('total', update.total)
+                    if event.get('type') == 'done':
+                        if not event.get('success'):
+                            raise AdminApiError(event.get('error', 'Невідома помилка'))
+                        update.changed = bool(event.get('changed'))
+                        update.image_id = event.get('image_id')
+                        update.previous_image_id = event.get('previous_image_id')
+                        update.state = PULLED if update.changed else UNCHANGED
+                if update.state == PENDING:
+                    raise AdminApiError("потік завантаження обірвано")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                update.state = FAILED
+                update.error = f"завантаження: {e}"
+                logger.error(f"Помилка завантаження образу {update.name}: {e}")
+            update.pull_time = time.perf_counter() - started
+
+    async def _report_progress(self, updates: List[ServiceUpdate]):
+        last = None
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            message = format_pull_progress(updates)
+            if message != last:
+                await self.report(message)
+                last = message
+
+    async def _recreate(self, semaphore: asyncio.Semaphore, update: ServiceUpdate):
+        """Перестворення сервісу та очікування стабільно здорового стану"""
+        async with semaphore:
+            started = time.perf_counter()
+            response = await self.admin_api.request(f"update/recreate/{update.name}", 'POST')
+            if not response.get('success'):
+                update.state = FAILED
+                update.error = response.get('error', 'Невідома помилка')
+            elif not await self.fanout.wait_for_state(update.name, True):
+                update.state = FAILED
+                update.error = f"не став здоровим за {self.fanout.health_timeout:.0f} с"
+            update.downtime = time.perf_counter() - started
+            if update.state == FAILED:
+                return
+
+            # Контейнер у циклі перезапусків встигає побути "running" - перевіряємо ще раз
+            await asyncio.sleep(self.settle_seconds)
+            if await self.is_healthy(update.name):
+                update.state = UPDATED
+            else:
+                update.state = FAILED
+                update.error = f"впав протягом {self.settle_seconds:.0f} с після запуску"
+
+    async def is_healthy(self, name: str) -> bool:
+        """Поточний стан сервісу за /api/health (без кешу)"""
+        response = await self.admin_api.request('health', use_cache=False)
+        return any(item.get('name') == name and item.get('healthy') for item in response.get('health', []))
+
+    async def rollback(self, tiers: List[List[ServiceUpdate]]):
+        """Повернення перестворених сервісів на попередні образи, від залежних до базових"""
+        self.rolled_back = True
+        for tier in reversed(tiers):
+            await asyncio.gather(*(self._rollback_one(u) for u in tier if u.recreated and u.previous_image_id))
+
+    async def _rollback_one(self, update: ServiceUpdate):
+        response = await self.admin_api.request(f"update/rollback/{update.name}", 'POST',
+                                                {'image_id': update.previous_image_id})
+        if not response.get('success'):
+            update.error = f"{update.error or 'відкат'}; відкат не вдався: {response.get('error', 'Невідома помилка')}"
+            return
+        healthy = await self.fanout.wait_for_state(update.name, True)
+        update.state = ROLLED_BACK
+        if not healthy:
+            update.error = f"{update.error or 'відкат'}; після відкату сервіс нездоровий"
+
+
+def format_pull_progress(updates: List[ServiceUpdate]) -> str:
+    """Поточний прогрес завантаження образів"""
+    finished = sum(1 for u in updates if u.state != PENDING)
+    current = sum(u.current for u in updates)
+    total = sum(u.total for u in updates)
+    message = f"⬇️ Завантаження образів: {finished}/{len(updates)}"
+    if total:
+        message += f", {format_size(current)} з {format_size(total)}"
+    active = [u for u in updates if u.state == PENDING and u.total]
+    for u in active:
+        message += f"\n  {u.name}: {format_size(u.current)} / {format_size(u.total)}"
+    return message
+
+
+def format_update_results(updates: List[ServiceUpdate], rolled_back: bool, elapsed: float) -> str:
+    """Зведений звіт оновлення з простоєм кожного сервісу"""
+    updated = [u for u in updates if u.state == UPDATED]
+    problems = [u for u in updates if u.state in (FAILED, ROLLED_BACK)]
+    if rolled_back:
+        message = f"↩️ **Оновлення скасовано, виконано відкат** ({elapsed:.0f} с)\n\n"
+    elif problems:
+        message = f"⚠️ **Оновлення завершено з помилками** ({elapsed:.0f} с)\n\n"
+    else:
+        message = f"✅ **Оновлення завершено** ({elapsed:.0f} с)\n\n"
+
+    for u in updates:
+        if u.state == UPDATED:
+            message += f"🟢 **{u.name}** - оновлено, простій {u.downtime:.1f} с\n"
+        elif u.state == ROLLED_BACK:
+            message += f"↩️ **{u.name}** - повернуто на попередній образ ({u.error or 'відкат рівня'})\n"
+        elif u.state == FAILED:
+            message += f"🔴 **{u.name}** - {u.error}\n"
+        elif u.state == PULLED and u.name in SELF_MANAGED_SERVICES:
+            message += f"🟡 **{u.name}** - новий образ завантажено, застосується через `/update all`\n"
+        elif u.state == PULLED:
+            message += f"⏸ **{u.name}** - новий образ завантажено, не перестворено\n"
+    unchanged = [u.name for u in updates if u.state == UNCHANGED]
+    if unchanged:
+        message += f"⚪ Без змін: {', '.join(unchanged)}\n"
+    if updated:
+        message += f"\nНайдовший простій: {max(u.downtime for u in updated):.1f} с"
+    return message
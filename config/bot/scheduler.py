@@ -0,0 +1,180 @@
+"""
+Планувальник команд Matrix бота: виконання обробників як asyncio задач
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import COMMAND_LATENCY, COMMAND_QUEUE_WAIT, COMMANDS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Максимальна кількість одночасних змінюючих команд
+MAX_WORKERS = int(os.getenv('MATRIX_BOT_MAX_WORKERS', '4'))
+# Окремий пул для команд читання (серед них довгі: /logs follow, /top --watch, /errors, /media)
+MAX_READERS = int(os.getenv('MATRIX_BOT_MAX_READERS', '8'))
+
+
+class Job:
+    """Команда, що виконується або очікує в черзі"""
+
+    def __init__(self, job_id: int, command: str, args: List[str], room_id: str,
+                 sender: str, lock_keys: Optional[List[str]], pooled: bool = True):
+        self.id = job_id
+        self.command = command
+        self.args = args
+        self.room_id = room_id
+        self.sender = sender
+        self.lock_keys = lock_keys
+        self.pooled = pooled
+        self.status = 'queued'
+        self.created = time.monotonic()
+        self.started: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def read_only(self) -> bool:
+        return self.lock_keys is None
+
+    @property
+    def title(self) -> str:
+        return ' '.join([self.command] + self.args)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - (self.started or self.created)
+
+
+class CommandScheduler:
+    """
+    Запускає обробники команд як задачі.
+
+    Команди лише для читання (lock_keys=None) займають слот окремого пулу
+    читання, службові (pooled=False: /jobs, /cancel) виконуються одразу.
+    Змінюючі команди спершу захоплюють блокування за своїми ключами
+    (наприклад 'service:dendrite' або 'room:!id'), а вже потім слот пулу:
+    черга до одного сервісу не займає слоти, потрібні іншим командам.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_readers: int = MAX_READERS):
+        self.max_workers = max_workers
+        self.max_readers = max_readers
+        self.jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._workers = asyncio.Semaphore(max_workers)
+        self._readers = asyncio.Semaphore(max_readers)
+        # Блокування існує, поки його тримає або чекає хоча б одна задача
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+
+    def submit(self, command: str, args: List[str], room_id: str, sender: str,
+               handler: Callable[[], Awaitable[None]],
+               on_error: Callable[[Job, BaseException], Awaitable[None]],
+               lock_keys: Optional[List[str]] = None, pooled: bool = True) -> Job:
+        """Постановка команди на виконання; повертає Job"""
+        job = Job(next(self._ids), command, args, room_id, sender, lock_keys, pooled)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, handler, on_error), name=f"job-{job.id}")
+        return job
+
+    async def _run(self, job: Job, handler, on_error):
+        try:
+            if not job.pooled:
+                await self._execute(job, handler)
+            elif job.read_only:
+                async with self._readers:
+                    await self._execute(job, handler)
+            else:
+                keys = sorted(set(job.lock_keys))
+                await self._acquire_all(keys)
+                try:
+                    async with self._workers:
+                        await self._execute(job, handler)
+                finally:
+                    for key in keys:
+                        self._release(key)
+            COMMANDS_TOTAL.labels(job.command, 'ok').inc()
+        except asyncio.CancelledError as e:
+            job.status = 'cancelled'
+            COMMANDS_TOTAL.labels(job.command, 'cancelled').inc()
+            await on_error(job, e)
+        except Exception as e:
+            job.status = 'failed'
+            COMMANDS_TOTAL.labels(job.command, 'failed').inc()
+            logger.error(f"Помилка виконання {job.title}: {e}")
+            await on_error(job, e)
+        finally:
+            self.jobs.pop(job.id, None)
+
+    @staticmethod
+    async def _execute(job: Job, handler):
+        job.status = 'running'
+        job.started = time.monotonic()
+        COMMAND_QUEUE_WAIT.labels(job.command).observe(job.started - job.created)
+        with COMMAND_LATENCY.labels(job.command).time():
+            await handler()
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        """Блокування за ключем; викликач стає його користувачем до _unref"""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        return lock
+
+    def _unref(self, key: str):
+        """Останній користувач пішов - блокування видаляється, словник не росте"""
+        self._lock_users[key] -= 1
+        if not self._lock_users[key]:
+            del self._lock_users[key]
+            del self._locks[key]
+
+    def _release(self, key: str):
+        self._locks[key].release()
+        self._unref(key)
+
+    async def _acquire_all(self, keys: List[str]):
+        """Захоплення блокувань у фіксованому порядку (без взаємних блокувань)"""
+        acquired = []
+        try:
+            for key in keys:
+                lock = self._lock(key)
+                try:
+                    await lock.acquire()
+                except BaseException:
+                    self._unref(key)
+                    raise
+                acquired.append(key)
+        except BaseException:
+            for key in acquired:
+                self._release(key)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Кількість задач за станом"""
+        running = sum(1 for job in self.jobs.values() if job.status == 'running')
+        return {'jobs_running': running, 'jobs_queued': len(self.jobs) - running}
+
+    def active(self) -> List[Job]:
+        """Активні задачі, від найстаріших"""
+        return sorted(self.jobs.values(), key=lambda j: j.id)
+
+    def cancel(self, job_id: int) -> bool:
+        """Скасування задачі за ID"""
+        job = self.jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def shutdown(self):
+        """Скасування всіх задач при зупинці бота"""
+        tasks = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
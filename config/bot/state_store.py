@@ -0,0 +1,58 @@
+"""
+Збереження стану Matrix бота на диск (атомарний запис JSON)
+Автор: Matrix Setup Team
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Директорія для стану бота (монтується як volume у docker-compose)
+STATE_DIR = os.getenv('MATRIX_BOT_STATE_DIR', '/app/data')
+
+
+class StateFile:
+    """JSON-файл стану з атомарним записом через тимчасовий файл та os.replace"""
+
+    def __init__(self, filename: str, state_dir: str = STATE_DIR):
+        self.path = os.path.join(state_dir, filename)
+
+    def load(self) -> Dict[str, Any]:
+        """Читання стану; при відсутності чи пошкодженні файлу повертає {}"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не вдалося прочитати стан {self.path}: {e}")
+            return {}
+
+    def save(self, data: Dict[str, Any]):
+        """Атомарний запис стану"""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def update(self, **values):
+        """Оновлення окремих ключів стану"""
+        data = self.load()
+        data.update(values)
+        self.save(data)
@@ -0,0 +1,185 @@
+"""
+/top: вибірка ресурсів усіх контейнерів і рейтинг за CPU, пам'яттю, мережею та диском
+Автор: Matrix Setup Team
+"""
+
+import heapq
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from admin_api import AdminApiClient, AdminApiError
+from formatting import format_size
+
+# Проміжок між двома знімками лічильників для разової вибірки (с)
+TOP_SAMPLE_INTERVAL = float(os.getenv('MATRIX_BOT_TOP_SAMPLE_INTERVAL', '2'))
+# Режим --watch: як часто редагувати повідомлення та скільки всього спостерігати (с)
+TOP_WATCH_INTERVAL = float(os.getenv('MATRIX_BOT_TOP_WATCH_INTERVAL', '10'))
+TOP_WATCH_DURATION = float(os.getenv('MATRIX_BOT_TOP_WATCH_DURATION', '300'))
+# Скільки невдалих вимірів поспіль (збій, ліміт запитів адмін-панелі) зупиняють --watch
+TOP_WATCH_MAX_FAILURES = 3
+TOP_DEFAULT_COUNT = 5
+
+TOP_SORTS = {
+    'cpu': 'CPU',
+    'mem': "пам'яттю",
+    'net': 'мережею',
+    'io': 'диском',
+}
+
+TOP_MEMORY_HEADER = "ПАМ'ЯТЬ"
+
+TOP_USAGE = "❌ Використання: `/top [n] [--sort cpu|mem|net|io] [--watch]`"
+
+# Нульовий час Docker для контейнера, що зупинився між запитами
+DOCKER_ZERO_TIME = '0001-01-01T00:00:00Z'
+
+
+def parse_top_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /top; ValueError з поясненням при помилці"""
+    options = {'count': TOP_DEFAULT_COUNT, 'sort': 'cpu', 'watch': False}
+    rest = list(args)
+    while rest:
+        arg = rest.pop(0)
+        if arg == '--sort':
+            if not rest or rest[0] not in TOP_SORTS:
+                raise ValueError(TOP_USAGE)
+            options['sort'] = rest.pop(0)
+        elif arg in ('--watch', 'watch'):
+            options['watch'] = True
+        elif arg.isdigit() and int(arg) > 0:
+            options['count'] = int(arg)
+        else:
+            raise ValueError(TOP_USAGE)
+    return options
+
+
+def parse_read_time(value: Optional[str]) -> Optional[float]:
+    """Час знімка Docker (RFC 3339 з наносекундами) -> unix час"""
+    if not value or value == DOCKER_ZERO_TIME:
+        return None
+    stamp, _, fraction = value.rstrip('Z').partition('.')
+    try:
+        seconds = datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+    return seconds + float(f"0.{re.match(r'[0-9]*', fraction).group() or 0}")
+
+
+class ContainerRates:
+    """Використання ресурсів контейнером між двома знімками"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cpu: Optional[float] = None
+        self.memory = 0
+        self.memory_limit = 0
+        self.net_rx: Optional[float] = None
+        self.net_tx: Optional[float] = None
+        self.blk_read: Optional[float] = None
+        self.blk_write: Optional[float] = None
+
+    def sort_value(self, key: str) -> float:
+        if key == 'mem':
+            return self.memory
+        if key == 'net':
+            return (self.net_rx or 0) + (self.net_tx or 0)
+        if key == 'io':
+            return (self.blk_read or 0) + (self.blk_write or 0)
+        return self.cpu if self.cpu is not None else -1
+
+
+def _rate(previous: Dict[str, Any], current: Dict[str, Any], key: str, elapsed: float) -> Optional[float]:
+    delta = current.get(key, 0) - previous.get(key, 0)
+    # Лічильники обнуляються при перезапуску контейнера - такий інтервал не рахуємо
+    if delta < 0 or elapsed <= 0:
+        return None
+    return delta / elapsed
+
+
+def compute_rates(previous: Tuple[float, Dict[str, Dict[str, Any]]],
+                  current: Tuple[float, Dict[str, Dict[str, Any]]]) -> List[ContainerRates]:
+    """
+    Різниця двох знімків (час, {ім'я: лічильники}). CPU% рахується як у docker stats:
+    частка приросту часу CPU контейнера від приросту системного часу CPU, помножена
+    на кількість ядер. Для швидкостей береться час знімків самого Docker, якщо він є.
+    """
+    previous_at, previous_stats = previous
+    current_at, current_stats = current
+    rates = []
+    for name, stats in current_stats.items():
+        item = ContainerRates(name)
+        item.memory = stats.get('memory_usage', 0)
+        item.memory_limit = stats.get('memory_limit', 0)
+        before = previous_stats.get(name)
+        if before is not None:
+            cpu_delta = stats.get('cpu_total', 0) - before.get('cpu_total', 0)
+            system_delta = stats.get('cpu_system', 0) - before.get('cpu_system', 0)
+            if cpu_delta >= 0 and system_delta > 0:
+                item.cpu = cpu_delta / system_delta * stats.get('online_cpus', 1) * 100
+
+            read_before, read_now = parse_read_time(before.get('read')), parse_read_time(stats.get('read'))
+            elapsed = read_now - read_before if read_before and read_now else current_at - previous_at
+            item.net_rx = _rate(before, stats, 'rx_bytes', elapsed)
+            item.net_tx = _rate(before, stats, 'tx_bytes', elapsed)
+            item.blk_read = _rate(before, stats, 'blk_read', elapsed)
+            item.blk_write = _rate(before, stats, 'blk_write', elapsed)
+        rates.append(item)
+    return rates
+
+
+def rank(rates: List[ContainerRates], key: str, count: int) -> List[ContainerRates]:
+    """Перші `count` контейнерів за ключем (без повного сортування)"""
+    return heapq.nlargest(count, rates, key=lambda item: (item.sort_value(key), item.name))
+
+
+def _format_rate(value: Optional[float]) -> str:
+    return '-' if value is None else f"{format_size(value)}/с"
+
+
+def format_top(rates: List[ContainerRates], options: Dict[str, Any], interval: float,
+               footer: str = '') -> str:
+    """Таблиця топ-k контейнерів з підсумком по всіх"""
+    top = rank(rates, options['sort'], options['count'])
+    total_cpu = sum(item.cpu or 0 for item in rates)
+    total_memory = sum(item.memory for item in rates)
+    message = (f"📈 **Топ {len(top)} з {len(rates)} контейнерів за {TOP_SORTS[options['sort']]}** "
+               f"(інтервал {interval:.0f} с, {time.strftime('%H:%M:%S')})\n"
+               f"Усього: CPU {total_cpu:.0f}%, пам'ять {format_size(total_memory)}\n```\n")
+    message += f"{'КОНТЕЙНЕР':<22} {'CPU':>6}  {TOP_MEMORY_HEADER:>14}  {'МЕРЕЖА ↓/↑':>23}  {'ДИСК R/W':>23}\n"
+    for item in top:
+        cpu = '-' if item.cpu is None else f"{item.cpu:.1f}%"
+        memory = format_size(item.memory)
+        if item.memory_limit:
+            memory += f" {item.memory / item.memory_limit * 100:.0f}%"
+        network = f"{_format_rate(item.net_rx)} / {_format_rate(item.net_tx)}"
+        disk = f"{_format_rate(item.blk_read)} / {_format_rate(item.blk_write)}"
+        message += f"{item.name[:22]:<22} {cpu:>6}  {memory:>14}  {network:>23}  {disk:>23}\n"
+    message += "```"
+    if footer:
+        message += f"\n{footer}"
+    return message
+
+
+class TopSampleError(AdminApiError):
+    """Невдалий знімок; retry_after - пауза, яку просить адмін-панель після 429 (с)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TopSampler:
+    """Знімки лічильників усіх контейнерів з адмін-панелі (без кешу)"""
+
+    def __init__(self, admin_api: AdminApiClient):
+        self.admin_api = admin_api
+
+    async def sample(self) -> Tuple[float, Dict[str, Dict[str, Any]]]:
+        response = await self.admin_api.request('stats', use_cache=False)
+        if not response.get('success'):
+            retry_after = (response.get('retry_after') or TOP_WATCH_INTERVAL) if response.get('status') == 429 else None
+            raise TopSampleError(response.get('error', 'Невідома помилка'), retry_after)
+        return time.time(), {item['name']: item for item in response.get('stats', [])}
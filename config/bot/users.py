@@ -0,0 +1,542 @@
+"""
+Користувачі Matrix: локальний індекс для /user list та масовий імпорт /user import
+Автор: Matrix Setup Team
+"""
+
+import asyncio
+import bisect
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+import nio
+
+from admin_api import AdminApiClient
+from db import DatabaseDiagnostics, DatabaseError
+from state_store import StateFile
+
+logger = logging.getLogger(__name__)
+
+# Скільки користувачів на сторінці /user list
+USERS_PAGE_SIZE = int(os.getenv('MATRIX_BOT_USERS_PAGE_SIZE', '50'))
+# Як довго індекс вважається свіжим без звернення до БД (с)
+USERS_INDEX_TTL = float(os.getenv('MATRIX_BOT_USERS_INDEX_TTL', '60'))
+# /user import: акаунти створюються пакетами через /api/users/batch (один запит на пакет
+# рахується в ліміт запитів адмін-панелі), одночасно - USERS_IMPORT_CONCURRENCY пакетів
+USERS_IMPORT_BATCH = int(os.getenv('MATRIX_BOT_USERS_IMPORT_BATCH', '200'))
+USERS_IMPORT_CONCURRENCY = int(os.getenv('MATRIX_BOT_USERS_IMPORT_CONCURRENCY', '2'))
+# Пауза після 429 від адмін-панелі, якщо вона не надіслала Retry-After (с), і скільки разів повторювати пакет
+USERS_IMPORT_RETRY_DELAY = float(os.getenv('MATRIX_BOT_USERS_IMPORT_RETRY_DELAY', '60'))
+USERS_IMPORT_MAX_RETRIES = 20
+# Ліміти файлу та період оновлення прогресу (с)
+USERS_IMPORT_MAX_ROWS = int(os.getenv('MATRIX_BOT_USERS_IMPORT_MAX_ROWS', '50000'))
+USERS_IMPORT_MAX_BYTES = int(os.getenv('MATRIX_BOT_USERS_IMPORT_MAX_BYTES', str(20 * 1024 ** 2)))
+USERS_IMPORT_PROGRESS_INTERVAL = float(os.getenv('MATRIX_BOT_USERS_IMPORT_PROGRESS_INTERVAL', '10'))
+# Скільки секунд після завантаження файл у кімнаті підхоплюється командою /user import
+USERS_IMPORT_FILE_TTL = 900
+# Рядків за один запит при читанні облікових записів з БД
+USERS_FETCH_BATCH = 5000
+USERS_MIN_PASSWORD = 8
+
+USERS_LIST_USAGE = "❌ Використання: `/user list [префікс] [сторінка] [--all]`"
+USERS_IMPORT_USAGE = ("❌ Використання: завантажте в кімнату CSV (`username,password[,display_name]`) "
+                      "або JSON (масив чи рядки `{\"username\": ..., \"password\": ...}`), потім `/user import` "
+                      "(або `/user import mxc://...`)")
+
+# Локальна частина Matrix ID (історичні символи на кшталт '/' не допускаємо для нових акаунтів)
+LOCALPART_PATTERN = re.compile(r'[a-z0-9._=\-]{1,255}')
+
+# account_type у userapi_accounts Dendrite
+ACCOUNT_ADMIN = 3
+
+# Облікові записи Dendrite; ключ (created_ts, localpart) дає стабільний порядок для докачування
+ACCOUNTS_QUERY = """
+SELECT localpart, created_ts, is_deactivated, account_type
+FROM userapi_accounts
+WHERE (created_ts, localpart) > ($1, $2)
+ORDER BY created_ts, localpart
+LIMIT $3
+"""
+
+ACCOUNTS_COUNT_QUERY = """
+SELECT count(*) AS total, count(*) FILTER (WHERE is_deactivated) AS deactivated
+FROM userapi_accounts
+"""
+
+IMPORT_CREATED = 'created'
+IMPORT_EXISTS = 'exists'
+IMPORT_INVALID = 'invalid'
+IMPORT_FAILED = 'failed'
+
+
+def parse_user_list_args(args: List[str]) -> Dict[str, Any]:
+    """Розбір аргументів /user list; ValueError з поясненням при помилці"""
+    options = {'prefix': '', 'page': 1, 'all': False}
+    for arg in args:
+        if arg == '--all':
+            options['all'] = True
+        elif arg.isdigit() and int(arg) > 0 and options['page'] == 1:
+            options['page'] = int(arg)
+        elif not arg.startswith('-') and not options['prefix']:
+            options['prefix'] = normalize_localpart(arg)
+        else:
+            raise ValueError(USERS_LIST_USAGE)
+    return options
+
+
+def normalize_localpart(value: str) -> str:
+    """'@Alice:example.org' -> 'alice'"""
+    value = value.strip().lower()
+    if value.startswith('@'):
+        value = value[1:].split(':', 1)[0]
+    return value
+
+
+class UserIndex:
+    """
+    Відсортований локальний індекс облікових записів.
+
+    Джерело - таблиця userapi_accounts Dendrite через пул /db: кожне оновлення
+    дочитує лише записи, створені після відомої позиції (created_ts, localpart),
+    а дешевий count(*) виявляє розбіжність (деактивації, видалення) - тоді індекс
+    перечитується повністю. Без підключення до БД індекс будується зі списку
+    адмін-панелі. Пошук за префіксом - бінарний пошук у відсортованому списку,
+    тож сторінка й кількість збігів не залежать від загальної кількості акаунтів.
+    """
+
+    def __init__(self, db: DatabaseDiagnostics, admin_api: AdminApiClient, state_file: Optional[StateFile] = None):
+        self.db = db
+        self.admin_api = admin_api
+        self.state_file = state_file or StateFile('users.json')
+        self.users: Dict[str, Tuple[int, bool, bool]] = {}
+        self.names: List[str] = []
+        self.active: List[str] = []
+        self.position: Tuple[int, str] = (0, '')
+        self.refreshed_at = 0.0
+        self.source = 'db' if db.enabled else 'admin-panel'
+        self._lock = asyncio.Lock()
+        self._load()
+
+    def _load(self):
+        state = self.state_file.load()
+        if state.get('source') != self.source:
+            return
+        self.users = {name: (created, deactivated, admin) for name, created, deactivated, admin in state.get('users', [])}
+        self.position = tuple(state.get('position', (0, '')))
+        self._rebuild()
+
+    def _save(self):
+        self.state_file.save({
+            'source': self.source,
+            'position': list(self.position),
+            'users': [[name, *info] for name, info in self.users.items()],
+        })
+
+    def _rebuild(self):
+        self.names = sorted(self.users)
+        self.active = [name for name in self.names if not self.users[name][1]]
+
+    def add(self, localpart: str, created_ts: Optional[int] = None):
+        """Локально створений акаунт: видно в /user list одразу, без оновлення з джерела"""
+        if localpart in self.users:
+            return
+        self.users[localpart] = (created_ts or int(time.time() * 1000), False, False)
+        bisect.insort(self.names, localpart)
+        bisect.insort(self.active, localpart)
+
+    def __contains__(self, localpart: str) -> bool:
+        return localpart in self.users
+
+    async def refresh(self, force: bool = False):
+        """Оновлення індексу, якщо він старший за USERS_INDEX_TTL; одночасні виклики чекають на одне"""
+        async with self._lock:
+            if not force and time.monotonic() - self.refreshed_at < USERS_INDEX_TTL:
+                return
+            if self.db.enabled:
+                await self._refresh_from_db()
+            else:
+                await self._refresh_from_admin_panel()
+            self.refreshed_at = time.monotonic()
+            await asyncio.to_thread(self._save)
+
+    async def _refresh_from_db(self):
+        pool = await self.db.pool()
+        try:
+            async with pool.acquire() as connection:
+                added = await self._fetch_since(connection, self.users, self.position)
+                counts = await connection.fetchrow(ACCOUNTS_COUNT_QUERY)
+                deactivated = sum(1 for info in self.users.values() if info[1])
+                if counts['total'] != len(self.users) or counts['deactivated'] != deactivated:
+                    # Розбіжність, яку не видно за created_ts: перечитуємо все
+                    logger.info(f"Індекс користувачів розійшовся з БД ({len(self.users)} проти {counts['total']}), "
+                                f"повне перечитування")
+                    users: Dict[str, Tuple[int, bool, bool]] = {}
+                    self.position = (0, '')
+                    await self._fetch_since(connection, users, self.position)
+                    self.users = users
+                    added = len(users)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            raise DatabaseError(str(e)) from e
+        if added:
+            self._rebuild()
+
+    async def _fetch_since(self, connection, users: Dict[str, Tuple[int, bool, bool]],
+                           position: Tuple[int, str]) -> int:
+        """Докачування записів після `position` пакетами; повертає кількість нових"""
+        added = 0
+        while True:
+            rows = await connection.fetch(ACCOUNTS_QUERY, position[0], position[1], USERS_FETCH_BATCH)
+            for row in rows:
+                users[row['localpart']] = (row['created_ts'], row['is_deactivated'],
+                                           row['account_type'] == ACCOUNT_ADMIN)
+            added += len(rows)
+            if rows:
+                position = (rows[-1]['created_ts'], rows[-1]['localpart'])
+                self.position = position
+            if len(rows) < USERS_FETCH_BATCH:
+                return added
+
+    async def _refresh_from_admin_panel(self):
+        response = await self.admin_api.request('users')
+        if not response.get('success'):
+            raise RuntimeError(response.get('error', 'Невідома помилка'))
+        users = {}
+        for user in response.get('users', []):
+            name = normalize_localpart(user.get('username', ''))
+            if name:
+                users[name] = self.users.get(name, (0, False, bool(user.get('admin'))))
+        self.users = users
+        self._rebuild()
+
+    def search(self, prefix: str = '', include_deactivated: bool = False,
+               offset: int = 0, limit: int = USERS_PAGE_SIZE) -> Tuple[int, List[str]]:
+        """(кількість збігів, сторінка імен) для префікса"""
+        names = self.names if include_deactivated else self.active
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + '\uffff') if prefix else len(names)
+        return end - start, names[start + offset:min(end, start + offset + limit)]
+
+    def counts(self) -> Dict[str, int]:
+        admins = sum(1 for info in self.users.values() if info[2])
+        return {'total': len(self.users), 'active': len(self.active),
+                'deactivated': len(self.users) - len(self.active), 'admins': admins}
+
+
+def format_user_list(index: UserIndex, options: Dict[str, Any]) -> str:
+    """Сторінка списку користувачів з лічильниками"""
+    offset = (options['page'] - 1) * USERS_PAGE_SIZE
+    total, page = index.search(options['prefix'], options['all'], offset, USERS_PAGE_SIZE)
+    counts = index.counts()
+    message = (f"👥 **Користувачі**: {counts['active']} активних, {counts['deactivated']} деактивованих, "
+               f"{counts['admins']} адмінів\n")
+    if options['prefix']:
+        message += f"Префікс `{options['prefix']}`: {total} збігів\n"
+    if not page:
+        return message + ("Користувачів не знайдено" if not total else f"Сторінка {options['page']} порожня")
+    pages = -(-total // USERS_PAGE_SIZE)
+    message += f"Стор. {options['page']}/{pages}:\n"
+    for name in page:
+        created, deactivated, admin = index.users[name]
+        marks = (' 👑' if admin else '') + (' (деактивовано)' if deactivated else '')
+        message += f"• {name}{marks}\n"
+    if options['page'] < pages:
+        next_args = ' '.join(filter(None, [options['prefix'], str(options['page'] + 1), '--all' if options['all'] else '']))
+        message += f"\nНаступна сторінка: `/user list {next_args}`"
+    return message
+
+
+def parse_mxc(url: str) -> Tuple[str, str]:
+    match = re.fullmatch(r'mxc://([^/]+)/([^/?#]+)', url or '')
+    if not match:
+        raise ValueError(USERS_IMPORT_USAGE)
+    return match.group(1), match.group(2)
+
+
+async def download_media(client: nio.AsyncClient, url: str, path: str, max_bytes: int = USERS_IMPORT_MAX_BYTES) -> int:
+    """Потокове завантаження mxc:// у файл шматками, з обмеженням розміру"""
+    server, media_id = parse_mxc(url)
+    response = await client.send('GET', f"/_matrix/media/v3/download/{server}/{media_id}",
+                                 headers={'Authorization': f"Bearer {client.access_token}"})
+    try:
+        if response.status != 200:
+            raise RuntimeError(f"не вдалося завантажити файл: HTTP {response.status}")
+        size = 0
+        with open(path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"файл більший за {max_bytes // 1024 ** 2} МБ")
+                f.write(chunk)
+        return size
+    finally:
+        response.release()
+
+
+def _iter_json_array(f: io.TextIOBase) -> Iterator[Any]:
+    """Елементи JSON-масиву по одному, без читання всього файлу в пам'ять"""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = f.read(64 * 1024)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError("JSON має бути масивом об'єктів")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ValueError("JSON обірвано або пошкоджено")
+                break
+            yield item
+        if not chunk:
+            return
+
+
+def iter_import_rows(path: str, filename: str = '') -> Iterator[Tuple[int, Any]]:
+    """
+    Рядки файлу імпорту: (номер рядка, dict) або (номер, текст помилки).
+    Формат визначається за першим значущим символом: '[' - JSON-масив,
+    '{' - JSON Lines, інакше CSV (заголовок з username - необов'язковий).
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        first = f.read(4096).lstrip()[:1]
+        f.seek(0)
+        if first == '[' or (filename.endswith('.json') and first != '{'):
+            for number, item in enumerate(_iter_json_array(f), 1):
+                yield number, item if isinstance(item, dict) else f"очікувався об'єкт, отримано {type(item).__name__}"
+        elif first == '{':
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    yield number, f"некоректний JSON: {e}"
+                    continue
+                yield number, item if isinstance(item, dict) else "очікувався об'єкт"
+        else:
+            reader = csv.reader(f)
+            columns = ['username', 'password', 'display_name']
+            header = True
+            for row in reader:
+                if not row or not any(cell.strip() for cell in row):
+                    continue
+                if header:
+                    header = False
+                    lowered = [cell.strip().lower() for cell in row]
+                    if 'username' in lowered:
+                        columns = lowered
+                        continue
+                yield reader.line_num, dict(zip(columns, (cell.strip() for cell in row)))
+
+
+async def read_import_rows(path: str, filename: str = '', chunk: int = USERS_IMPORT_BATCH) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    iter_import_rows поза event loop: читання, декодування та розбір файлу (до
+    USERS_IMPORT_MAX_BYTES) виконуються в потоці частинами по `chunk` рядків, тож
+    sync, черга повідомлень та інші команди не чекають на розбір
+    """
+    rows = iter_import_rows(path, filename)
+    while True:
+        part = await asyncio.to_thread(lambda: list(islice(rows, chunk)))
+        if not part:
+            return
+        for row in part:
+            yield row
+
+
+class ImportRow:
+    """Результат одного рядка імпорту"""
+
+    __slots__ = ('number', 'username', 'status', 'detail')
+
+    def __init__(self, number: int, username: str = '', status: str = IMPORT_INVALID, detail: str = ''):
+        self.number = number
+        self.username = username
+        self.status = status
+        self.detail = detail
+
+
+def validate_row(number: int, item: Any, seen: set, index: UserIndex) -> Tuple[Optional[Dict[str, str]], Optional[ImportRow]]:
+    """Дані для створення або готовий результат (некоректний рядок, дублікат, існуючий акаунт)"""
+    if not isinstance(item, dict):
+        return None, ImportRow(number, detail=str(item))
+    username = normalize_localpart(str(item.get('username') or item.get('user') or ''))
+    if not LOCALPART_PATTERN.fullmatch(username):
+        return None, ImportRow(number, username, detail="некоректне ім'я (дозволено a-z, 0-9, . _ = -)")
+    if username in seen:
+        return None, ImportRow(number, username, detail='дублікат у файлі')
+    seen.add(username)
+    if username in index:
+        return None, ImportRow(number, username, IMPORT_EXISTS, 'вже існує')
+    password = str(item.get('password') or '')
+    # Паролі не генеруються: звіт надсилається в кімнату, тож секретів у ньому бути не може
+    if not password:
+        return None, ImportRow(number, username, detail='немає пароля')
+    if len(password) < USERS_MIN_PASSWORD:
+        return None, ImportRow(number, username, detail=f"пароль коротший за {USERS_MIN_PASSWORD} символів")
+    data = {'username': username, 'password': password}
+    display_name = str(item.get('display_name') or item.get('displayname') or '').strip()
+    if display_name:
+        data['displayName'] = display_name
+    return data, ImportRow(number, username, IMPORT_CREATED)
+
+
+class UserImport:
+    """
+    Імпорт потоком: перевірені рядки збираються в пакети по USERS_IMPORT_BATCH і
+    через обмежену чергу йдуть до USERS_IMPORT_CONCURRENCY працівників. Черга не дає
+    читанню випередити створення більш ніж на кілька пакетів, тож пам'ять не залежить
+    від розміру файлу. Пакет, відхилений лімітом запитів адмін-панелі (429),
+    повторюється після паузи.
+    """
+
+    def __init__(self, index: UserIndex, create: Callable[[List[Dict[str, str]]], Awaitable[Dict[str, Any]]],
+                 concurrency: int = USERS_IMPORT_CONCURRENCY, batch_size: int = USERS_IMPORT_BATCH):
+        self.index = index
+        self.create = create
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.counts = {IMPORT_CREATED: 0, IMPORT_EXISTS: 0, IMPORT_INVALID: 0, IMPORT_FAILED: 0}
+        self.rows = 0
+        self.rate_limited = 0
+        self.started = time.monotonic()
+        self.truncated = False
+
+    async def create_batch(self, batch: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Запит на створення пакета з повтором після 429"""
+        for _ in range(USERS_IMPORT_MAX_RETRIES):
+            response = await self.create(batch)
+            if response.get('status') != 429:
+                return response
+            self.rate_limited += 1
+            delay = response.get('retry_after') or USERS_IMPORT_RETRY_DELAY
+            logger.warning(f"Ліміт запитів адмін-панелі, пакет з {len(batch)} користувачів повториться через {delay:.0f} с")
+            await asyncio.sleep(delay)
+        return response
+
+    async def run(self, rows: AsyncIterator[Tuple[int, Any]], on_result: Callable[[ImportRow], None]):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        seen: set = set()
+
+        def record(result: ImportRow):
+            self.counts[result.status] += 1
+            on_result(result)
+
+        def apply(data: Dict[str, str], result: ImportRow, outcome: Dict[str, Any]):
+            if outcome.get('success'):
+                self.index.add(data['username'])
+                # Акаунт створено, але, напр., ім'я профілю не встановилось
+                result.detail = outcome.get('warning') or ''
+                return
+            error = outcome.get('error') or 'Невідома помилка'
+            # Dendrite відповідає M_USER_IN_USE, якщо акаунт з'явився поза індексом
+            in_use = outcome.get('errcode') == 'M_USER_IN_USE'
+            result.status, result.detail = (IMPORT_EXISTS if in_use else IMPORT_FAILED), error
+
+        async def worker():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                try:
+                    response = await self.create_batch([data for data, _ in batch])
+                    outcomes = response.get('results')
+                    if not response.get('success'):
+                        # Пакет не оброблено - помилка запиту стосується кожного рядка
+                        outcomes = [response] * len(batch)
+                    elif not isinstance(outcomes, list) or len(outcomes) != len(batch):
+                        outcomes = [{'error': 'некоректна відповідь адмін-панелі'}] * len(batch)
+                    for (data, result), outcome in zip(batch, outcomes):
+                        apply(data, result, outcome)
+                except Exception as e:
+                    for _, result in batch:
+                        result.status, result.detail = IMPORT_FAILED, str(e)
+                for _, result in batch:
+                    record(result)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            batch = []
+            async for number, item in rows:
+                if self.rows >= USERS_IMPORT_MAX_ROWS:
+                    self.truncated = True
+                    break
+                self.rows += 1
+                data, result = validate_row(number, item, seen, self.index)
+                if data is None:
+                    record(result)
+                    continue
+                batch.append((data, result))
+                if len(batch) >= self.batch_size:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    @property
+    def seconds(self) -> float:
+        return time.monotonic() - self.started
+
+
+def format_import_progress(job: UserImport, done: bool = False) -> str:
+    counts = job.counts
+    icon = '✅' if done and not counts[IMPORT_FAILED] else '⚠️' if done else '⏳'
+    rate = job.rows / job.seconds if job.seconds else 0
+    message = (f"{icon} **Імпорт користувачів**{' завершено' if done else ''}: оброблено {job.rows} рядків "
+               f"за {job.seconds:.0f} с ({rate:.1f}/с)\n"
+               f"Створено {counts[IMPORT_CREATED]}, вже існували {counts[IMPORT_EXISTS]}, "
+               f"некоректних {counts[IMPORT_INVALID]}, помилок {counts[IMPORT_FAILED]}")
+    if job.rate_limited and not done:
+        message += f"\n⏸ Ліміт запитів адмін-панелі: пакети повторено {job.rate_limited} раз(и)"
+    if job.truncated:
+        message += f"\n⚠️ Оброблено лише перші {USERS_IMPORT_MAX_ROWS} рядків"
+    return message
+
+
+class ImportResults:
+    """CSV з результатом кожного рядка (без паролів - файл надсилається в кімнату) і перші помилки для повідомлення"""
+
+    def __init__(self, path: str, examples: int = 5):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['row', 'username', 'status', 'detail'])
+        self.examples: List[ImportRow] = []
+        self.max_examples = examples
+
+    def add(self, result: ImportRow):
+        self.writer.writerow([result.number, result.username, result.status, result.detail])
+        if result.status in (IMPORT_INVALID, IMPORT_FAILED) and len(self.examples) < self.max_examples:
+            self.examples.append(result)
+
+    def close(self):
+        self.file.close()
+
+    def format_examples(self) -> str:
+        if not self.examples:
+            return ''
+        return "\n" + '\n'.join(f"• рядок {row.number} `{row.username or '-'}`: {row.detail}" for row in self.examples)
@@ -318,7 +318,7 @@ class AdminPanel {
 
             if (data && data.success) {
                 this.renderBackupsTable(data.backups);
-                document.getElementById('backup-count').textContent = data.backups.length;
+                document.getElementById('backup-count').textContent = data.total ?? data.backups.length;
             }
         } catch (error) {
             this.showNotification('Помилка завантаження бекапів', 'error');
@@ -337,7 +337,7 @@ class AdminPanel {
         tbody.innerHTML = backups.map(backup => `
             <tr>
                 <td>${backup.name}</td>
-                <td>${this.formatBytes(backup.size)}</td>
+                <td>${backup.size == null ? '—' : this.formatBytes(backup.size)}</td>
                 <td>${new Date(backup.created).toLocaleString('uk-UA')}</td>
                 <td>
                     <button class="btn btn-success btn-sm me-1" onclick="restoreBackup('${backup.name}')">
@@ -29,8 +29,8 @@ app.use(cors());
 app.use(express.json());
 app.use(express.static('public'));
 
-// Функція для аудиту
-function auditLog(action, user = 'system', details = {}) {
+// Функція для аудиту; req (необов'язковий) - запит, з якого береться IP
+function auditLog(action, user = 'system', details = {}, req = null) {
     const logEntry = {
         timestamp: new Date().toISOString(),
         action,
@@ -211,20 +211,182 @@ app.get('/api/logs/:name', async (req, res) => {
   }
 });
 
-// Створення користувача Matrix
-app.post('/api/users/create', async (req, res) => {
+// Рівні логів: рядок проходить фільтр, якщо містить маркер рівня або вищого
+const LOG_LEVEL_PATTERNS = {
+    error: /\b(error|err|fatal|panic|crit(ical)?)\b/i,
+    warn: /\b(error|err|fatal|panic|crit(ical)?|warn(ing)?)\b/i,
+    info: /\b(error|err|fatal|panic|crit(ical)?|warn(ing)?|info|notice|log)\b/i
+};
+
+// Перетворення --since (15m, 2h, 1d, ISO дата або unix секунди) у unix секунди
+function parseSince(value) {
+    if (!value) return 0;
+    const relative = /^(\d+)([smhd])$/.exec(value);
+    if (relative) {
+        const units = { s: 1, m: 60, h: 3600, d: 86400 };
+        return Math.floor(Date.now() / 1000) - parseInt(relative[1], 10) * units[relative[2]];
+    }
+    if (/^\d+$/.test(value)) return parseInt(value, 10);
+    const date = Date.parse(value);
+    if (isNaN(date)) throw new Error(`Невірне значення since: ${value}`);
+    return Math.floor(date / 1000);
+}
+
+// Потік логів контейнера напряму з Docker API (без буферизації всього виводу)
+function openLogStream(name, options) {
+    return new Promise((resolve, reject) => {
+        docker.modem.dial({
+            path: `/containers/${encodeURIComponent(name)}/logs?`,
+            method: 'GET',
+            options,
+            isStream: true,
+            statusCodes: { 200: true, 404: 'no such container', 500: 'server error' }
+        }, (err, stream) => err ? reject(err) : resolve(stream));
+    });
+}
+
+// Потокові логи з фільтрацією на стороні сервера (text/plain, рядок за рядком)
+app.get('/api/logs/:name/stream', async (req, res) => {
+    let upstream = null;
+    try {
+        const { name } = req.params;
+        const { lines, since, grep, level, follow, limit } = req.query;
+
+        const pattern = grep ? new RegExp(grep, 'i') : null;
+        const levelPattern = level && LOG_LEVEL_PATTERNS[level] ? LOG_LEVEL_PATTERNS[level] : null;
+        const maxLines = limit ? parseInt(limit, 10) : 0;
+        const sinceTs = parseSince(since);
+
+        upstream = await openLogStream(name, {
+            stdout: true,
+            stderr: true,
+            follow: follow === '1' || follow === 'true',
+            since: sinceTs,
+            tail: lines || (sinceTs ? 'all' : 100),
+            timestamps: true
+        });
+
+        res.setHeader('Content-Type', 'text/plain; charset=utf-8');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.flushHeaders();
+
+        // Docker мультиплексує stdout/stderr - розділяємо кадри в один потік
+        const { PassThrough } = require('stream');
+        const readline = require('readline');
+        const output = new PassThrough();
+        docker.modem.demuxStream(upstream, output, output);
+        upstream.on('end', () => output.end());
+        upstream.on('error', () => output.end());
+
+        let sent = 0;
+        const rl = readline.createInterface({ input: output, crlfDelay: Infinity });
+        // Клієнт відключився (або відповідь завершено) - зупиняємо читання з Docker
+        res.on('close', () => {
+            upstream.destroy();
+            rl.close();
+        });
+
+        for await (const line of rl) {
+            if (levelPattern && !levelPattern.test(line)) continue;
+            if (pattern && !pattern.test(line)) continue;
+            if (!res.write(line + '\n')) {
+                await new Promise(resolve => res.once('drain', resolve));
+            }
+            sent += 1;
+            if (maxLines && sent >= maxLines) break;
+        }
+        upstream.destroy();
+        res.end();
+    } catch (error) {
+        if (upstream) upstream.destroy();
+        if (res.headersSent) {
+            res.end();
+        } else {
+            res.status(500).json({ success: false, error: error.message });
+        }
+    }
+});
+
+// Реєстрація користувача в Dendrite; помилка несе errcode Matrix (M_USER_IN_USE тощо)
+// і HTTP-статус Dendrite, щоб клієнти не розбирали текст повідомлення axios.
+// displayName стає ім'ям у профілі (токеном щойно створеного акаунта); якщо це не вдалося,
+// акаунт усе одно створено, а причина повертається в warning
+async function registerMatrixUser({ username, password, displayName }) {
     try {
-        const { username, password, displayName } = req.body;
-        
         const response = await axios.post(`http://dendrite:8008/_matrix/client/r0/register`, {
             auth: { type: 'm.login.dummy' },
-            initial_device_display_name: displayName || 'Admin Device',
+            initial_device_display_name: 'Admin Device',
             password: password,
             username: username
         });
-        
-        auditLog('matrix_user_create', req.user.username, { username, displayName });
-        res.json({ success: true, user: response.data });
+        const result = { success: true, user: response.data };
+        if (displayName) {
+            const { user_id: userId, access_token: accessToken } = response.data;
+            try {
+                await axios.put(
+                    `http://dendrite:8008/_matrix/client/v3/profile/${encodeURIComponent(userId)}/displayname`,
+                    { displayname: displayName },
+                    { headers: { Authorization: `Bearer ${accessToken}` } }
+                );
+            } catch (error) {
+                result.warning = `Ім'я профілю не встановлено: ${error.response?.data?.error || error.message}`;
+            }
+        }
+        return result;
+    } catch (error) {
+        const data = error.response?.data || {};
+        return {
+            success: false,
+            status: error.response?.status || 500,
+            errcode: data.errcode,
+            error: data.error || error.message
+        };
+    }
+}
+
+// Створення користувача Matrix
+app.post('/api/users/create', async (req, res) => {
+    try {
+        const { username, displayName } = req.body;
+        const result = await registerMatrixUser(req.body);
+        if (!result.success) {
+            return res.status(result.status).json(result);
+        }
+        auditLog('matrix_user_create', req.user?.username, { username, displayName }, req);
+        res.json(result);
+    } catch (error) {
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
+// Масове створення (/user import у боті): пакет - один запит, тож імпорт не вичерпує
+// загальний ліміт запитів; усередині пакета одночасно не більше USERS_BATCH_CONCURRENCY реєстрацій
+const USERS_BATCH_MAX = 500;
+const USERS_BATCH_CONCURRENCY = 4;
+
+app.post('/api/users/batch', async (req, res) => {
+    try {
+        const users = req.body.users;
+        if (!Array.isArray(users) || users.length === 0 || users.length > USERS_BATCH_MAX) {
+            return res.status(400).json({ success: false, error: `Потрібен масив users (1-${USERS_BATCH_MAX} записів)` });
+        }
+        const results = new Array(users.length);
+        let next = 0;
+        const worker = async () => {
+            while (next < users.length) {
+                const i = next++;
+                const { username, password, displayName } = users[i] || {};
+                // Токени доступу нових акаунтів у відповідь не потрапляють
+                const { success, status, errcode, error, warning } =
+                    await registerMatrixUser({ username, password, displayName });
+                results[i] = { username, success, status, errcode, error, warning };
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(USERS_BATCH_CONCURRENCY, users.length) }, worker));
+
+        const created = results.filter((result) => result.success).map((result) => result.username);
+        auditLog('matrix_user_batch_create', req.user?.username, { total: users.length, created }, req);
+        res.json({ success: true, results });
     } catch (error) {
         res.status(500).json({ success: false, error: error.message });
     }
@@ -271,69 +433,172 @@ app.get('/api/users', async (req, res) => {
   }
 });
 
+// Запуск скрипта бекапу/відновлення; з ?stream=1 рядки скрипта (прогрес, [STATS])
+// передаються клієнту одразу, а потік завершується рядком "[EXIT] code=N"
+function runBackupScript(req, res, script, args, onClose) {
+    const { spawn } = require('child_process');
+    const child = spawn(script, args, { stdio: ['ignore', 'pipe', 'pipe'] });
+    const stream = req.query.stream !== undefined;
+    let output = '';
+
+    if (stream) {
+        res.setHeader('Content-Type', 'text/plain; charset=utf-8');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.flushHeaders();
+    }
+    const forward = (chunk) => {
+        output += chunk;
+        if (stream) res.write(chunk);
+    };
+    child.stdout.on('data', forward);
+    child.stderr.on('data', forward);
+    // Якщо скрипт не запустився, 'close' все одно настане після 'error'
+    child.on('error', (error) => forward(`[ERROR] ${error.message}\n`));
+
+    child.on('close', (code) => {
+        const result = onClose(code, output);
+        if (stream) {
+            res.end(`[EXIT] code=${code}\n`);
+        } else if (code === 0) {
+            res.json({ success: true, ...result });
+        } else {
+            res.status(500).json({ success: false, error: output.trim().split('\n').pop() || `Код виходу ${code}` });
+        }
+    });
+}
+
 // Створення бекапу
 app.post('/api/backups/create', async (req, res) => {
     try {
-        const backupDir = `/backup/$(date +%Y-%m-%d_%H-%M-%S)`;
-        await fs.ensureDir(backupDir);
-        
-        // Виконання скрипта бекапу
-        const { exec } = require('child_process');
-        exec(`/scripts/backup.sh`, (error, stdout, stderr) => {
-            if (error) {
-                res.status(500).json({ success: false, error: error.message });
-            } else {
+        runBackupScript(req, res, '/scripts/backup.sh', [], (code, output) => {
+            const stats = /\[STATS\] backup name=(\S+)/.exec(output);
+            const backupDir = stats ? `/backup/${stats[1]}` : null;
+            if (code === 0) {
                 auditLog('backup_create', req.user.username, { backupDir });
-                res.json({ success: true, message: 'Бекап створено успішно', backupDir });
+            } else {
+                auditLog('backup_failed', req.user.username, { code });
             }
+            return { message: 'Бекап створено успішно', backupDir };
         });
     } catch (error) {
         res.status(500).json({ success: false, error: error.message });
     }
 });
 
-// Список бекапів
+// Каталог знімків: рядки JSON, які пишуть backup.sh (розміри, склад, контрольна сума)
+// і verify-backup.sh (результат перевірки); записи з тим самим ім'ям зливаються
+const BACKUP_ROOT = '/backup';
+const BACKUP_CATALOG = path.join(BACKUP_ROOT, 'catalog.jsonl');
+const BACKUP_NAME_PATTERN = /^\d{4}-\d{2}-\d{2}_[\w-]+$/;
+const BACKUP_SORT_FIELDS = { date: 'name', size: 'bytes', duration: 'seconds' };
+let backupCatalogCache = { mtimeMs: -1, entries: new Map() };
+
+async function readBackupCatalog() {
+    let stats;
+    try {
+        stats = await fs.stat(BACKUP_CATALOG);
+    } catch (error) {
+        return new Map();
+    }
+    if (stats.mtimeMs !== backupCatalogCache.mtimeMs) {
+        const entries = new Map();
+        for (const line of (await fs.readFile(BACKUP_CATALOG, 'utf8')).split('\n')) {
+            if (!line.trim()) continue;
+            try {
+                const entry = JSON.parse(line);
+                entries.set(entry.name, { ...entries.get(entry.name), ...entry });
+            } catch (error) {
+                // Обірваний рядок (бекап перервано під час запису) - пропускаємо
+            }
+        }
+        backupCatalogCache = { mtimeMs: stats.mtimeMs, entries };
+    }
+    return backupCatalogCache.entries;
+}
+
+async function removeFromBackupCatalog(name) {
+    if (!await fs.pathExists(BACKUP_CATALOG)) return;
+    const lines = (await fs.readFile(BACKUP_CATALOG, 'utf8')).split('\n')
+        .filter(line => line.trim() && !line.startsWith(`{"name":"${name}"`));
+    await fs.writeFile(`${BACKUP_CATALOG}.tmp`, lines.map(line => line + '\n').join(''));
+    await fs.rename(`${BACKUP_CATALOG}.tmp`, BACKUP_CATALOG);
+}
+
+// Список бекапів з каталогу: ?sort=date|size|duration&order=asc|desc&component=media
+// &status=ok|partial&limit=10&offset=0. Знімки без запису в каталозі (старі) теж
+// показуються - з розміром null
 app.get('/api/backups', async (req, res) => {
   try {
-    const backupPath = '/backup';
-    const backups = await fs.readdir(backupPath);
-    
-    const backupList = await Promise.all(
-      backups.map(async (backup) => {
-        const stats = await fs.stat(path.join(backupPath, backup));
-        return {
-          name: backup,
-          size: stats.size,
-          created: stats.birthtime,
-          modified: stats.mtime
-        };
-      })
-    );
-    
-    res.json({ success: true, backups: backupList });
+    const catalog = await readBackupCatalog();
+    // Лише знімки: спільне медіа-сховище та службові файли не є бекапами
+    const names = (await fs.readdir(BACKUP_ROOT)).filter(name => BACKUP_NAME_PATTERN.test(name));
+
+    let backups = names.map((name) => {
+        const entry = catalog.get(name);
+        if (!entry) {
+            const [date, time] = name.split('_');
+            return { name, created: `${date}T${time.replace(/-/g, ':')}`, size: null, bytes: null, cataloged: false };
+        }
+        return { ...entry, size: entry.bytes, cataloged: true };
+    });
+
+    const { component, status } = req.query;
+    if (component) backups = backups.filter(b => b.components && b.components[component] > 0);
+    if (status) backups = backups.filter(b => b.status === status);
+
+    const field = BACKUP_SORT_FIELDS[req.query.sort] || 'name';
+    const direction = req.query.order === 'asc' ? 1 : -1;
+    backups.sort((a, b) => {
+        // Без даних (старі знімки) - завжди в кінці
+        if (a[field] == null || b[field] == null) return (a[field] == null) - (b[field] == null);
+        return (a[field] < b[field] ? -1 : a[field] > b[field] ? 1 : 0) * direction;
+    });
+
+    const total = backups.length;
+    const offset = Math.max(parseInt(req.query.offset, 10) || 0, 0);
+    const limit = parseInt(req.query.limit, 10) || total;
+    res.json({ success: true, backups: backups.slice(offset, offset + limit), total, offset });
   } catch (error) {
     res.status(500).json({ success: false, error: error.message });
   }
 });
 
+// Перевірка цілісності знімка (контрольні суми файлів і об'єкти медіа), ?stream=1 - потоково
+app.post('/api/backups/verify/:name', async (req, res) => {
+    try {
+        const { name } = req.params;
+        const backupPath = path.join(BACKUP_ROOT, name);
+
+        if (!BACKUP_NAME_PATTERN.test(name) || !await fs.pathExists(backupPath)) {
+            return res.status(404).json({ success: false, error: 'Бекап не знайдено' });
+        }
+
+        runBackupScript(req, res, '/scripts/verify-backup.sh', [backupPath], (code) => {
+            auditLog('backup_verify', req.user.username, { backupName: name, ok: code === 0 });
+            return { message: 'Бекап цілий' };
+        });
+    } catch (error) {
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
 // Відновлення з бекапу
 app.post('/api/backups/restore/:name', async (req, res) => {
     try {
         const { name } = req.params;
         const backupPath = `/backup/${name}`;
         
-        if (!await fs.pathExists(backupPath)) {
+        if (!BACKUP_NAME_PATTERN.test(name) || !await fs.pathExists(backupPath)) {
             return res.status(404).json({ success: false, error: 'Бекап не знайдено' });
         }
         
-        const { exec } = require('child_process');
-        exec(`/scripts/restore.sh ${backupPath}`, (error, stdout, stderr) => {
-            if (error) {
-                res.status(500).json({ success: false, error: error.message });
-            } else {
+        runBackupScript(req, res, '/scripts/restore.sh', [backupPath], (code) => {
+            if (code === 0) {
                 auditLog('backup_restore', req.user.username, { backupName: name });
-                res.json({ success: true, message: 'Відновлення завершено успішно' });
+            } else {
+                auditLog('backup_restore_failed', req.user.username, { backupName: name, code });
             }
+            return { message: 'Відновлення завершено успішно' };
         });
     } catch (error) {
         res.status(500).json({ success: false, error: error.message });
@@ -344,9 +609,13 @@ app.post('/api/backups/restore/:name', async (req, res) => {
 app.delete('/api/backups/:name', async (req, res) => {
     try {
         const { name } = req.params;
-        const backupPath = `/backup/${name}`;
+        const backupPath = path.join(BACKUP_ROOT, name);
         
+        if (!BACKUP_NAME_PATTERN.test(name)) {
+            return res.status(404).json({ success: false, error: 'Бекап не знайдено' });
+        }
         await fs.remove(backupPath);
+        await removeFromBackupCatalog(name);
         auditLog('backup_delete', req.user.username, { backupName: name });
         res.json({ success: true, message: 'Бекап видалено успішно' });
     } catch (error) {
@@ -354,6 +623,53 @@ app.delete('/api/backups/:name', async (req, res) => {
     }
 });
 
+// Лічильники ресурсів контейнера з одного знімка Docker stats (one-shot: без
+// очікування другого виміру). Лічильники накопичувальні - швидкості й CPU%
+// рахує клієнт за різницею двох знімків
+async function sampleContainerStats(container) {
+    const raw = await docker.getContainer(container.Id).stats({ stream: false, 'one-shot': true });
+    const memory = raw.memory_stats || {};
+    const memoryStats = memory.stats || {};
+    const cpu = raw.cpu_stats || {};
+    const networks = Object.values(raw.networks || {});
+    const blkio = (raw.blkio_stats && raw.blkio_stats.io_service_bytes_recursive) || [];
+    const blkioBytes = (op) => blkio
+        .filter(entry => (entry.op || '').toLowerCase() === op)
+        .reduce((sum, entry) => sum + entry.value, 0);
+    return {
+        name: container.Names[0].replace('/', ''),
+        read: raw.read,
+        cpu_total: (cpu.cpu_usage && cpu.cpu_usage.total_usage) || 0,
+        cpu_system: cpu.system_cpu_usage || 0,
+        online_cpus: cpu.online_cpus || ((cpu.cpu_usage && cpu.cpu_usage.percpu_usage) || []).length || 1,
+        // Як docker stats: без неактивного сторінкового кешу (cgroup v2 / v1)
+        memory_usage: Math.max((memory.usage || 0) - (memoryStats.inactive_file ?? memoryStats.total_inactive_file ?? 0), 0),
+        memory_limit: memory.limit || 0,
+        rx_bytes: networks.reduce((sum, net) => sum + (net.rx_bytes || 0), 0),
+        tx_bytes: networks.reduce((sum, net) => sum + (net.tx_bytes || 0), 0),
+        blk_read: blkioBytes('read'),
+        blk_write: blkioBytes('write'),
+    };
+}
+
+// Знімок лічильників усіх запущених контейнерів (паралельно)
+async function sampleAllContainerStats() {
+    const containers = await docker.listContainers();
+    const samples = await Promise.all(containers.map(container =>
+        sampleContainerStats(container).catch(() => null)
+    ));
+    return samples.filter(Boolean);
+}
+
+// Лічильники ресурсів для /top у боті
+app.get('/api/stats', async (req, res) => {
+  try {
+    res.json({ success: true, sampled_at: Date.now(), stats: await sampleAllContainerStats() });
+  } catch (error) {
+    res.status(500).json({ success: false, error: error.message });
+  }
+});
+
 // Метрики системи
 app.get('/api/metrics', async (req, res) => {
   try {
@@ -361,28 +677,11 @@ app.get('/api/metrics', async (req, res) => {
     const running = containers.filter(c => c.State === 'running').length;
     const total = containers.length;
     
-    // Отримання використання ресурсів
-    const stats = await Promise.all(
-      containers.slice(0, 5).map(async (container) => {
-        try {
-          const containerObj = docker.getContainer(container.Id);
-          const containerStats = await containerObj.stats({ stream: false });
-          return {
-            name: container.Names[0].replace('/', ''),
-            cpu: containerStats.cpu_stats,
-            memory: containerStats.memory_stats
-          };
-        } catch (error) {
-          return null;
-        }
-      })
-    );
-    
     res.json({
       success: true,
       metrics: {
         containers: { running, total },
-        stats: stats.filter(Boolean)
+        stats: await sampleAllContainerStats()
       }
     });
   } catch (error) {
@@ -485,15 +784,172 @@ app.post('/api/update', async (req, res) => {
     }
 });
 
+// Імена сервісів docker-compose (захист від підстановки в команду оболонки)
+const SERVICE_NAME_PATTERN = /^[a-z0-9][a-z0-9_.-]*$/;
+// Як часто надсилати зведений прогрес завантаження образу (мс)
+const PULL_PROGRESS_INTERVAL = 1000;
+
+function execCompose(args) {
+    const { execFile } = require('child_process');
+    return new Promise((resolve, reject) => {
+        execFile('docker-compose', args, { maxBuffer: 10 * 1024 * 1024 }, (error, stdout, stderr) => {
+            if (error) {
+                reject(new Error((stderr || error.message).trim()));
+            } else {
+                resolve(stdout);
+            }
+        });
+    });
+}
+
+// Назва сервісу docker-compose, до якого належить контейнер
+function composeService(info) {
+    const service = info.Config.Labels?.['com.docker.compose.service'];
+    return service && SERVICE_NAME_PATTERN.test(service) ? service : null;
+}
+
+// Завантаження нового образу сервісу з прогресом (NDJSON)
+app.post('/api/update/pull/:name', async (req, res) => {
+    const { name } = req.params;
+    let ticker = null;
+    try {
+        if (!SERVICE_NAME_PATTERN.test(name)) {
+            return res.status(400).json({ success: false, error: 'Некоректна назва сервісу' });
+        }
+        const info = await docker.getContainer(name).inspect();
+        if (!composeService(info)) {
+            return res.status(400).json({ success: false, error: 'Сервіс не керується docker-compose' });
+        }
+        const image = info.Config.Image;
+        const stream = await docker.pull(image);
+
+        res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.flushHeaders();
+        res.on('close', () => {
+            clearInterval(ticker);
+            stream.destroy();
+        });
+
+        // Прогрес за шарами; клієнту йде лише періодичний підсумок
+        const layers = {};
+        const summary = () => {
+            const values = Object.values(layers);
+            return {
+                type: 'progress',
+                image,
+                layers: values.length,
+                done: values.filter(l => l.done).length,
+                current: values.reduce((sum, l) => sum + l.current, 0),
+                total: values.reduce((sum, l) => sum + l.total, 0)
+            };
+        };
+        ticker = setInterval(() => res.write(JSON.stringify(summary()) + '\n'), PULL_PROGRESS_INTERVAL);
+
+        await new Promise((resolve, reject) => {
+            docker.modem.followProgress(stream, (error) => error ? reject(error) : resolve(), (event) => {
+                if (!event.id || !event.status) return;
+                const layer = layers[event.id] || (layers[event.id] = { current: 0, total: 0, done: false });
+                if (event.progressDetail?.total) {
+                    layer.current = event.progressDetail.current || 0;
+                    layer.total = event.progressDetail.total;
+                }
+                if (/^(Pull complete|Already exists|Download complete)/.test(event.status)) {
+                    layer.done = true;
+                    layer.current = layer.total;
+                }
+            });
+        });
+        clearInterval(ticker);
+
+        const pulled = await docker.getImage(image).inspect();
+        const changed = pulled.Id !== info.Image;
+        auditLog('update_pull', req.user.username, { service: name, image, changed });
+        res.write(JSON.stringify({ ...summary(), type: 'done', success: true, changed, image_id: pulled.Id, previous_image_id: info.Image }) + '\n');
+        res.end();
+    } catch (error) {
+        clearInterval(ticker);
+        auditLog('update_failed', req.user.username, { service: name, error: error.message });
+        if (res.headersSent) {
+            res.end(JSON.stringify({ type: 'done', success: false, error: error.message }) + '\n');
+        } else {
+            res.status(500).json({ success: false, error: error.message });
+        }
+    }
+});
+
+// Перестворення одного сервісу з новим образом (без залежностей)
+app.post('/api/update/recreate/:name', async (req, res) => {
+    try {
+        const { name } = req.params;
+        if (!SERVICE_NAME_PATTERN.test(name)) {
+            return res.status(400).json({ success: false, error: 'Некоректна назва сервісу' });
+        }
+        const container = docker.getContainer(name);
+        const service = composeService(await container.inspect());
+        if (!service) {
+            return res.status(400).json({ success: false, error: 'Сервіс не керується docker-compose' });
+        }
+        await execCompose(['up', '-d', '--no-deps', service]);
+        const info = await container.inspect();
+        auditLog('update_recreate', req.user.username, { service: name, image_id: info.Image });
+        res.json({ success: true, image_id: info.Image });
+    } catch (error) {
+        auditLog('update_failed', req.user.username, { service: req.params.name, error: error.message });
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
+// Відкат сервісу: тег образу повертається на попередній ID і сервіс перестворюється
+app.post('/api/update/rollback/:name', async (req, res) => {
+    try {
+        const { name } = req.params;
+        const { image_id } = req.body;
+        if (!SERVICE_NAME_PATTERN.test(name) || !image_id) {
+            return res.status(400).json({ success: false, error: 'Потрібні назва сервісу та image_id' });
+        }
+        const info = await docker.getContainer(name).inspect();
+        const service = composeService(info);
+        if (!service) {
+            return res.status(400).json({ success: false, error: 'Сервіс не керується docker-compose' });
+        }
+        const reference = info.Config.Image;
+        const separator = reference.lastIndexOf(':');
+        const hasTag = separator > reference.lastIndexOf('/');
+        await docker.getImage(image_id).tag({
+            repo: hasTag ? reference.slice(0, separator) : reference,
+            tag: hasTag ? reference.slice(separator + 1) : 'latest'
+        });
+        await execCompose(['up', '-d', '--no-deps', service]);
+        auditLog('update_rollback', req.user.username, { service: name, image: reference, image_id });
+        res.json({ success: true, image: reference, image_id });
+    } catch (error) {
+        auditLog('update_failed', req.user.username, { service: req.params.name, error: error.message });
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
+// Єдина класифікація для /api/health і потоку подій: "starting" ще не вважається здоровим,
+// інакше монітор бота бачить різний стан з подій і з резервного опитування
+function isHealthy(state, health) {
+    return state === 'running' && (health === null || health === 'healthy');
+}
+
 // Healthcheck для всіх сервісів
 app.get('/api/health', async (req, res) => {
     try {
         const containers = await docker.listContainers({ all: true });
-        const health = containers.map(container => ({
-            name: container.Names[0].replace('/', ''),
-            status: container.State,
-            healthy: container.State === 'running'
-        }));
+        const health = containers.map(container => {
+            // Docker healthcheck (якщо є) додає стан у Status: "Up 5 minutes (healthy)"
+            const check = /\((healthy|unhealthy|health: starting)\)/.exec(container.Status || '');
+            const healthcheck = check ? check[1].replace('health: ', '') : null;
+            return {
+                name: container.Names[0].replace('/', ''),
+                status: container.State,
+                health: healthcheck,
+                healthy: isHealthy(container.State, healthcheck)
+            };
+        });
         
         const unhealthy = health.filter(h => !h.healthy);
         
@@ -516,6 +972,83 @@ app.get('/api/health', async (req, res) => {
     }
 });
 
+// Стан контейнера після події Docker (null - подія не змінює стан)
+const EVENT_STATES = {
+    create: 'created',
+    start: 'running',
+    restart: 'running',
+    unpause: 'running',
+    pause: 'paused',
+    die: 'exited',
+    stop: 'exited',
+    destroy: 'removed'
+};
+
+// Потік змін стану контейнерів (NDJSON) на основі Docker events API
+app.get('/api/events/stream', async (req, res) => {
+    let events = null;
+    let heartbeat = null;
+    try {
+        events = await docker.getEvents({
+            filters: {
+                type: ['container'],
+                event: [...Object.keys(EVENT_STATES), 'health_status', 'oom']
+            }
+        });
+
+        res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.flushHeaders();
+        res.write(JSON.stringify({ type: 'hello', time: Date.now() }) + '\n');
+
+        // Періодичний ping, щоб клієнт міг виявити обірване з'єднання
+        heartbeat = setInterval(() => res.write(JSON.stringify({ type: 'ping', time: Date.now() }) + '\n'), 30000);
+        res.on('close', () => {
+            clearInterval(heartbeat);
+            events.destroy();
+        });
+
+        const readline = require('readline');
+        const rl = readline.createInterface({ input: events, crlfDelay: Infinity });
+        for await (const line of rl) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+            const action = (event.Action || event.status || '').split(':')[0];
+            let health = action === 'health_status' ? event.Action.split(':')[1].trim() : null;
+            const status = health ? 'running' : EVENT_STATES[action] || null;
+            if (status === 'running' && health === null) {
+                // Після start/restart контейнер з healthcheck перебуває в "starting" - беремо стан з inspect
+                try {
+                    const info = await docker.getContainer(event.id).inspect();
+                    health = info.State?.Health?.Status || null;
+                } catch (error) {
+                    // Контейнер уже видалено - лишаємо стан події
+                }
+            }
+
+            res.write(JSON.stringify({
+                type: 'container',
+                name: event.Actor?.Attributes?.name || event.id,
+                action,
+                status,
+                health,
+                healthy: isHealthy(status, health),
+                exitCode: event.Actor?.Attributes?.exitCode,
+                time: event.timeNano ? Math.floor(event.timeNano / 1e6) : event.time * 1000
+            }) + '\n');
+        }
+        res.end();
+    } catch (error) {
+        if (heartbeat) clearInterval(heartbeat);
+        if (events) events.destroy();
+        if (res.headersSent) {
+            res.end();
+        } else {
+            res.status(500).json({ success: false, error: error.message });
+        }
+    }
+});
+
 // Автоматичне створення бекапів (кожні 6 годин)
 cron.schedule('0 */6 * * *', async () => {
     try {
@@ -0,0 +1,42 @@
+#!/bin/sh
+# Спільне блокування операцій над каталогом бекапів Matrix Dendrite
+# Автор: Matrix Setup Team
+#
+# Підключається через ". backup-lock.sh" у backup.sh та verify-backup.sh: обидва
+# змінюють $BACKUP_ROOT/catalog.jsonl (і бекап чистить знімки та медіа-сховище).
+# Блокування - каталог $BACKUP_ROOT/.backup.lock з файлом owner ("PID хост").
+# Якщо власник - процес цього ж хоста/контейнера, якого вже немає (SIGKILL,
+# OOM), блокування вважається застарілим і знімається.
+
+BACKUP_LOCK_HOST="$(hostname 2>/dev/null || cat /etc/hostname)"
+
+# Захоплення блокування; 1, якщо воно зайняте живим процесом
+backup_lock() {
+  LOCK_DIR="$1/.backup.lock"
+  mkdir -p "$1"
+  if ! mkdir "$LOCK_DIR" 2>/dev/null; then
+    owner=$(cat "$LOCK_DIR/owner" 2>/dev/null || true)
+    pid=${owner%% *}
+    host=${owner#* }
+    if [ -n "$owner" ] && { [ "$host" != "$BACKUP_LOCK_HOST" ] || kill -0 "$pid" 2>/dev/null; }; then
+      echo "[ERROR] Бекап уже виконується (PID $pid на $host, $LOCK_DIR)"
+      return 1
+    fi
+    # owner ще не записано - власник, можливо, щойно створив каталог; не чіпаємо
+    if [ -z "$owner" ] && [ -n "$(find "$LOCK_DIR" -maxdepth 0 -mmin -1 2>/dev/null)" ]; then
+      echo "[ERROR] Бекап уже виконується ($LOCK_DIR)"
+      return 1
+    fi
+    echo "[WARN] Знято застаріле блокування ${owner:+(PID $pid на $host) }$LOCK_DIR"
+    rm -rf "$LOCK_DIR"
+    if ! mkdir "$LOCK_DIR" 2>/dev/null; then
+      echo "[ERROR] Бекап уже виконується ($LOCK_DIR)"
+      return 1
+    fi
+  fi
+  echo "$$ $BACKUP_LOCK_HOST" > "$LOCK_DIR/owner"
+}
+
+backup_unlock() {
+  rm -rf "$LOCK_DIR"
+}
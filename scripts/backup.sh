@@ -3,13 +3,58 @@
 # Зберігає дампи бази даних, Redis, конфіги та медіа
 # Автор: Matrix Setup Team
 
-BACKUP_DIR="/backup/$(date +%Y-%m-%d_%H-%M-%S)"
+BACKUP_ROOT="${BACKUP_ROOT:-/backup}"
+BACKUP_NAME="$(date +%Y-%m-%d_%H-%M-%S)"
+BACKUP_DIR="$BACKUP_ROOT/$BACKUP_NAME"
+MEDIA_DIR="${MEDIA_DIR:-/var/lib/matrix/media}"
+# Медіа-сховище спільне для всіх знімків (див. media-backup.sh)
+export MEDIA_STORE="${MEDIA_STORE:-$BACKUP_ROOT/media-store}"
+# Скільки останніх знімків зберігати завжди, незалежно від віку
+BACKUP_KEEP_LAST="${BACKUP_KEEP_LAST:-3}"
+JOBS="${BACKUP_JOBS:-$(nproc 2>/dev/null || echo 2)}"
+SCRIPTS_DIR="$(cd "$(dirname "$0")" && pwd)"
+# Каталог знімків: рядок JSON на знімок (розміри, склад, контрольна сума, тривалість);
+# /api/backups читає його замість обходу файлової системи
+CATALOG="$BACKUP_ROOT/catalog.jsonl"
+
+# Один бекап за раз: cron адмін-панелі та /backup create не мають перетинатися
+# (і verify-backup.sh, що теж дописує в каталог знімків), див. backup-lock.sh
+. "$SCRIPTS_DIR/backup-lock.sh"
+backup_lock "$BACKUP_ROOT" || exit 1
+WORK=$(mktemp -d "${TMPDIR:-/tmp}/backup.XXXXXX")
+trap 'rm -rf "$WORK"; backup_unlock' EXIT
+
+# Розмір файлів/каталогів у байтах (відсутні - 0)
+component_bytes() {
+  for path in "$@"; do
+    [ -e "$path" ] && du -sk "$path"
+  done | awk '{ s += $1 } END { printf "%d", s * 1024 }'
+}
+
+# Лишити в каталозі тільки записи знімків, що існують на диску
+prune_catalog() {
+  [ -f "$CATALOG" ] || return 0
+  (cd "$BACKUP_ROOT" && ls -1d [0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]_* 2>/dev/null) > "$WORK/snapshots"
+  awk -v snapshots="$WORK/snapshots" '
+    FILENAME == snapshots { keep[$0] = 1; next }
+    { name = $0; sub(/^\{"name":"/, "", name); sub(/".*/, "", name) }
+    name in keep
+  ' "$WORK/snapshots" "$CATALOG" > "$CATALOG.tmp"
+  mv "$CATALOG.tmp" "$CATALOG"
+}
+
+started=$(date +%s)
+FAILED=""
 mkdir -p "$BACKUP_DIR"
+echo "[INFO] Бекап $BACKUP_NAME"
 
-# Бекап Postgres
+# Бекап Postgres: паралельний дамп у каталожному форматі (див. postgres-backup.sh)
 if [ -n "$POSTGRES_DB" ] && [ -n "$POSTGRES_USER" ] && [ -n "$POSTGRES_PASSWORD" ]; then
   echo "[INFO] Бекап бази даних Postgres..."
-  PGPASSWORD="$POSTGRES_PASSWORD" pg_dump -h "$POSTGRES_HOST" -U "$POSTGRES_USER" "$POSTGRES_DB" > "$BACKUP_DIR/postgres.sql"
+  if ! sh "$SCRIPTS_DIR/postgres-backup.sh" dump "$BACKUP_DIR/postgres.dir"; then
+    echo "[ERROR] Помилка бекапу Postgres"
+    FAILED="$FAILED postgres"
+  fi
 else
   echo "[WARN] Пропущено бекап Postgres (немає змінних середовища)"
 fi
@@ -17,25 +62,77 @@ fi
 # Бекап Redis
 if [ -n "$REDIS_PASSWORD" ]; then
   echo "[INFO] Бекап Redis..."
-  redis-cli -h "$REDIS_HOST" -p "$REDIS_PORT" -a "$REDIS_PASSWORD" save
-  cp /data/dump.rdb "$BACKUP_DIR/redis.rdb"
+  if ! { redis-cli -h "$REDIS_HOST" -p "$REDIS_PORT" -a "$REDIS_PASSWORD" save && cp /data/dump.rdb "$BACKUP_DIR/redis.rdb"; }; then
+    echo "[ERROR] Помилка бекапу Redis"
+    FAILED="$FAILED redis"
+  fi
 else
   echo "[WARN] Пропущено бекап Redis (немає пароля)"
 fi
 
 # Бекап конфігів
 echo "[INFO] Бекап конфігурацій..."
-cp -r /etc/matrix "$BACKUP_DIR/config-matrix"
-cp -r /etc/nginx "$BACKUP_DIR/config-nginx"
+if ! { cp -r /etc/matrix "$BACKUP_DIR/config-matrix" && cp -r /etc/nginx "$BACKUP_DIR/config-nginx"; }; then
+  echo "[ERROR] Помилка бекапу конфігурацій"
+  FAILED="$FAILED config"
+fi
 
-# Бекап медіа
+# Бекап медіа: інкрементально, кожен файл зберігається один раз у $MEDIA_STORE
 echo "[INFO] Бекап медіа..."
-cp -r /var/lib/matrix/media "$BACKUP_DIR/media"
+PREVIOUS_MANIFEST=$(ls -1 "$BACKUP_ROOT"/*/media.manifest 2>/dev/null | grep -v "/$BACKUP_NAME/" | sort | tail -n 1)
+if ! sh "$SCRIPTS_DIR/media-backup.sh" backup "$MEDIA_DIR" "$BACKUP_DIR/media.manifest" "$PREVIOUS_MANIFEST"; then
+  echo "[ERROR] Помилка бекапу медіа"
+  FAILED="$FAILED media"
+fi
+
+# Контрольні суми файлів знімка (медіа-об'єкти перевіряються за власними хешами, див. verify-backup.sh)
+echo "[INFO] Контрольні суми..."
+(cd "$BACKUP_DIR" && find . -type f ! -name SHA256SUMS) | sed 's|^\./||' | tr '\n' '\0' |
+  (cd "$BACKUP_DIR" && xargs -0 -r -P "$JOBS" -n 64 sh -c 'sha256sum "$@" > "$0/sums.$$"' "$WORK")
+cat "$WORK"/sums.* 2>/dev/null | sort -k 2 > "$BACKUP_DIR/SHA256SUMS"
 
-# Очищення старих бекапів
+# Запис у каталог: створюється до очищення, тож очищення бачить і новий знімок
+status=ok
+[ -z "$FAILED" ] || status=partial
+media_bytes=0
+media_files=0
+if [ -f "$BACKUP_DIR/media.manifest" ]; then
+  media_bytes=$(awk -F'\t' '{ s += $2 } END { printf "%d", s }' "$BACKUP_DIR/media.manifest")
+  media_files=$(wc -l < "$BACKUP_DIR/media.manifest" | tr -d ' ')
+fi
+printf '{"name":"%s","created":"%s","seconds":%d,"bytes":%d,"components":{"postgres":%d,"redis":%d,"config":%d,"media":%d},"media_files":%d,"files":%d,"checksum":"%s","status":"%s","failed":[%s]}\n' \
+  "$BACKUP_NAME" "$(date -u -d "@$started" +%Y-%m-%dT%H:%M:%SZ)" "$(( $(date +%s) - started ))" \
+  "$(component_bytes "$BACKUP_DIR")" \
+  "$(component_bytes "$BACKUP_DIR/postgres.dir" "$BACKUP_DIR/postgres.sql")" \
+  "$(component_bytes "$BACKUP_DIR/redis.rdb")" \
+  "$(component_bytes "$BACKUP_DIR/config-matrix" "$BACKUP_DIR/config-nginx")" \
+  "$media_bytes" "$media_files" "$(wc -l < "$BACKUP_DIR/SHA256SUMS" | tr -d ' ')" \
+  "$(sha256sum "$BACKUP_DIR/SHA256SUMS" | cut -c1-64)" "$status" \
+  "$(echo $FAILED | awk '{ for (i = 1; i <= NF; i++) printf "%s\"%s\"", (i > 1 ? "," : ""), $i }')" >> "$CATALOG"
+
+# Очищення старих знімків: за віком з імені знімка (не mtime), але не менше
+# BACKUP_KEEP_LAST останніх; сховище медіа чиститься від об'єктів без посилань
 if [ -n "$BACKUP_RETENTION_DAYS" ]; then
-  echo "[INFO] Очищення бекапів старше $BACKUP_RETENTION_DAYS днів..."
-  find /backup -maxdepth 1 -type d -mtime +$BACKUP_RETENTION_DAYS -exec rm -rf {} \;
+  echo "[INFO] Очищення знімків старше $BACKUP_RETENTION_DAYS днів (зберігається щонайменше $BACKUP_KEEP_LAST)..."
+  cutoff=$(date -d "@$(( $(date +%s) - BACKUP_RETENTION_DAYS * 86400 ))" +%Y-%m-%d_%H-%M-%S)
+  # Імена знімків - дати, тож порівнюються як рядки
+  (cd "$BACKUP_ROOT" && ls -1d [0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]_* 2>/dev/null) | sort -r |
+    awk -v keep="$BACKUP_KEEP_LAST" -v cutoff="$cutoff" 'NR > keep && $0 < cutoff' | while read -r snapshot; do
+      echo "[INFO] Видалення знімка $snapshot"
+      rm -rf "${BACKUP_ROOT:?}/$snapshot"
+    done
+  manifests=$(ls -1 "$BACKUP_ROOT"/*/media.manifest 2>/dev/null)
+  if [ -n "$manifests" ]; then
+    # shellcheck disable=SC2086
+    sh "$SCRIPTS_DIR/media-backup.sh" gc $manifests
+  fi
+  prune_catalog
 fi
 
-echo "[INFO] Бекап завершено: $BACKUP_DIR" 
\ No newline at end of file
+echo "[STATS] backup name=$BACKUP_NAME status=$status bytes=$(du -sk "$BACKUP_DIR" | awk '{ print $1 * 1024 }') seconds=$(( $(date +%s) - started ))"
+if [ -n "$FAILED" ]; then
+  # Частковий знімок лишається в каталозі (status=partial), але бекап вважається невдалим
+  echo "[ERROR] Бекап частковий, не вдалися етапи:$FAILED ($BACKUP_DIR)"
+  exit 1
+fi
+echo "[INFO] Бекап завершено: $BACKUP_DIR"
@@ -0,0 +1,255 @@
+#!/bin/sh
+# Інкрементальний бекап медіа Matrix Dendrite з адресацією за вмістом
+# Автор: Matrix Setup Team
+#
+# Кожен файл зберігається один раз у $MEDIA_STORE/objects/<2 символи>/<sha256>[.gz]
+# незалежно від кількості знімків. Знімок медіа - маніфест, рядок на файл:
+#   sha256<TAB>розмір<TAB>mtime<TAB>відносний шлях
+# Файли з тим самим шляхом, розміром і mtime, що й у попередньому маніфесті,
+# повторно не хешуються (медіа Dendrite незмінні). Хешування та стиснення
+# виконуються паралельно ($BACKUP_JOBS процесів).
+#
+# Використання:
+#   media-backup.sh backup <каталог медіа> <маніфест> [попередній маніфест]
+#   media-backup.sh restore <маніфест> <каталог медіа>
+#   media-backup.sh gc <маніфест> [<маніфест> ...]   - видалити об'єкти без посилань
+#   media-backup.sh verify <маніфест>   - перевірити наявність і хеші об'єктів знімка
+#
+# Прогрес друкується рядками "[PROGRESS] ...", підсумок - рядком
+# "[STATS] media key=value ..." для бота та адмін-панелі.
+
+set -eu
+
+MEDIA_STORE="${MEDIA_STORE:-/backup/media-store}"
+OBJECTS="$MEDIA_STORE/objects"
+JOBS="${BACKUP_JOBS:-$(nproc 2>/dev/null || echo 2)}"
+# Рівень gzip: медіа переважно вже стиснені, тож швидкий рівень дає майже той самий результат
+COMPRESS_LEVEL="${BACKUP_COMPRESS_LEVEL:-3}"
+PROGRESS_INTERVAL="${BACKUP_PROGRESS_INTERVAL:-30}"
+TAB=$(printf '\t')
+
+# Шлях об'єкта без розширення: objects/ab/abcdef...
+object_path() {
+  echo "$OBJECTS/${1%"${1#??}"}/$1"
+}
+
+# Збереження об'єктів: пари <sha256> <файл>; стиснена копія лишається, лише якщо вона менша
+store_objects() {
+  while [ $# -ge 2 ]; do
+    hash="$1"
+    file="$2"
+    shift 2
+    # Без підпроцесів на кожен файл - їх тут тисячі
+    target="$OBJECTS/${hash%"${hash#??}"}/$hash"
+    if [ -e "$target" ] || [ -e "$target.gz" ]; then
+      continue
+    fi
+    [ -d "${target%/*}" ] || mkdir -p "${target%/*}"
+    tmp="$target.tmp.$$"
+    size=$(stat -c %s "$file")
+    gzip -c -"$COMPRESS_LEVEL" "$file" > "$tmp"
+    if [ "$(stat -c %s "$tmp")" -lt "$size" ]; then
+      mv "$tmp" "$target.gz"
+    else
+      cp "$file" "$tmp"
+      mv "$tmp" "$target"
+    fi
+    echo "$size" >> "$WORK/stored.$$"
+  done
+}
+
+# Відновлення файлів: пари <sha256> <відносний шлях> у поточний каталог
+extract_objects() {
+  while [ $# -ge 2 ]; do
+    source=$(object_path "$1")
+    mkdir -p "$(dirname "$2")"
+    if [ -e "$source.gz" ]; then
+      gzip -dc "$source.gz" > "$2"
+    elif [ -e "$source" ]; then
+      cp "$source" "$2"
+    else
+      echo "[ERROR] Об'єкт $1 для $2 відсутній у сховищі" >&2
+      exit 1
+    fi
+    shift 2
+  done
+}
+
+# Перевірка об'єктів: вміст (після розпакування) має давати той самий sha256, що й ім'я
+verify_objects() {
+  for hash in "$@"; do
+    target="$OBJECTS/${hash%"${hash#??}"}/$hash"
+    if [ -e "$target.gz" ]; then
+      actual=$(gzip -dc "$target.gz" | sha256sum)
+      size=$(stat -c %s "$target.gz")
+    elif [ -e "$target" ]; then
+      actual=$(sha256sum < "$target")
+      size=$(stat -c %s "$target")
+    else
+      echo "$hash" >> "$WORK/missing.$$"
+      continue
+    fi
+    if [ "${actual%% *}" != "$hash" ]; then
+      echo "$hash" >> "$WORK/corrupt.$$"
+    fi
+    echo "$size" >> "$WORK/verified.$$"
+  done
+}
+
+count_lines() {
+  cat "$@" 2>/dev/null | wc -l | tr -d ' '
+}
+
+sum_sizes() {
+  cat "$@" 2>/dev/null | awk '{ s += $1 } END { printf "%d", s }'
+}
+
+# Фоновий звіт про прогрес, поки працюють паралельні обробники
+report_progress() {
+  while sleep "$PROGRESS_INTERVAL"; do
+    echo "[PROGRESS] media hashed=$(count_lines "$WORK"/hashed.*)/$(cat "$WORK/todo_count") stored=$(count_lines "$WORK"/stored.*)/$(cat "$WORK/missing_count") stored_bytes=$(sum_sizes "$WORK"/stored.*)"
+  done
+}
+
+backup() {
+  MEDIA_DIR="$1"
+  MANIFEST="$2"
+  PREVIOUS="${3:-}"
+  started=$(date +%s)
+  mkdir -p "$OBJECTS"
+  touch "$WORK/previous"
+  if [ -n "$PREVIOUS" ] && [ -f "$PREVIOUS" ]; then
+    cp "$PREVIOUS" "$WORK/previous"
+  fi
+
+  # Перелік файлів: розмір, mtime, шлях відносно каталогу медіа
+  (cd "$MEDIA_DIR" && find . -type f -exec stat -c "%s$TAB%Y$TAB%n" {} +) | sed "s|$TAB\./|$TAB|" > "$WORK/files"
+  TOTAL_FILES=$(count_lines "$WORK/files")
+  TOTAL_BYTES=$(sum_sizes "$WORK/files")
+
+  # Хеші незмінених файлів беремо з попереднього маніфесту, решта - у чергу хешування
+  awk -F"$TAB" -v OFS="$TAB" -v previous="$WORK/previous" -v known="$WORK/known" -v todo="$WORK/todo" '
+    FILENAME == previous { hash[$4 FS $2 FS $3] = $1; next }
+    ($3 FS $1 FS $2) in hash { print hash[$3 FS $1 FS $2], $1, $2, $3 > known; next }
+    { print $3 > todo; bytes += $1 }
+    END { printf "%d\n", bytes > (todo "_bytes") }
+  ' "$WORK/previous" "$WORK/files"
+  touch "$WORK/known" "$WORK/todo"
+  TODO_FILES=$(count_lines "$WORK/todo")
+  echo "$TODO_FILES" > "$WORK/todo_count"
+  echo 0 > "$WORK/missing_count"
+
+  echo "[INFO] Медіа: $TOTAL_FILES файлів, нових або змінених: $TODO_FILES"
+  report_progress &
+  REPORTER=$!
+
+  # Паралельне хешування; кожен обробник пише власний файл (без перемішування рядків)
+  tr '\n' '\0' < "$WORK/todo" | (cd "$MEDIA_DIR" && xargs -0 -r -P "$JOBS" -n 32 sh -c 'sha256sum "$@" > "$0/hashed.$$"' "$WORK")
+  cat "$WORK"/hashed.* > "$WORK/hashes" 2>/dev/null || true
+  awk -F"$TAB" -v OFS="$TAB" -v hashes="$WORK/hashes" '
+    FILENAME == hashes { h[substr($0, 67)] = substr($0, 1, 64); next }
+    $3 in h { print h[$3], $1, $2, $3 }
+  ' "$WORK/hashes" "$WORK/files" >> "$WORK/known"
+  sort -t "$TAB" -k4 "$WORK/known" > "$WORK/manifest"
+
+  # Об'єкти, яких ще немає у сховищі (по одному файлу на унікальний хеш)
+  find "$OBJECTS" -type f ! -name '*.tmp.*' | sed 's|.*/||; s|\.gz$||' | sort -u > "$WORK/existing"
+  awk -F"$TAB" -v existing="$WORK/existing" '
+    FILENAME == existing { have[$1] = 1; next }
+    !($1 in have) && !seen[$1]++ { print $1; print $4 }
+  ' "$WORK/existing" "$WORK/manifest" > "$WORK/missing"
+  count_lines "$WORK/missing" | awk '{ print $1 / 2 }' > "$WORK/missing_count"
+
+  # Паралельне стиснення та запис нових об'єктів
+  tr '\n' '\0' < "$WORK/missing" | (cd "$MEDIA_DIR" && xargs -0 -r -P "$JOBS" -n 32 sh "$SCRIPT" store)
+  kill "$REPORTER" 2>/dev/null || true
+  REPORTER=
+
+  mv "$WORK/manifest" "$MANIFEST.tmp"
+  mv "$MANIFEST.tmp" "$MANIFEST"
+
+  seconds=$(( $(date +%s) - started ))
+  [ "$seconds" -gt 0 ] || seconds=1
+  new_bytes=$(sum_sizes "$WORK"/stored.*)
+  stored_bytes=$(du -sk "$OBJECTS" | awk '{ print $1 * 1024 }')
+  echo "[STATS] media files=$TOTAL_FILES bytes=$TOTAL_BYTES hashed=$TODO_FILES hashed_bytes=$(cat "$WORK/todo_bytes") new_objects=$(count_lines "$WORK"/stored.*) new_bytes=$new_bytes store_bytes=$stored_bytes seconds=$seconds"
+}
+
+restore() {
+  MANIFEST="$1"
+  MEDIA_DIR="$2"
+  mkdir -p "$MEDIA_DIR"
+  awk -F"$TAB" '{ print $1; print $4 }' "$MANIFEST" | tr '\n' '\0' | (cd "$MEDIA_DIR" && xargs -0 -r -P "$JOBS" -n 64 sh "$SCRIPT" extract)
+  echo "[INFO] Медіа відновлено: $(count_lines "$MANIFEST") файлів"
+}
+
+verify() {
+  MANIFEST="$1"
+  started=$(date +%s)
+  cut -f1 "$MANIFEST" | sort -u > "$WORK/objects"
+  count_lines "$WORK/objects" > "$WORK/objects_count"
+  (
+    while sleep "$PROGRESS_INTERVAL"; do
+      echo "[PROGRESS] media_verify checked=$(count_lines "$WORK"/verified.* "$WORK"/missing.*)/$(cat "$WORK/objects_count")"
+    done
+  ) &
+  REPORTER=$!
+  tr '\n' '\0' < "$WORK/objects" | xargs -0 -r -P "$JOBS" -n 64 sh "$SCRIPT" verify-objects
+  kill "$REPORTER" 2>/dev/null || true
+  REPORTER=
+
+  missing=$(count_lines "$WORK"/missing.*)
+  corrupt=$(count_lines "$WORK"/corrupt.*)
+  for hash in $(cat "$WORK"/missing.* "$WORK"/corrupt.* 2>/dev/null | head -n 5); do
+    echo "[ERROR] Пошкоджений або відсутній об'єкт $hash: $(awk -F"$TAB" -v hash="$hash" '$1 == hash { print $4; exit }' "$MANIFEST")"
+  done
+  seconds=$(( $(date +%s) - started ))
+  [ "$seconds" -gt 0 ] || seconds=1
+  echo "[STATS] media_verify objects=$(cat "$WORK/objects_count") missing=$missing corrupt=$corrupt bytes=$(sum_sizes "$WORK"/verified.*) seconds=$seconds"
+  [ "$missing" -eq 0 ] && [ "$corrupt" -eq 0 ]
+}
+
+# Видалення об'єктів, на які не посилається жоден із переданих маніфестів
+gc() {
+  if [ $# -eq 0 ]; then
+    echo "[ERROR] Немає жодного маніфесту - очищення сховища скасовано" >&2
+    exit 1
+  fi
+  cut -f1 "$@" | sort -u > "$WORK/referenced"
+  find "$OBJECTS" -type f 2>/dev/null | awk -v referenced="$WORK/referenced" '
+    FILENAME == referenced { keep[$1] = 1; next }
+    { name = $0; sub(/.*\//, "", name); sub(/\.gz$/, "", name); sub(/\.tmp\..*$/, "", name) }
+    !(name in keep) { print }
+  ' "$WORK/referenced" - > "$WORK/orphans"
+  freed=$(tr '\n' '\0' < "$WORK/orphans" | xargs -0 -r stat -c %s | awk '{ s += $1 } END { printf "%d", s }')
+  tr '\n' '\0' < "$WORK/orphans" | xargs -0 -r rm -f
+  echo "[STATS] media_gc removed=$(count_lines "$WORK/orphans") freed_bytes=$freed"
+}
+
+SCRIPT="$(cd "$(dirname "$0")" && pwd)/$(basename "$0")"
+REPORTER=
+COMMAND="${1:-}"
+[ $# -gt 0 ] && shift
+
+case "$COMMAND" in
+  store)
+    # WORK успадковується від батьківського процесу backup
+    store_objects "$@"
+    ;;
+  extract)
+    extract_objects "$@"
+    ;;
+  verify-objects)
+    verify_objects "$@"
+    ;;
+  backup|restore|gc|verify)
+    WORK=$(mktemp -d "${TMPDIR:-/tmp}/media-backup.XXXXXX")
+    export WORK
+    trap '[ -z "$REPORTER" ] || kill "$REPORTER" 2>/dev/null; rm -rf "$WORK"' EXIT
+    "$COMMAND" "$@"
+    ;;
+  *)
+    echo "Використання: $0 backup <каталог медіа> <маніфест> [попередній маніфест] | restore <маніфест> <каталог медіа> | gc <маніфест>... | verify <маніфест>" >&2
+    exit 1
+    ;;
+esac
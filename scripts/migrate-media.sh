@@ -0,0 +1,44 @@
+#!/bin/bash
+
+# Перенесення медіа Dendrite у іменований том dendrite-media
+# Автор: Matrix Setup Team
+#
+# Раніше /var/lib/matrix/media не монтувався і медіа жили у шарі контейнера
+# dendrite. Після появи тому docker-compose up перестворює контейнер з порожнім
+# томом, а старий шар (разом з медіа) видаляється. Скрипт копіює медіа зі
+# старого контейнера, перестворює dendrite з томом і повертає файли вже в том.
+# Якщо том уже змонтовано - нічого не робить. Запускається з каталогу з
+# docker-compose.yml до "docker-compose up -d" (update.sh робить це сам).
+
+set -e
+
+# Сервіс і контейнер у docker-compose.yml мають однакове ім'я (container_name)
+CONTAINER=dendrite
+MEDIA_PATH=/var/lib/matrix/media
+
+if ! docker inspect "$CONTAINER" >/dev/null 2>&1; then
+    echo "[INFO] Контейнер $CONTAINER не існує - перенесення медіа не потрібне"
+    exit 0
+fi
+
+mounted=$(docker inspect --format "{{range .Mounts}}{{if eq .Destination \"$MEDIA_PATH\"}}{{.Type}}{{end}}{{end}}" "$CONTAINER")
+if [ -n "$mounted" ]; then
+    echo "[INFO] $MEDIA_PATH у $CONTAINER вже на томі ($mounted) - перенесення не потрібне"
+    exit 0
+fi
+
+# Копія лишається на диску, доки файли не опиняться в томі
+STAGING="./backup/media-migration-$(date +%Y-%m-%d_%H-%M-%S)"
+mkdir -p "$STAGING"
+echo "[INFO] Копіювання медіа з шару контейнера $CONTAINER у $STAGING..."
+docker cp -a "$CONTAINER:$MEDIA_PATH" "$STAGING/"
+echo "[INFO] Скопійовано $(find "$STAGING/media" -type f | wc -l) файлів ($(du -sh "$STAGING/media" | cut -f1))"
+
+echo "[INFO] Перестворення $CONTAINER з томом dendrite-media..."
+docker-compose up -d --no-deps "$CONTAINER"
+docker-compose stop "$CONTAINER"
+docker cp -a "$STAGING/media/." "$CONTAINER:$MEDIA_PATH"
+docker-compose start "$CONTAINER"
+
+rm -rf "$STAGING"
+echo "[INFO] Медіа перенесено в том dendrite-media"
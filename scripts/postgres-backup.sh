@@ -0,0 +1,133 @@
+#!/bin/sh
+# Паралельний дамп і відновлення бази Postgres для Matrix Dendrite
+# Автор: Matrix Setup Team
+#
+# Дамп у каталожному форматі (pg_dump -Fd): кожна таблиця - окремий стиснений
+# файл, тож великі таблиці Dendrite (події, JSON подій, стан кімнат, потоки
+# синхронізації) вивантажуються і відновлюються паралельно ($BACKUP_PG_JOBS
+# з'єднань). Під час відновлення індекси та обмеження теж будуються паралельно.
+#
+# Використання:
+#   postgres-backup.sh dump <каталог дампу>
+#   postgres-backup.sh restore <каталог дампу>
+#
+# Підключення: POSTGRES_HOST, POSTGRES_PORT, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB.
+# Прогрес по таблицях друкується рядками "[PROGRESS] postgres ...", підсумок -
+# рядком "[STATS] postgres_dump|postgres_restore key=value ..." для бота та адмін-панелі.
+
+set -eu
+
+JOBS="${BACKUP_PG_JOBS:-4}"
+# Рівень стиснення pg_dump (0-9 або метод:рівень для Postgres 16+, напр. zstd:3)
+COMPRESS="${BACKUP_PG_COMPRESS:-6}"
+
+export PGHOST="${POSTGRES_HOST:-${PGHOST:-localhost}}"
+export PGPORT="${POSTGRES_PORT:-${PGPORT:-5432}}"
+export PGUSER="${POSTGRES_USER:-${PGUSER:-postgres}}"
+export PGDATABASE="${POSTGRES_DB:-${PGDATABASE:-dendrite}}"
+if [ -n "${POSTGRES_PASSWORD:-}" ]; then
+  export PGPASSWORD="$POSTGRES_PASSWORD"
+fi
+
+directory_bytes() {
+  du -sk "$1" | awk '{ print $1 * 1024 }'
+}
+
+database_bytes() {
+  psql -Atc "SELECT pg_database_size(current_database())"
+}
+
+# Рядки -v від pg_dump/pg_restore -> "[PROGRESS] postgres ..." на кожну таблицю та індекс.
+# У паралельному режимі елемент готовий за рядком "finished item", у послідовному -
+# за початком наступного, тож там звітуємо на старті обробки таблиці.
+report_progress() {
+  awk -v stage="$1" -v tables="$2" -v indexes="$3" -v jobs="$JOBS" '
+    function report(kind, name) {
+      if (kind == "table") { done_tables++ } else { done_indexes++ }
+      gsub(/"/, "", name)
+      printf "[PROGRESS] postgres stage=%s tables=%d/%d indexes=%d/%d %s=%s\n", stage, done_tables, tables, done_indexes, indexes, kind, name
+      fflush()
+    }
+    / error: | FATAL: / { sub(/^[a-z_]+: (error: )?/, ""); print "[ERROR] " $0; fflush(); next }
+    / warning: / { sub(/^[a-z_]+: warning: /, ""); print "[WARN] " $0; fflush(); next }
+    jobs > 1 && / finished item [0-9]+ TABLE DATA / { report("table", $NF); next }
+    jobs > 1 && / finished item [0-9]+ (INDEX|CONSTRAINT|FK CONSTRAINT) / { report("index", $NF); next }
+    jobs <= 1 && /(dumping contents|processing data) (of|for) table / { report("table", $NF); next }
+    jobs <= 1 && / creating (INDEX|CONSTRAINT|FK CONSTRAINT) / { report("index", $NF); next }
+  '
+}
+
+# Команда з виводом у report_progress; повертає код виходу самої команди, а не awk
+run_with_progress() {
+  stage="$1"
+  tables="$2"
+  indexes="$3"
+  shift 3
+  { "$@" 2>&1 || echo "$?" > "$WORK/status"; } | report_progress "$stage" "$tables" "$indexes"
+  [ ! -s "$WORK/status" ]
+}
+
+dump() {
+  TARGET="$1"
+  started=$(date +%s)
+  if [ -e "$TARGET" ]; then
+    echo "[ERROR] Каталог дампу $TARGET уже існує" >&2
+    exit 1
+  fi
+  tables=$(psql -Atc "SELECT count(*) FROM pg_tables WHERE schemaname NOT IN ('pg_catalog', 'information_schema')")
+  db_bytes=$(database_bytes)
+  echo "[INFO] Postgres: $tables таблиць, $JOBS потоків, стиснення $COMPRESS"
+
+  if ! run_with_progress dump "$tables" 0 pg_dump -Fd -j "$JOBS" -Z "$COMPRESS" -v -f "$TARGET"; then
+    rm -rf "$TARGET"
+    echo "[ERROR] pg_dump завершився з помилкою"
+    exit 1
+  fi
+
+  seconds=$(( $(date +%s) - started ))
+  [ "$seconds" -gt 0 ] || seconds=1
+  echo "[STATS] postgres_dump tables=$tables db_bytes=$db_bytes bytes=$(directory_bytes "$TARGET") jobs=$JOBS seconds=$seconds"
+}
+
+restore() {
+  SOURCE="$1"
+  started=$(date +%s)
+  if [ ! -f "$SOURCE/toc.dat" ]; then
+    echo "[ERROR] $SOURCE не є дампом у каталожному форматі" >&2
+    exit 1
+  fi
+  # Зміст дампу: скільки таблиць із даними та індексів/обмежень буде відновлено
+  pg_restore -l "$SOURCE" > "$WORK/toc"
+  tables=$(grep -c '^[0-9].* TABLE DATA ' "$WORK/toc" || true)
+  indexes=$(grep -cE '^[0-9].* (INDEX|CONSTRAINT|FK CONSTRAINT) ' "$WORK/toc" || true)
+  echo "[INFO] Postgres: $tables таблиць, $indexes індексів і обмежень, $JOBS потоків"
+
+  # --clean --if-exists: відновлення поверх наявної бази без помилок про існуючі об'єкти
+  if ! run_with_progress restore "$tables" "$indexes" pg_restore -j "$JOBS" --clean --if-exists --no-owner -v -d "$PGDATABASE" "$SOURCE"; then
+    echo "[ERROR] pg_restore завершився з помилкою"
+    exit 1
+  fi
+
+  seconds=$(( $(date +%s) - started ))
+  [ "$seconds" -gt 0 ] || seconds=1
+  echo "[STATS] postgres_restore tables=$tables indexes=$indexes bytes=$(directory_bytes "$SOURCE") db_bytes=$(database_bytes) jobs=$JOBS seconds=$seconds"
+}
+
+COMMAND="${1:-}"
+[ $# -gt 0 ] && shift
+
+case "$COMMAND" in
+  dump|restore)
+    if [ $# -ne 1 ]; then
+      echo "Використання: $0 $COMMAND <каталог дампу>" >&2
+      exit 1
+    fi
+    WORK=$(mktemp -d "${TMPDIR:-/tmp}/postgres-backup.XXXXXX")
+    trap 'rm -rf "$WORK"' EXIT
+    "$COMMAND" "$1"
+    ;;
+  *)
+    echo "Використання: $0 dump <каталог дампу> | restore <каталог дампу>" >&2
+    exit 1
+    ;;
+esac
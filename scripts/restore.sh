@@ -2,14 +2,22 @@
 # Скрипт відновлення з резервної копії для Matrix Dendrite
 # Автор: Matrix Setup Team
 
+started=$(date +%s)
+
 if [ -z "$1" ]; then
   echo "Вкажіть шлях до папки з бекапом!"
   exit 1
 fi
 BACKUP_DIR="$1"
 
-# Відновлення Postgres
-if [ -f "$BACKUP_DIR/postgres.sql" ]; then
+# Відновлення Postgres: паралельно з каталожного дампу або послідовно зі старого SQL-дампу
+if [ -d "$BACKUP_DIR/postgres.dir" ]; then
+  echo "[INFO] Відновлення бази даних Postgres..."
+  if ! sh "$(dirname "$0")/postgres-backup.sh" restore "$BACKUP_DIR/postgres.dir"; then
+    echo "[ERROR] Помилка відновлення Postgres"
+    exit 1
+  fi
+elif [ -f "$BACKUP_DIR/postgres.sql" ]; then
   echo "[INFO] Відновлення бази даних Postgres..."
   PGPASSWORD="$POSTGRES_PASSWORD" psql -h "$POSTGRES_HOST" -U "$POSTGRES_USER" "$POSTGRES_DB" < "$BACKUP_DIR/postgres.sql"
 else
@@ -35,10 +43,15 @@ if [ -d "$BACKUP_DIR/config-nginx" ]; then
   cp -r "$BACKUP_DIR/config-nginx"/* /etc/nginx/
 fi
 
-# Відновлення медіа
-if [ -d "$BACKUP_DIR/media" ]; then
+# Відновлення медіа: з маніфесту знімка (інкрементальні бекапи) або з повної копії (старі бекапи)
+if [ -f "$BACKUP_DIR/media.manifest" ]; then
+  echo "[INFO] Відновлення медіа..."
+  export MEDIA_STORE="${MEDIA_STORE:-$(dirname "$BACKUP_DIR")/media-store}"
+  sh "$(dirname "$0")/media-backup.sh" restore "$BACKUP_DIR/media.manifest" /var/lib/matrix/media
+elif [ -d "$BACKUP_DIR/media" ]; then
   echo "[INFO] Відновлення медіа..."
   cp -r "$BACKUP_DIR/media"/* /var/lib/matrix/media/
 fi
 
+echo "[STATS] restore name=$(basename "$BACKUP_DIR") bytes=$(du -sk "$BACKUP_DIR" | awk '{ print $1 * 1024 }') seconds=$(( $(date +%s) - started ))"
 echo "[INFO] Відновлення завершено!" 
\ No newline at end of file
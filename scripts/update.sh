@@ -66,6 +66,14 @@ else
     exit 1
 fi
 
+# Медіа зі старого шару контейнера dendrite - у том dendrite-media (одноразово)
+if [ -f "scripts/migrate-media.sh" ]; then
+    if ! bash scripts/migrate-media.sh; then
+        log_error "Помилка перенесення медіа в том dendrite-media"
+        exit 1
+    fi
+fi
+
 # Перезапуск контейнерів
 log_info "Перезапуск контейнерів..."
 if docker-compose up -d; then
@@ -0,0 +1,72 @@
+#!/bin/sh
+# Перевірка цілісності знімка бекапу Matrix Dendrite
+# Автор: Matrix Setup Team
+#
+# Файли знімка звіряються з SHA256SUMS (пишеться backup.sh), медіа - з маніфестом:
+# кожен об'єкт у спільному сховищі має існувати й давати sha256 зі свого імені.
+# Обидві перевірки виконуються паралельно ($BACKUP_JOBS процесів).
+#
+# Використання: verify-backup.sh <каталог знімка>
+#
+# Результат дописується в каталог знімків ($BACKUP_ROOT/catalog.jsonl), підсумок -
+# рядок "[STATS] verify key=value ..."; код виходу 1, якщо знайдено пошкодження.
+
+set -eu
+
+if [ $# -ne 1 ] || [ ! -d "$1" ]; then
+  echo "Використання: $0 <каталог знімка>" >&2
+  exit 1
+fi
+SNAPSHOT="$(cd "$1" && pwd)"
+NAME="$(basename "$SNAPSHOT")"
+BACKUP_ROOT="$(dirname "$SNAPSHOT")"
+export MEDIA_STORE="${MEDIA_STORE:-$BACKUP_ROOT/media-store}"
+JOBS="${BACKUP_JOBS:-$(nproc 2>/dev/null || echo 2)}"
+SCRIPTS_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+# Те саме блокування, що й у backup.sh: запис у каталог не має перетинатися з його
+# очищенням, а знімок чи медіа-об'єкти - зникати посеред перевірки
+. "$SCRIPTS_DIR/backup-lock.sh"
+backup_lock "$BACKUP_ROOT" || exit 1
+WORK=$(mktemp -d "${TMPDIR:-/tmp}/verify-backup.XXXXXX")
+trap 'rm -rf "$WORK"; backup_unlock' EXIT
+
+started=$(date +%s)
+files=0
+bad_files=0
+media=ok
+echo "[INFO] Перевірка знімка $NAME ($JOBS потоків)"
+
+if [ -f "$SNAPSHOT/SHA256SUMS" ]; then
+  files=$(wc -l < "$SNAPSHOT/SHA256SUMS" | tr -d ' ')
+  # Рівномірний розподіл файлів між паралельними sha256sum -c
+  awk -v jobs="$JOBS" -v work="$WORK" '{ print > (work "/sums." (NR % jobs)) }' "$SNAPSHOT/SHA256SUMS"
+  for part in "$WORK"/sums.*; do
+    [ -e "$part" ] || continue
+    (cd "$SNAPSHOT" && sha256sum -c "$part" 2>/dev/null | grep -v ': OK$' > "$part.bad" || true) &
+  done
+  wait
+  cat "$WORK"/sums.*.bad 2>/dev/null > "$WORK/bad" || true
+  bad_files=$(wc -l < "$WORK/bad" | tr -d ' ')
+  head -n 5 "$WORK/bad" | while read -r line; do
+    echo "[ERROR] $line"
+  done
+else
+  echo "[WARN] У знімку немає SHA256SUMS (створений до появи каталогу) - перевіряється лише медіа"
+fi
+
+if [ -f "$SNAPSHOT/media.manifest" ]; then
+  echo "[INFO] Перевірка об'єктів медіа..."
+  sh "$SCRIPTS_DIR/media-backup.sh" verify "$SNAPSHOT/media.manifest" || media=failed
+fi
+
+seconds=$(( $(date +%s) - started ))
+[ "$seconds" -gt 0 ] || seconds=1
+ok=true
+if [ "$bad_files" -gt 0 ] || [ "$media" != ok ]; then
+  ok=false
+fi
+printf '{"name":"%s","verified_at":"%s","verified":%s,"verified_bad_files":%d}\n' \
+  "$NAME" "$(date -u +%Y-%m-%dT%H:%M:%SZ)" "$ok" "$bad_files" >> "$BACKUP_ROOT/catalog.jsonl"
+echo "[STATS] verify name=$NAME ok=$ok files=$files bad_files=$bad_files bytes=$(du -sk "$SNAPSHOT" | awk '{ print $1 * 1024 }') seconds=$seconds"
+[ "$ok" = true ]